@@ -1,13 +1,47 @@
-from typing import cast, Dict
-from flask import Flask, jsonify
-from .splitter import list_methods, get_method, Module
+import argparse
+import json
+from typing import Iterable, Iterator, Optional
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
+from . import deadline, metrics, profiling, tracing
+from .deadline import DeadlineExceeded
+from .registry import UnknownMethod
+from .splitter import batches, list_methods, StartedMethods, add_prewarm_arguments, prewarm
+from .text import split_text
 
 app = Flask(__name__)
 '''
 A simple flask app that handles compound splitting requests
 '''
 
-started_methods = cast(Dict[str, Module], {})
+started_methods = StartedMethods()
+
+
+@app.errorhandler(UnknownMethod)
+def unknown_method(error: UnknownMethod):
+    return jsonify({"error": str(error)}), 404
+
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(error: DeadlineExceeded):
+    return jsonify({"error": str(error)}), 504
+
+
+@app.errorhandler(OSError)
+def backend_failed(error: OSError):
+    # raised by a method when its backend is unavailable or fails
+    return jsonify({"error": str(error)}), 503
+
+
+def request_deadline() -> Optional[float]:
+    '''
+    Return the deadline of the request, set with the `X-Deadline` header
+    or the `deadline` query parameter (in milliseconds).
+    '''
+    value = request.headers.get(deadline.DEADLINE_HEADER, request.args.get("deadline"))
+    try:
+        return deadline.after(deadline.parse_milliseconds(value))
+    except ValueError:
+        abort(400, f"Invalid deadline: {value}")
 
 
 @app.route("/split/<method_name>/<compound>")
@@ -16,17 +50,132 @@ def get_split(method_name: str, compound: str):
     Split a compound with the specified method.
 
     If this is the first time the method is called
-    during runtime, run its `start` method.
+    during runtime, run its `start` method. Fails with status 503
+    if the backend of the method is unavailable.
+
+    With an `X-Trace` header, the timed spans of the request are
+    added under the key `"trace"` and in a `Server-Timing` header.
+    With an `X-Deadline` header or `deadline` parameter, the request
+    fails with status 504 if it is not done within that many milliseconds.
     '''
-    
-    if method_name in started_methods:
-        method = started_methods[method_name]
-    else:
-        method = get_method(method_name)
-        method.start()
-        started_methods[method_name] = method
-    result = method.split(compound)
-    return jsonify(result)
+
+    with deadline.until(request_deadline()), \
+            tracing.trace(tracing.requested(request.headers.get(tracing.TRACE_HEADER))) as trace:
+        with metrics.track("get_split") as labels:
+            method = started_methods.get(method_name)
+            labels["method"] = method_name
+            result = method.split(compound)
+
+    if trace is None:
+        return jsonify(result)
+    response = jsonify({**result, "trace": trace.to_json()})
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.route("/split/<method_name>", methods=["POST"])
+def post_split(method_name: str):
+    '''
+    Split many compounds with the specified method.
+
+    The body is either a JSON array of words (otherwise the request
+    fails with status 400) or newline-delimited words.
+    Duplicates are split once.
+
+    The results are streamed back as newline-delimited JSON, one object
+    per distinct word with the key `"word"` next to the keys of the result.
+    With an `X-Trace` header, a last object with the key `"trace"` holds
+    the timed spans of the request. If the deadline passes (see `get_split`)
+    or the backend of the method fails, the last object has the key `"error"`.
+    '''
+
+    try:
+        method = started_methods.get(method_name)
+    except Exception:
+        metrics.requests_total.inc({"endpoint": "post_split", "method": ""})
+        metrics.request_errors.inc({"endpoint": "post_split", "method": ""})
+        raise
+    words = request_words()
+    traced = tracing.requested(request.headers.get(tracing.TRACE_HEADER))
+    until = request_deadline()
+
+    def generate():
+        # the request is timed until the last result has been produced
+        with deadline.until(until), tracing.trace(traced) as trace:
+            try:
+                with metrics.track("post_split", method_name):
+                    for batch in batches(unique(words)):
+                        for word, result in zip(batch, method.split_many(batch)):
+                            yield json.dumps({"word": word, **result}) + "\n"
+            except (DeadlineExceeded, OSError) as error:
+                # the response has already started
+                yield json.dumps({"error": str(error)}) + "\n"
+        if trace is not None:
+            yield json.dumps({"trace": trace.to_json()}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def request_words() -> Iterator[str]:
+    '''
+    Return the words in the body of a `POST /split` request.
+
+    Newline-delimited words are read while the response is streamed,
+    so invalid UTF-8 is replaced instead of failing the request.
+    '''
+    if not request.is_json:
+        return (line.decode("utf-8", errors="replace").strip() for line in request.stream)
+    body = request.get_json()
+    if not isinstance(body, list) or not all(isinstance(word, str) for word in body):
+        abort(400, "The body should be a JSON array of words")
+    return iter(body)
+
+
+@app.route("/split-text/<method_name>", methods=["POST"])
+def post_split_text(method_name: str):
+    '''
+    Split every compound in a text with the specified method.
+
+    The body is the raw text. Short tokens and tokens which are not
+    words are skipped; every other distinct token is split once.
+
+    Returns the result for each distinct token under `"types"`, and under
+    `"tokens"` every occurrence with its offsets in the text and
+    the offsets at which it is split (see `split_text`).
+    '''
+
+    with deadline.until(request_deadline()), \
+            tracing.trace(tracing.requested(request.headers.get(tracing.TRACE_HEADER))) as trace:
+        with metrics.track("split_text") as labels:
+            method = started_methods.get(method_name)
+            labels["method"] = method_name
+            result = split_text(method, request.get_data(as_text=True))
+
+    if trace is None:
+        return jsonify(result)
+    response = jsonify({**result, "trace": trace.to_json()})
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+def unique(words: Iterable[str]) -> Iterator[str]:
+    '''
+    Skip empty and repeated words.
+    '''
+    seen = set()
+    for word in words:
+        if word and word not in seen:
+            seen.add(word)
+            yield word
+
+
+@app.route("/metrics")
+def get_metrics():
+    '''
+    Return operational metrics in the Prometheus text format.
+    '''
+
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route("/list")
@@ -45,12 +194,17 @@ def cleanup():
     been started up.
     '''
 
-    for method in started_methods.values():
-        method.stop()
+    started_methods.stop()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Compound splitter web API")
+    add_prewarm_arguments(parser)
+    args = parser.parse_args()
+
+    profiling.install_signal_handler()
     try:
+        prewarm(started_methods, args)
         app.run()
     finally:
         cleanup()
@@ -0,0 +1,187 @@
+import multiprocessing
+import os
+import platform
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .splitter import get_method, list_methods
+from .stats import percentile
+
+LATENCY_BUCKETS = [0.0001, 0.001, 0.01, 0.1, 1.0, 10.0]
+'''Upper bounds (in seconds) of the buckets of the latency histograms'''
+
+SLOWEST_WORDS = 10
+'''Number of slowest words listed per run'''
+
+
+def benchmark(test_sets: Iterable[Tuple[str, List[Tuple[str, str]]]]):
+    '''
+    Benchmark all compound split methods on each test set.
+
+    Returns a report which can be saved as JSON, with for each test set
+    and method the output of `benchmark_method`.
+    '''
+
+    methods = list_methods()
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "test_sets": {},
+    }  # type: Dict[str, Any]
+    for test_set_name, test_set in test_sets:
+        compounds = [compound for compound, expected in test_set]
+        report["test_sets"][test_set_name] = {
+            method["name"]: benchmark_method(method["name"], compounds)
+            for method in methods
+        }
+    return report
+
+
+def benchmark_method(method_name: str, compounds: List[str]):
+    '''
+    Measure the latency of a method for every word.
+
+    The cache and split store are bypassed. The words are split twice:
+    the `"cold"` run directly after startup and the `"warm"` run after that.
+    Each run is described by `latency_stats`.
+
+    The peak resident set size (in kB) is reported for the Python process
+    and for each backend subprocess, as far as the platform allows
+    (the latter is Linux only). Every method is measured in a fresh
+    process, so that the peak of one method does not carry over into
+    the next.
+    '''
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(measure_method, method_name, compounds).result()
+
+
+def measure_method(method_name: str, compounds: List[str]):
+    '''
+    Measure a method in this process, see `benchmark_method`.
+    '''
+
+    method = get_method(method_name, cached=False)
+    print("METHOD:", method_name)
+    start = perf_counter()
+    method.start()
+    startup_time = perf_counter() - start
+    try:
+        runs = {}
+        for run in ["cold", "warm"]:
+            latencies = []
+            for compound in compounds:
+                start = perf_counter()
+                method.split(compound)
+                latencies.append(perf_counter() - start)
+            runs[run] = latency_stats(compounds, latencies)
+        backends = [
+            {"pid": pid, "command": process_name(pid), "peak_rss_kb": peak_rss_kb(pid)}
+            for pid in descendants(os.getpid())
+        ]
+    finally:
+        method.stop()
+
+    return {
+        "startup_time": startup_time,
+        **runs,
+        "peak_rss_kb": {
+            # ru_maxrss is in kilobytes on Linux
+            "python": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "backends": backends,
+        }
+    }
+
+
+def latency_stats(compounds: List[str], latencies: List[float]):
+    '''
+    Summarize the latencies of a run.
+
+    Returns a dict with the number of words, total time, words per second,
+    the 50th, 95th and 99th percentile and maximum latency, a histogram
+    (number of words per bucket of `LATENCY_BUCKETS`; the last bucket
+    counts everything slower) and the slowest words.
+    '''
+    ordered = sorted(latencies)
+    total = sum(latencies)
+
+    histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+    for latency in latencies:
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        histogram[bucket] += 1
+
+    slowest = sorted(zip(latencies, compounds), reverse=True)[:SLOWEST_WORDS]
+
+    return {
+        "words": len(latencies),
+        "total_time": total,
+        "words_per_second": len(latencies) / total if total else None,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else None,
+        "histogram": {
+            "buckets": LATENCY_BUCKETS,
+            "counts": histogram,
+        },
+        "slowest": [{"word": word, "latency": latency} for latency, word in slowest],
+    }
+
+
+def descendants(pid: int) -> List[int]:
+    '''
+    Return the ids of all descendant processes (Linux only)
+    '''
+    children = []  # type: List[int]
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as children_file:
+                children += [int(child) for child in children_file.read().split()]
+    except OSError:
+        return []
+    return children + [descendant for child in children for descendant in descendants(child)]
+
+
+def process_name(pid: int) -> Optional[str]:
+    try:
+        with open(f"/proc/{pid}/comm") as comm_file:
+            return comm_file.read().strip()
+    except OSError:
+        return None
+
+
+def peak_rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def print_report(report):
+    for test_set_name, methods in report["test_sets"].items():
+        print(f"=== TEST SET {test_set_name} ===")
+        for method_name, stats in methods.items():
+            print(f"Method:    {method_name}")
+            print(f"Startup:   {stats['startup_time']:.3f} seconds")
+            for run in ["cold", "warm"]:
+                run_stats = stats[run]
+                if not run_stats["words"]:
+                    continue
+                print(f"{run.capitalize() + ':':<10} "
+                      f"{run_stats['words_per_second']:.1f} words/s, "
+                      f"p50 {run_stats['p50'] * 1000:.2f} ms, "
+                      f"p95 {run_stats['p95'] * 1000:.2f} ms, "
+                      f"p99 {run_stats['p99'] * 1000:.2f} ms, "
+                      f"max {run_stats['max'] * 1000:.2f} ms")
+            slowest = stats["warm"]["slowest"]
+            if slowest:
+                print("Slowest:   " + ", ".join(item["word"] for item in slowest))
+            print()
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.util import Finalize
+from typing import Any, Deque, Iterable, Iterator, List, Set, TextIO, Tuple
+from . import tokens
+from .splitter import BATCH_SIZE, batches, get_method, top_candidate
+
+FORMATS = ["tsv", "jsonl"]
+
+PENDING_BATCHES = 2
+'''Number of batches queued per worker, so the workers never wait for input'''
+
+SPLIT_CHAR = "_"
+'''Character between the parts in the TSV output, as in the test sets'''
+
+
+def read_words(lines: Iterable[str], tokenize: bool = False) -> Iterator[str]:
+    '''
+    Read words from a word list (one per line) or, with `tokenize`,
+    from the tokens of a corpus.
+    '''
+    for line in lines:
+        if tokenize:
+            yield from (token for token, start, end in tokens.tokenize(line) if tokens.is_word(token))
+        else:
+            word = line.strip()
+            if word:
+                yield word
+
+
+def unique(words: Iterable[str], seen: Set[str]) -> Iterator[str]:
+    '''
+    Yield each word the first time it is seen,
+    skipping the words which are already in `seen`.
+    '''
+    for word in words:
+        if word not in seen:
+            seen.add(word)
+            yield word
+
+
+def format_result(word: str, result: Any, output_format: str) -> str:
+    '''
+    Format the result of a word as a line of output.
+
+    A TSV line holds the word, the parts of the top candidate joined by
+    underscores and its score; a JSONL line holds the word and
+    the complete result.
+    '''
+    if output_format == "jsonl":
+        return json.dumps({"word": word, **result}, ensure_ascii=False) + "\n"
+
+    top = top_candidate(result)
+    if top is not None:
+        return f"{word}\t{SPLIT_CHAR.join(top['parts'])}\t{top['score']}\n"
+    return f"{word}\t{word}\t\n"
+
+
+def completed_words(path: str, output_format: str) -> Set[str]:
+    '''
+    Read the words which are already in an output file,
+    to resume an interrupted job.
+
+    A last line which was only partly written is removed.
+    '''
+    words = set()  # type: Set[str]
+    complete = 0
+    with open(path, "rb") as output_file:
+        for line in output_file:
+            if not line.endswith(b"\n"):
+                break
+            complete += len(line)
+            text = line.decode("utf-8")
+            if output_format == "jsonl":
+                words.add(json.loads(text)["word"])
+            else:
+                words.add(text.split("\t", 1)[0])
+
+    if complete < os.path.getsize(path):
+        with open(path, "r+b") as output_file:
+            output_file.truncate(complete)
+    return words
+
+
+# method of a worker process
+worker_method = None  # type: Any
+
+
+def start_worker(method_name: str):
+    global worker_method
+    worker_method = get_method(method_name)
+    worker_method.start()
+    # also runs when the pool shuts the worker down
+    Finalize(None, worker_method.stop, exitpriority=10)
+
+
+def split_in_worker(words: List[str]) -> List[Any]:
+    return worker_method.split_many(words)
+
+
+def split_words(method_name: str,
+                words: Iterable[str],
+                output: TextIO,
+                output_format: str = "tsv",
+                workers: int = 1,
+                processes: bool = False,
+                batch_size: int = BATCH_SIZE) -> int:
+    '''
+    Split words with a method and write the results to `output`,
+    in the same order as the words.
+
+    Batches of words are split by `workers` threads sharing the method
+    (e.g. to use all replicas of its backend) or, with `processes`,
+    by that many processes which each start the method. The output is
+    flushed after every batch.
+
+    Returns the number of words written.
+    '''
+    method = None
+    if processes:
+        executor = ProcessPoolExecutor(workers, initializer=start_worker, initargs=(method_name,))  # type: Executor
+        split = split_in_worker
+    else:
+        method = get_method(method_name)
+        method.start()
+        executor = ThreadPoolExecutor(workers)
+        split = method.split_many
+
+    written = 0
+    pending = deque()  # type: Deque[Tuple[List[str], Future]]
+
+    def write_oldest():
+        nonlocal written
+        batch, future = pending.popleft()
+        output.write("".join(format_result(word, result, output_format)
+                             for word, result in zip(batch, future.result())))
+        output.flush()
+        written += len(batch)
+
+    try:
+        for batch in batches(words, batch_size):
+            pending.append((batch, executor.submit(split, batch)))
+            if len(pending) >= workers * PENDING_BATCHES:
+                write_oldest()
+        while pending:
+            write_oldest()
+    finally:
+        for batch, future in pending:
+            future.cancel()
+        executor.shutdown()
+        if method is not None:
+            method.stop()
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split every distinct word of a word list or corpus")
+    parser.add_argument("method", help="name of the method")
+    parser.add_argument("input", help="file with one word per line (or - for stdin)")
+    parser.add_argument("-o", "--output",
+                        help="file to write the results to (default: stdout); "
+                        "if it exists, the words in it are skipped, to resume an earlier run")
+    parser.add_argument("--format", choices=FORMATS, default="tsv",
+                        help="output format (default: %(default)s)")
+    parser.add_argument("--tokenize", action="store_true",
+                        help="split every word in the running text of the input")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of batches split concurrently (default: %(default)s)")
+    parser.add_argument("--processes", action="store_true",
+                        help="split in worker processes instead of threads; only for methods "
+                        "without a backend server on a fixed port")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="number of words per batch (default: %(default)s)")
+    args = parser.parse_args()
+
+    seen = set()  # type: Set[str]
+    if args.output and os.path.exists(args.output):
+        seen = completed_words(args.output, args.format)
+        print(f"Resuming: {len(seen)} words already split", file=sys.stderr)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_file = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout  # type: TextIO
+    try:
+        written = split_words(args.method,
+                              unique(read_words(input_file, args.tokenize), seen),
+                              output_file,
+                              args.format,
+                              max(1, args.workers),
+                              args.processes,
+                              max(1, args.batch_size))
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    print(f"{written} words split", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import json
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 100000
+'''Default maximum number of words kept in the cache of a method'''
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+'''Default (approximate) maximum size in bytes of the cache of a method'''
+
+
+class SplitCache:
+    '''
+    Thread-safe LRU cache of split results.
+
+    Entries are evicted when there are more than `max_entries` or their
+    total (approximate) size exceeds `max_bytes`. If `ttl` is given,
+    entries expire after that many seconds. With `case_fold`,
+    words which only differ in case share an entry.
+
+    Cached results are shared between callers and should not be modified.
+    '''
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: Optional[float] = None,
+                 case_fold: bool = False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.case_fold = case_fold
+
+        # key -> (result, size, expiry time)
+        self.entries = OrderedDict()  # type: OrderedDict[str, Tuple[Any, int, float]]
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, word: str) -> str:
+        return word.casefold() if self.case_fold else word
+
+    def get(self, word: str) -> Optional[Any]:
+        '''
+        Return the cached result for a word, or None.
+        '''
+        key = self.key(word)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and entry[2] < monotonic():
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, word: str, result: Any):
+        key = self.key(word)
+        size = len(key) + len(json.dumps(result))
+        expires = monotonic() + self.ttl if self.ttl is not None else 0.0
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (result, size, expires)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key: str):
+        # caller should hold the lock
+        result, size, expires = self.entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        '''
+        Return the hit, miss and eviction counters
+        and the current size of the cache.
+        '''
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+
+caches = {}  # type: Dict[str, SplitCache]
+caches_lock = threading.Lock()
+
+
+def get_cache(name: str, options) -> Optional[SplitCache]:
+    '''
+    Return the cache shared by every instance of a method.
+
+    `options` is the `"cache"` value from the `run.json` of the method:
+    `false` disables the cache, or an object with optional keys
+    `maxEntries`, `maxBytes`, `ttl` (seconds) and `caseFold`.
+    '''
+    if options is False:
+        return None
+
+    with caches_lock:
+        if name not in caches:
+            options = options or {}
+            caches[name] = SplitCache(
+                max_entries=options.get("maxEntries", DEFAULT_MAX_ENTRIES),
+                max_bytes=options.get("maxBytes", DEFAULT_MAX_BYTES),
+                ttl=options.get("ttl"),
+                case_fold=options.get("caseFold", False))
+        return caches[name]
@@ -0,0 +1,110 @@
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from . import splitter
+from .store import get_store
+
+
+class Cascade:
+    '''
+    Method which runs an ordered cascade of other methods.
+
+    Configured in `run.json` with the protocol `"cascade"`:
+
+    - `"stages"`: a list of stages, each with the `"method"` to run and
+      optionally a `"threshold"`; a word is resolved by a stage if the
+      score of its top candidate is at least the threshold.
+    - `"agree"` (optional): a word is also resolved once this many stages
+      returned the same top candidate parts.
+
+    Only the words which are not resolved are passed on to the next stage;
+    the last stage resolves everything which is left.
+
+    Like a `Module`, the results are looked up in and written back to the
+    split store (if configured), keyed by the `"version"` of the cascade
+    along with those of its stages.
+    '''
+
+    def __init__(self, name: str, run_data, cached: bool = True):
+        self.name = name
+        self.stages = [
+            (splitter.get_method(stage["method"], cached), stage.get("threshold"))
+            for stage in run_data["stages"]
+        ]  # type: List[Tuple[Any, Optional[float]]]
+        self.agree = run_data.get("agree")
+        self.version = ",".join([str(run_data.get("version", "0"))] +
+                                [f"{method.name}:{method.version}" for method, threshold in self.stages])
+        self.store = get_store() if cached else None
+        self.resolved = Counter()  # type: Counter
+        self.lock = threading.Lock()
+
+    def split(self, compound: str):
+        return self.split_many([compound])[0]
+
+    def split_many(self, compounds: List[str]) -> List[Any]:
+        if self.store is None:
+            return self.split_stages(compounds)
+
+        unique = list(dict.fromkeys(compounds))
+        found = self.store.get_many(self.name, self.version, unique)
+        missing = [compound for compound in unique if compound not in found]
+        if missing:
+            split = dict(zip(missing, self.split_stages(missing)))
+            found.update(split)
+            self.store.put_many(self.name, self.version, split.items())
+        return [found[compound] for compound in compounds]
+
+    def split_stages(self, compounds: List[str]) -> List[Any]:
+        results = {}  # type: Dict[int, Any]
+        # top candidate parts of each word, per stage
+        agreement = [Counter() for _ in compounds]  # type: List[Counter]
+        pending = list(range(len(compounds)))
+
+        for number, (method, threshold) in enumerate(self.stages):
+            last = number == len(self.stages) - 1
+            remaining = []
+            resolved = 0
+            for i, result in zip(pending, method.split_many([compounds[i] for i in pending])):
+                top = splitter.top_candidate(result)
+                if top is not None:
+                    agreement[i][tuple(part.lower() for part in top["parts"])] += 1
+
+                if last or \
+                        (threshold is not None and top is not None and top["score"] >= threshold) or \
+                        (self.agree and top is not None and max(agreement[i].values()) >= self.agree):
+                    results[i] = result
+                    resolved += 1
+                else:
+                    remaining.append(i)
+
+            with self.lock:
+                self.resolved[method.name] += resolved
+            pending = remaining
+            if not pending:
+                break
+
+        return [results[i] for i in range(len(compounds))]
+
+    def stats(self) -> Dict[str, int]:
+        '''
+        Return the number of words resolved by each stage.
+        '''
+        with self.lock:
+            return {method.name: self.resolved[method.name] for method, threshold in self.stages}
+
+    def start(self, lazy: bool = False):
+        for method, threshold in self.stages:
+            method.start(lazy)
+
+    def stop(self):
+        for method, threshold in self.stages:
+            method.stop()
+
+    def after_fork(self, worker_index: int, worker_count: int):
+        for method, threshold in self.stages:
+            method.after_fork(worker_index, worker_count)
+        self.lock = threading.Lock()
+
+    def prepare(self):
+        # every stage is a method of its own, which is prepared separately
+        pass
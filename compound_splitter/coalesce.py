@@ -0,0 +1,159 @@
+import contextvars
+import threading
+from concurrent.futures import Future, TimeoutError
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
+from . import deadline, metrics
+from .deadline import DeadlineExceeded
+
+DEFAULT_WINDOW = 2.0
+'''Default time (in milliseconds) during which words are collected into a batch'''
+
+DEFAULT_MAX_BATCH = 64
+'''Default number of words after which a batch is sent without waiting any longer'''
+
+
+class Coalescer:
+    '''
+    Collects the words of concurrent callers into batches.
+
+    When a caller has words to split and no batch is being collected,
+    a background thread waits up to `window` seconds (or until `max_batch`
+    words have been collected) for other callers, and then splits all
+    collected words in one call to `split_many`. The callers wait for the
+    results of their words.
+
+    A word which is already waiting or being split is not added again:
+    every caller asking for it shares the same result.
+
+    Each caller only waits until its own deadline. The batch is split
+    with the latest deadline of its callers, so a caller with a short
+    deadline does not cut it short for the others. A caller does not join
+    a word which is being split with an earlier deadline than its own, but
+    queues it again. If the batch fails, its error is raised to every
+    caller waiting for its words.
+    '''
+
+    def __init__(self,
+                 name: str,
+                 split_many: Callable[[List[str]], List[Any]],
+                 window: float = DEFAULT_WINDOW / 1000,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        self.name = name
+        self.split_many_function = split_many
+        self.window = window
+        self.max_batch = max_batch
+
+        # words waiting to be split or being split
+        self.in_flight = {}  # type: Dict[str, Future]
+        # deadlines of the batches of the words being split
+        self.splitting = {}  # type: Dict[str, Optional[float]]
+        # words waiting to be split
+        self.queue = {}  # type: Dict[str, Future]
+        # deadlines of the callers waiting for the queued words
+        self.queue_deadlines = []  # type: List[Optional[float]]
+        self.collecting = False
+        self.condition = threading.Condition()
+
+    def split_many(self, words: List[str]) -> List[Any]:
+        results = []  # type: List[Any]
+        for future in self.enqueue(words):
+            try:
+                results.append(future.result(timeout=deadline.remaining()))
+            except TimeoutError:
+                if future.done():
+                    raise
+                raise DeadlineExceeded("Deadline exceeded") from None
+        return results
+
+    def enqueue(self, words: List[str]) -> List[Future]:
+        '''
+        Queue the words which are not in flight yet, and return
+        the futures of all words.
+        '''
+        futures = []  # type: List[Future]
+        until = deadline.get()
+        with self.condition:
+            waiting = False
+            for word in words:
+                future = self.in_flight.get(word)
+                if future is None or (word not in self.queue and not covers(self.splitting[word], until)):
+                    future = self.in_flight[word] = self.queue[word] = Future()
+                waiting = waiting or word in self.queue
+                futures.append(future)
+            if waiting:
+                self.queue_deadlines.append(until)
+
+            if self.queue and not self.collecting:
+                self.collecting = True
+                context = contextvars.copy_context()
+                threading.Thread(target=context.run,
+                                 args=(self.collect_and_split,),
+                                 name=f"{self.name}-coalesce",
+                                 daemon=True).start()
+            elif len(self.queue) >= self.max_batch:
+                self.condition.notify_all()
+        return futures
+
+    def collect_and_split(self):
+        collect_until = monotonic() + self.window
+        with self.condition:
+            while len(self.queue) < self.max_batch:
+                remaining = collect_until - monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch, futures, self.queue = list(self.queue), list(self.queue.values()), {}
+            deadlines, self.queue_deadlines = self.queue_deadlines, []
+            batch_deadline = None if None in deadlines else max(deadlines)
+            self.splitting.update((word, batch_deadline) for word in batch)
+            self.collecting = False
+
+        metrics.coalesced_batch_size.observe(len(batch), {"method": self.name})
+        try:
+            with deadline.until(batch_deadline, replace=True):
+                results = self.split_many_function(batch)
+        except BaseException as error:
+            # raised to the callers instead
+            self.finish(batch, futures)
+            for future in futures:
+                future.set_exception(error)
+            return
+
+        self.finish(batch, futures)
+        for future, result in zip(futures, results):
+            future.set_result(result)
+        for future in futures[len(results):]:
+            future.set_exception(RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} words"))
+
+    def finish(self, batch: List[str], futures: List[Future]):
+        with self.condition:
+            for word, future in zip(batch, futures):
+                # unless the word was queued again in the meantime
+                if self.in_flight.get(word) is future:
+                    del self.in_flight[word]
+                    self.splitting.pop(word, None)
+
+
+def covers(batch_deadline: Optional[float], until: Optional[float]) -> bool:
+    '''
+    Return whether a batch split with a deadline lasts until another deadline.
+    '''
+    return batch_deadline is None or (until is not None and batch_deadline >= until)
+
+
+def get_coalescer(name: str, options, split_many: Callable[[List[str]], List[Any]]) -> Optional[Coalescer]:
+    '''
+    Return a coalescer for a method, configured with the `"coalesce"`
+    value from its `run.json`: `true` for the defaults, or an object
+    with optional keys `window` (milliseconds) and `maxBatch`.
+    Returns None if the value is missing or false.
+    '''
+    if not options:
+        return None
+    if options is True:
+        options = {}
+    return Coalescer(name,
+                     split_many,
+                     window=options.get("window", DEFAULT_WINDOW) / 1000,
+                     max_batch=options.get("maxBatch", DEFAULT_MAX_BATCH))
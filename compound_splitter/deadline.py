@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+from typing import Iterator, Optional
+
+DEFAULT_TIMEOUT = 30.0
+'''Maximum number of seconds a backend call may take without a deadline'''
+
+DEADLINE_HEADER = "X-Deadline"
+'''Request header with the time (in milliseconds) a web API request may take'''
+
+DEADLINE_FLAG = "deadline"
+'''Request flag with the time a socket request may take, e.g. `deadline=250`'''
+
+
+class DeadlineExceeded(Exception):
+    '''
+    Raised when the deadline of a request passes.
+
+    This is not an `OSError`, so it is not mistaken for a failing
+    backend: it is passed on to the server instead.
+    '''
+    pass
+
+
+current_deadline = ContextVar("current_deadline", default=None)  # type: ContextVar[Optional[float]]
+
+
+@contextmanager
+def until(when: Optional[float], replace: bool = False) -> Iterator[None]:
+    '''
+    Set the deadline (a `time.monotonic` time) of the work in this context.
+
+    An earlier deadline which is already set stays in effect,
+    unless `replace` is set.
+    '''
+    current = current_deadline.get()
+    if not replace and current is not None and (when is None or current < when):
+        when = current
+    token = current_deadline.set(when)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def after(milliseconds: Optional[float]) -> Optional[float]:
+    '''
+    Return the deadline a number of milliseconds from now (None stays None).
+    '''
+    if milliseconds is None:
+        return None
+    return monotonic() + milliseconds / 1000
+
+
+def parse_milliseconds(value: Optional[str]) -> Optional[float]:
+    '''
+    Parse the time a request may take, as given by a client.
+
+    Raises a ValueError if it is not a positive number.
+    '''
+    if value is None or value == "":
+        return None
+    milliseconds = float(value)
+    if not milliseconds > 0:
+        raise ValueError(f"Invalid deadline: {value}")
+    return milliseconds
+
+
+def get() -> Optional[float]:
+    return current_deadline.get()
+
+
+def remaining() -> Optional[float]:
+    '''
+    Return the seconds left until the deadline, or None if there is none.
+    '''
+    when = current_deadline.get()
+    return None if when is None else when - monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check():
+    '''
+    Raise `DeadlineExceeded` if the deadline has passed.
+    '''
+    if expired():
+        raise DeadlineExceeded("Deadline exceeded")
+
+
+def timeout(default: float = DEFAULT_TIMEOUT) -> float:
+    '''
+    Return the timeout (in seconds) for a backend call: the time left
+    until the deadline, or `default` if it is further away or unset.
+
+    Raises `DeadlineExceeded` if the deadline has already passed.
+    '''
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    return min(left, default)
@@ -1,10 +1,14 @@
+import argparse
 import csv
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from difflib import SequenceMatcher
 from math import nan
-from random import sample
+from random import Random
 from time import perf_counter
-from typing import Tuple, List
-from .splitter import get_method, list_methods
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Tuple, List, Optional
+from .splitter import get_method, list_methods, top_candidate
 
 COMPOUND_SPLIT_CHAR = "_"
 '''Character used to mark where string is split by a compound splitter'''
@@ -18,6 +22,14 @@ return `waters_nood` or `water_nood` (dropping the `-s-` infix).
 Both of these should be treated as correct results.
 '''
 
+BOUNDARY_TOLERANCES = [0, 1, 2]
+'''
+Tolerances (in characters) for which split boundaries are scored.
+
+A split is counted as correct if it is at most this far
+from a split in the expected result.
+'''
+
 MAX_TEST_SET_SIZE = 100
 '''
 Maximum number of words to evaluate per test set
@@ -29,18 +41,48 @@ class MisalignedError(Exception):
     pass
 
 
-def compare_methods():
+BatchScore = NamedTuple("BatchScore", [
+    # summed counts (like `score`) per tolerance
+    ("boundaries", Dict[int, Tuple[int, int, int]]),
+    # number of words which could not be aligned with their expected split
+    ("skipped", int),
+    # words which weren't split and should not have been split
+    ("passed_correctly", int),
+    # words split exactly as expected
+    ("splitted_correctly", int),
+    # words with a split where none was expected
+    ("splitted_incorrectly", int),
+    # words which should have been split
+    ("compounds", int),
+])
+
+
+def compare_methods(parallel: int = 0, **sampling):
     '''
     Report an evaluation of all compound split methods per test set.
 
+    If `parallel` is given, the methods are run concurrently in
+    that many processes (see `call_methods_parallel`). The results
+    are the same as when running sequentially.
+
+    Other keyword arguments are passed on to `read_test_sets`.
+
     Returns a generator which returns for each test set:
     - the name of the set
     - the data
     - evaluation statistics
     '''
     
-    for test_set_name, test_set in read_test_sets():
-        stats = list(evaluate_methods(test_set))
+    test_sets = read_test_sets(**sampling)  # type: Iterable[Tuple[str, List[Tuple[str, str]]]]
+    results = None  # type: Optional[Dict[str, Dict[str, Any]]]
+    if parallel:
+        loaded = list(test_sets)
+        results = call_methods_parallel(loaded, parallel)
+        test_sets = loaded
+
+    for test_set_name, test_set in test_sets:
+        stats = list(evaluate_methods(
+            test_set, results[test_set_name] if results else None))
         stats.sort(key=lambda item: item["accuracy"], reverse=True)
 
         for stat in stats:
@@ -49,35 +91,85 @@ def compare_methods():
         yield test_set_name, test_set, stats
 
 
-def read_test_sets():
+def read_test_sets(sample_size: Optional[int] = MAX_TEST_SET_SIZE,
+                   seed: Optional[int] = None,
+                   stratify: bool = False):
     '''
     Import data from all test sets
 
     Each test set should be a CSV file in the test_sets directory.
-    If the number of items in the set is greater than 100,
-    a random sample will be used.
+    If the number of items in the set is greater than `sample_size`,
+    a random sample will be used (see `read_test_set`).
     
     Returns a generator which yields the name and data for each file.
     '''
     
     dirname = os.path.dirname(__file__)
     test_sets_dir = os.path.join(dirname, "..", "test_sets")
-    for test_set_name in os.listdir(test_sets_dir):
+    for test_set_name in sorted(os.listdir(test_sets_dir)):
         if not test_set_name.endswith(".csv"):
             continue
-        test_set = []
-        with open(os.path.join(test_sets_dir, test_set_name)) as csvfile:
-            test_reader = csv.DictReader(csvfile)
-            for row in test_reader:
-                test_set.append((row["compound"], row["expected"]))
-
-        if len(test_set) > MAX_TEST_SET_SIZE:
-            print(
-                f"{test_set_name} limited from {len(test_set)} items to {MAX_TEST_SET_SIZE} (random sample).")
-            test_set = sample(test_set, MAX_TEST_SET_SIZE)
+        test_set = list(read_test_set(
+            os.path.join(test_sets_dir, test_set_name), sample_size, seed, stratify))
         yield test_set_name, test_set
 
 
+def read_test_set(path: str,
+                  sample_size: Optional[int] = MAX_TEST_SET_SIZE,
+                  seed: Optional[int] = None,
+                  stratify: bool = False) -> Iterator[Tuple[str, str]]:
+    '''
+    Read the (compound, expected) pairs of a test set file.
+
+    Without a `sample_size`, the rows are yielded as they are read.
+    Otherwise at most `sample_size` rows are sampled in a single pass
+    (reservoir sampling), so the file is never held in memory.
+    Use a `seed` for a reproducible sample.
+
+    With `stratify`, compounds and words which should not be split are
+    sampled separately, in proportion to their number in the file.
+    '''
+
+    with open(path) as csvfile:
+        rows = ((row["compound"], row["expected"]) for row in csv.DictReader(csvfile))
+        if not sample_size:
+            yield from rows
+            return
+
+        rng = Random(seed)
+        # reservoir and number of rows read, per stratum
+        reservoirs = {}  # type: Dict[bool, List[Tuple[str, str]]]
+        counts = {}  # type: Dict[bool, int]
+        for row in rows:
+            stratum = stratify and COMPOUND_SPLIT_CHAR in row[1]
+            reservoir = reservoirs.setdefault(stratum, [])
+            counts[stratum] = counts.get(stratum, 0) + 1
+            if len(reservoir) < sample_size:
+                reservoir.append(row)
+            else:
+                index = rng.randrange(counts[stratum])
+                if index < sample_size:
+                    reservoir[index] = row
+
+    total = sum(counts.values())
+    if total <= sample_size:
+        for reservoir in reservoirs.values():
+            yield from reservoir
+        return
+
+    print(f"{os.path.basename(path)} limited from {total} items to {sample_size} (random sample).")
+    # divide the sample over the strata (largest remainder)
+    shares = {stratum: count * sample_size / total for stratum, count in counts.items()}
+    sizes = {stratum: int(share) for stratum, share in shares.items()}
+    for stratum in sorted(shares, key=lambda stratum: sizes[stratum] - shares[stratum]):
+        if sum(sizes.values()) == sample_size:
+            break
+        sizes[stratum] += 1
+
+    for stratum, reservoir in reservoirs.items():
+        yield from rng.sample(reservoir, sizes[stratum])
+
+
 def only_main(compound: str):
     """
     Convert a splitted compound into a compound only split into
@@ -93,10 +185,14 @@ def only_main(compound: str):
     return "".join(splitted[:-1]) + "_" + splitted[-1]
 
 
-def evaluate_methods(test_set: List[Tuple[str, str]]):
+def evaluate_methods(test_set: List[Tuple[str, str]],
+                     results: Optional[Dict[str, Any]] = None):
     '''
     Evaluate all compound split methods on a test set
 
+    `results` optionally contains the output of `call_method`
+    for each method name, if the methods have already been run.
+
     Returns a dictionary with evaluation results
     '''
     
@@ -105,7 +201,10 @@ def evaluate_methods(test_set: List[Tuple[str, str]]):
         (compound, only_main(expected)) for (compound, expected) in test_set)
     for method in methods:
         method_name = method["name"]
-        result = call_method(method_name, test_set)
+        if results is None:
+            result = call_method(method_name, test_set)
+        else:
+            result = results[method_name]
         splits = result["splits"]
         yield {
             **method,
@@ -133,14 +232,17 @@ def split(method, compound: str) -> str:
     returns the word without splits.
     '''
     
-    candidates = method.split(compound)["candidates"]
-    highest_score = 0
-    best_candidate = None
-    for candidate in candidates:
-        if candidate["score"] >= highest_score:
-            best_candidate = candidate
-            highest_score = candidate["score"]
+    return best_split(compound, method.split(compound))
+
 
+def best_split(compound: str, result) -> str:
+    '''
+    Select the highest-scoring candidate from the result of a method
+
+    Formatted as described in `split`.
+    '''
+
+    best_candidate = top_candidate(result)
     if best_candidate is None:
         # Nothing returned! Evaluate as if nothing was split
         return compound
@@ -159,82 +261,214 @@ def evaluate_method(method_name: str,
     - recall (ratio of places where words should have been split, where the method did so)
     - accuracy (ratio of words that were split correctly)
     - skipped (number of words with invalid results)
+    - boundaries (precision and recall of the individual splits,
+      per tolerance, see `score_batch`)
     '''
-    
-    skipped = 0
-    # number of correctly passed through words
-    # i.e. words which weren't split and should not have been split
-    passed_correctly = 0
 
-    splitted_correctly = 0  # number of correctly split words
-    splitted_incorrectly = 0  # number of words which were splitted
-    compounds = 0  # number of compounds in the test set
-
-    for (compound, expected), actual in zip(test_set, splits):
-        try:
-            false_negatives, false_positives, true_positives = score(
-                actual, expected)
-
-            if not false_negatives and not false_positives:
-                if true_positives:
-                    splitted_correctly += 1
-                else:
-                    passed_correctly += 1
-            if false_positives:
-                splitted_incorrectly += 1
-            if true_positives or false_negatives:
-                compounds += 1
-        except MisalignedError as e:
-            skipped += 1
-            print(e)
-
-    splitted = splitted_correctly + splitted_incorrectly
-
-    # TODO:
-    # precision recall
-    # word level: compound split is is either considered wrong or false
-    # sub-word level: whether the compound is split the same way (or too often, too little)
-    # sub-consideration: editing distance of splits perhaps? more complicated, but
-    # should give some nuance if a split is off by just one character it might be considered acceptable
-    # perhaps it should be a fuzzy passing grade
-    # So sub-word EXACT
-    # sub-word +1 tolerance
-    # sub-word +2 tolerance
+    scores = score_batch(test_set, splits)
+    splitted = scores.splitted_correctly + scores.splitted_incorrectly
 
     return {
-        "precision": splitted_correctly / splitted if splitted else nan,
-        "recall": splitted_correctly / compounds if compounds else nan,
-        "accuracy": (passed_correctly + splitted_correctly) / len(test_set),
-        "skipped": skipped,
+        "precision": scores.splitted_correctly / splitted if splitted else nan,
+        "recall": scores.splitted_correctly / scores.compounds if scores.compounds else nan,
+        "accuracy": (scores.passed_correctly + scores.splitted_correctly) / len(test_set),
+        "skipped": scores.skipped,
+        "boundaries": {
+            tolerance: {
+                "precision": true_positives / (true_positives + false_positives)
+                if true_positives + false_positives else nan,
+                "recall": true_positives / (true_positives + false_negatives)
+                if true_positives + false_negatives else nan,
+            }
+            for tolerance, (false_negatives, false_positives, true_positives) in scores.boundaries.items()
+        },
     }
 
 
-def call_method(method_name: str, test_set: List[Tuple[str, str]]):
+def call_method(method_name: str, test_set: List[Tuple[str, str]], concurrency: int = 1):
     '''
     Call a compound split method and run it for everything
     in a test set.
+
+    With a `concurrency` above 1, the test set is divided into
+    that many parts which are split concurrently.
     '''
     
     method = get_method(method_name)
     print("METHOD:", method_name)
     start = perf_counter()
     method.start()
-    splits = []
+    compounds = [compound for compound, expected in test_set]
     started = perf_counter()
     try:
-        for compound, expected in test_set:
-            actual = split(method, compound)
-
-            splits.append(actual)
+        if concurrency > 1:
+            size = max(1, -(-len(compounds) // concurrency))
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = [result
+                           for part in executor.map(method.split_many,
+                                                    [compounds[i:i + size] for i in range(0, len(compounds), size)])
+                           for result in part]
+        else:
+            results = method.split_many(compounds)
+        splits = [best_split(compound, result)
+                  for compound, result in zip(compounds, results)]
     finally:
         done = perf_counter()
         method.stop()
 
-    return {
+    result = {
         "splits": splits,
         "startup_time": started - start,
         "parse_time": done - started
     }
+    if hasattr(method, "stats"):
+        # words resolved per stage of a cascade
+        result["stages"] = method.stats()
+    return result
+
+
+def call_methods_parallel(test_sets: List[Tuple[str, List[Tuple[str, str]]]], processes: int):
+    '''
+    Run every method on every test set, with the methods running
+    concurrently in a pool of processes.
+
+    Each method runs the test sets one after another in a single process,
+    because most methods use a fixed port for their backend. Within a
+    test set, a method splits words concurrently if the `"concurrency"`
+    in its `run.json` is above 1.
+
+    Returns a dict with, for each test set name, a dict with
+    the output of `call_method` for each method name.
+    '''
+
+    with ProcessPoolExecutor(processes) as executor:
+        futures = {
+            method["name"]: executor.submit(call_method_on_test_sets,
+                                            method["name"],
+                                            [test_set for _, test_set in test_sets],
+                                            method.get("concurrency", 1))
+            for method in list_methods()
+        }
+        method_results = {name: future.result() for name, future in futures.items()}
+
+    return {
+        test_set_name: {name: results[i] for name, results in method_results.items()}
+        for i, (test_set_name, _) in enumerate(test_sets)
+    }
+
+
+def call_method_on_test_sets(method_name: str,
+                             test_sets: List[List[Tuple[str, str]]],
+                             concurrency: int):
+    return [call_method(method_name, test_set, concurrency) for test_set in test_sets]
+
+
+def split_offsets(split: str) -> Tuple[str, List[int]]:
+    '''
+    Convert a split word to the unsplit word and the
+    offsets in it where it is split.
+
+    E.g. `"kwaliteits_controle"` -> `("kwaliteitscontrole", [10])`
+    '''
+    parts = split.split(COMPOUND_SPLIT_CHAR)
+    offsets = []
+    offset = 0
+    for part in parts[:-1]:
+        offset += len(part)
+        offsets.append(offset)
+    return "".join(parts), offsets
+
+
+def score_offsets(actual: List[int], expected: List[int], tolerance: int) -> Tuple[int, int, int]:
+    '''
+    Score split offsets, counting offsets at most `tolerance`
+    characters apart as the same split.
+
+    Returns a tuple like `score`.
+    '''
+    actual_index = 0
+    expected_index = 0
+    true_positives = 0
+    while actual_index < len(actual) and expected_index < len(expected):
+        difference = actual[actual_index] - expected[expected_index]
+        if abs(difference) <= tolerance:
+            true_positives += 1
+            actual_index += 1
+            expected_index += 1
+        elif difference < 0:
+            actual_index += 1
+        else:
+            expected_index += 1
+
+    return len(expected) - true_positives, \
+        len(actual) - true_positives, \
+        true_positives
+
+
+def align_offsets(actual_word: str, actual_offsets: List[int], expected_word: str) -> Optional[List[int]]:
+    '''
+    Map split offsets in a word onto the offsets in the expected spelling
+    of that word, which may differ by an infix (see `COMPOUND_INFIX_TOLERANCE`).
+
+    E.g. offset 4 in `"huisjacht"` is offset 6 in `"huizenjacht"`.
+    Returns None if the words differ by more than that.
+    '''
+    if actual_word == expected_word:
+        return actual_offsets
+
+    opcodes = SequenceMatcher(None, actual_word, expected_word, autojunk=False).get_opcodes()
+    if any(tag != "equal" and max(i2 - i1, j2 - j1) > COMPOUND_INFIX_TOLERANCE
+           for tag, i1, i2, j1, j2 in opcodes):
+        return None
+
+    aligned = []
+    for offset in actual_offsets:
+        for tag, i1, i2, j1, j2 in opcodes:
+            if i1 <= offset < i2:
+                aligned.append(j1 + min(offset - i1, j2 - j1))
+                break
+        else:
+            aligned.append(len(expected_word))
+    return aligned
+
+
+def score_batch(test_set: List[Tuple[str, str]], splits: List[str]) -> BatchScore:
+    '''
+    Score the splits of a whole test set for every tolerance
+    in `BOUNDARY_TOLERANCES`, in one pass.
+
+    Splits are compared by their offsets in the unsplit word. If the
+    method changed the word itself (e.g. dropped an infix), the offsets
+    are first aligned with the expected word (see `align_offsets`);
+    words which cannot be aligned are skipped.
+
+    The words are counted as correct or not by their exact
+    (tolerance 0) splits.
+    '''
+    totals = {tolerance: [0, 0, 0] for tolerance in BOUNDARY_TOLERANCES}
+    words = {"skipped": 0, "passed_correctly": 0, "splitted_correctly": 0, "splitted_incorrectly": 0, "compounds": 0}
+    for (compound, expected), actual in zip(test_set, splits):
+        expected_word, expected_offsets = split_offsets(expected)
+        actual_offsets = align_offsets(*split_offsets(actual), expected_word)
+        if actual_offsets is None:
+            words["skipped"] += 1
+            continue
+
+        for tolerance in BOUNDARY_TOLERANCES:
+            for i, count in enumerate(score_offsets(actual_offsets, expected_offsets, tolerance)):
+                totals[tolerance][i] += count
+
+        false_negatives, false_positives, true_positives = score_offsets(actual_offsets, expected_offsets, 0)
+        if not false_negatives and not false_positives:
+            words["splitted_correctly" if true_positives else "passed_correctly"] += 1
+        if false_positives:
+            words["splitted_incorrectly"] += 1
+        if true_positives or false_negatives:
+            words["compounds"] += 1
+
+    return BatchScore(
+        boundaries={tolerance: (counts[0], counts[1], counts[2]) for tolerance, counts in totals.items()},
+        **words)
 
 
 def score(actual: str, expected: str) -> Tuple[int, int, int]:  # noqa: C901
@@ -369,8 +603,30 @@ def splits_table(test_set, stats):
         print(str.join(",", row))
 
 
-if __name__ == '__main__':
-    for test_set_name, test_set, stats in compare_methods():
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the compound split methods")
+    parser.add_argument("--parallel", type=int, default=0, metavar="PROCESSES",
+                        help="run the methods concurrently in this many processes")
+    parser.add_argument("--sample-size", type=int, default=MAX_TEST_SET_SIZE,
+                        help=f"maximum number of words evaluated per test set, 0 for all (default: {MAX_TEST_SET_SIZE})")
+    parser.add_argument("--seed", type=int,
+                        help="seed for sampling the test sets, for reproducible results")
+    parser.add_argument("--stratify", action="store_true",
+                        help="sample compounds and non-compounds in proportion to the test set")
+    parser.add_argument("--benchmark", metavar="REPORT",
+                        help="measure latencies and resource use instead, and write a JSON report to this file")
+    args = parser.parse_args()
+    sampling = {"sample_size": args.sample_size, "seed": args.seed, "stratify": args.stratify}  # type: Dict[str, Any]
+
+    if args.benchmark:
+        from .benchmark import benchmark, print_report
+        report = benchmark(read_test_sets(**sampling))
+        with open(args.benchmark, "w") as report_file:
+            json.dump(report, report_file, indent=4)
+        print_report(report)
+        return
+
+    for test_set_name, test_set, stats in compare_methods(args.parallel, **sampling):
         print(f"=== TEST SET {test_set_name} ===")
         splits_table(test_set, stats)
         for stat in stats:
@@ -386,6 +642,15 @@ if __name__ == '__main__':
                 print(f"Skipped:   {skipped} !!!")
             print("F1:        " + str(2 * (precision*recall) / (precision+recall)))
             print(f"Duration:  {parse_time} seconds")
+            if "stages" in stat:
+                print("Stages:    " + ", ".join(f"{name} {count}" for name, count in stat["stages"].items()))
             print(f"Precision: {precision}")
             print(f"Recall:    {recall}")
+            for tolerance, boundaries in stat["boundaries"].items():
+                label = f"±{tolerance}" if tolerance else "exact"
+                print(f"Splits {label + ':':<6} precision {boundaries['precision']}, recall {boundaries['recall']}")
             print(f"Accuracy:  {accuracy}\n\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError, wait
+from time import monotonic
+from typing import Deque, List, Optional
+from .stats import percentile
+
+HEDGE_PERCENTILE = 95
+'''Calls slower than this percentile of the recent latencies are hedged'''
+
+LATENCY_SAMPLES = 1000
+'''Number of recent latencies kept per backend'''
+
+MIN_SAMPLES = 20
+'''Number of latencies needed before calls are hedged'''
+
+
+class LatencyTracker:
+    '''
+    Recent latencies of the calls to a backend, to decide when
+    a call is slow enough to send it to another replica as well.
+    '''
+
+    def __init__(self,
+                 percent: float = HEDGE_PERCENTILE,
+                 samples: int = LATENCY_SAMPLES,
+                 min_samples: int = MIN_SAMPLES):
+        self.percent = percent
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=samples)  # type: Deque[float]
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        '''
+        Return how long to wait for a call before hedging it,
+        or None if there are not enough latencies yet.
+        '''
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return percentile(ordered, self.percent)
+
+
+def first_result(futures: List[Future], timeout: Optional[float] = None):
+    '''
+    Return the result of the future which succeeds first.
+
+    If all of them fail, the exception of the first one is raised.
+    Raises `TimeoutError` if none succeeded within `timeout` seconds.
+    '''
+    until = None if timeout is None else monotonic() + timeout
+    pending = set(futures)
+    while pending:
+        left = None if until is None else max(0.0, until - monotonic())
+        done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError()
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+    return futures[0].result()
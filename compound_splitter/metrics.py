@@ -0,0 +1,272 @@
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import cache, supervisor
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+'''Content type of the Prometheus text format'''
+
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0]
+'''Upper bounds (in seconds) of the buckets of the request latency histogram'''
+
+BATCH_SIZE_BUCKETS = [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 128.0, 256.0, 512.0]
+'''Upper bounds of the buckets of the coalesced batch size histogram'''
+
+# sorted (name, value) pairs of the labels of a sample
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    '''
+    A metric with a value per combination of labels.
+    '''
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.lock = threading.Lock()
+
+    def key(self, labels: Optional[Dict[str, str]]) -> Labels:
+        return tuple(sorted((name, str(value)) for name, value in (labels or {}).items()))
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}",
+                f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        super().__init__(name, description)
+        self.values = {}  # type: Dict[Labels, float]
+
+    def inc(self, labels: Optional[Dict[str, str]] = None, *, amount: float = 1):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{format_labels(labels)} {format_value(value)}"
+                    for labels, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Optional[Dict[str, str]] = None, *, amount: float = 1):
+        self.inc(labels, amount=-amount)
+
+    def set(self, value: float, labels: Optional[Dict[str, str]] = None):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: List[float]):
+        super().__init__(name, description)
+        self.buckets = sorted(buckets) + [float("inf")]
+        # labels -> count per bucket (not cumulative), followed by the sum
+        self.values = {}  # type: Dict[Labels, List[float]]
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None):
+        key = self.key(labels)
+        bucket = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self.lock:
+            counts = self.values.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bucket] += 1
+            counts[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            values = sorted((labels, list(counts)) for labels, counts in self.values.items())
+        for labels, counts in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = labels + (("le", format_value(bound)),)
+                lines.append(f"{self.name}_bucket{format_labels(bucket_labels)} {format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    '''
+    Collection of metrics which can be rendered in the Prometheus text format.
+
+    Besides the metrics updated as things happen, collectors are called
+    on each render to read out state kept elsewhere (e.g. cache counters).
+    '''
+
+    def __init__(self):
+        self.metrics = []  # type: List[Metric]
+        self.collectors = []  # type: List[Callable[[], Iterable[Metric]]]
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self.register(Counter(name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self.register(Gauge(name, description))
+
+    def histogram(self, name: str, description: str, buckets: List[float]) -> Histogram:
+        return self.register(Histogram(name, description, buckets))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], Iterable[Metric]]):
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []  # type: List[str]
+        for metric in self.metrics:
+            lines += metric.render()
+        for collect in self.collectors:
+            for metric in collect():
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.counter(
+    "compound_splitter_requests_total",
+    "Split requests, by endpoint and method")
+request_errors = registry.counter(
+    "compound_splitter_request_errors_total",
+    "Split requests which failed, by endpoint and method")
+request_latency = registry.histogram(
+    "compound_splitter_request_duration_seconds",
+    "Duration of split requests, by endpoint and method",
+    LATENCY_BUCKETS)
+requests_in_flight = registry.gauge(
+    "compound_splitter_requests_in_flight",
+    "Split requests currently being handled, by endpoint")
+startup_duration = registry.gauge(
+    "compound_splitter_method_startup_seconds",
+    "Duration of the last start of a method")
+coalesced_batch_size = registry.histogram(
+    "compound_splitter_coalesced_batch_size",
+    "Number of words in the batches collected from concurrent requests, by method",
+    BATCH_SIZE_BUCKETS)
+hedged_calls = registry.counter(
+    "compound_splitter_backend_hedged_total",
+    "Slow backend calls which were also sent to another replica")
+backend_retries = registry.counter(
+    "compound_splitter_backend_retries_total",
+    "Backend calls which were retried, e.g. on a stale connection or a crashed worker")
+
+
+@registry.collector
+def collect_caches() -> Iterable[Metric]:
+    hits = Counter("compound_splitter_cache_hits_total", "Cache hits, by method")
+    misses = Counter("compound_splitter_cache_misses_total", "Cache misses, by method")
+    evictions = Counter("compound_splitter_cache_evictions_total", "Cache evictions, by method")
+    ratio = Gauge("compound_splitter_cache_hit_ratio", "Fraction of cache lookups which hit, by method")
+    entries = Gauge("compound_splitter_cache_entries", "Words in the cache, by method")
+    size = Gauge("compound_splitter_cache_bytes", "Approximate size of the cache, by method")
+
+    for name, split_cache in sorted(cache.caches.items()):
+        stats = split_cache.stats()
+        hits.inc({"method": name}, amount=stats["hits"])
+        misses.inc({"method": name}, amount=stats["misses"])
+        evictions.inc({"method": name}, amount=stats["evictions"])
+        lookups = stats["hits"] + stats["misses"]
+        ratio.set(stats["hits"] / lookups if lookups else 0, {"method": name})
+        entries.set(stats["entries"], {"method": name})
+        size.set(stats["bytes"], {"method": name})
+
+    return [hits, misses, evictions, ratio, entries, size]
+
+
+@registry.collector
+def collect_supervisors() -> Iterable[Metric]:
+    restarts = Counter("compound_splitter_backend_restarts_total", "Restarts of a backend process")
+    errors = Counter("compound_splitter_backend_errors_total", "Failed calls to a backend")
+    ready = Gauge("compound_splitter_backend_ready", "Whether a backend is accepting calls")
+
+    for backend in supervisor.supervisors:
+        restarts.inc({"backend": backend.name}, amount=backend.restarts)
+        errors.inc({"backend": backend.name}, amount=backend.errors)
+        ready.set(1 if backend.ready else 0, {"backend": backend.name})
+
+    return [restarts, errors, ready]
+
+
+@contextmanager
+def track(endpoint: str, method: str = "") -> Iterator[Dict[str, str]]:
+    '''
+    Count and time a request to an endpoint.
+
+    Yields the labels of the request, so the method can be filled in
+    once it is known to exist (to keep unknown names out of the metrics).
+    '''
+    labels = {"endpoint": endpoint, "method": method}
+    requests_in_flight.inc({"endpoint": endpoint})
+    start = perf_counter()
+    try:
+        yield labels
+    except Exception:
+        request_errors.inc(labels)
+        raise
+    finally:
+        requests_in_flight.dec({"endpoint": endpoint})
+        requests_total.inc(labels)
+        request_latency.observe(perf_counter() - start, labels)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str, port: int) -> ThreadingHTTPServer:
+    '''
+    Serve `/metrics` over HTTP from a background thread.
+    '''
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
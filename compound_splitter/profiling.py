@@ -0,0 +1,103 @@
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+from time import monotonic, sleep
+from types import FrameType
+from typing import Optional
+
+PROFILE_DIR_VARIABLE = "COMPOUND_SPLITTER_PROFILE_DIR"
+'''Environment variable with the directory where profiles are written'''
+
+PROFILE_SECONDS = 30
+'''Default length of the window of traffic which is profiled'''
+
+SAMPLE_INTERVAL = 0.005
+'''Seconds between two samples of the stacks of all threads'''
+
+logger = logging.getLogger(__name__)
+
+profiling_lock = threading.Lock()
+
+
+def sample(seconds: float, interval: float = SAMPLE_INTERVAL) -> Counter:
+    '''
+    Sample the stacks of all other threads for some seconds.
+
+    Returns the number of times each stack was seen, keyed by the
+    stack in the "folded" format: the thread name and the functions
+    from the outermost call inwards, separated by semicolons.
+    '''
+    own_id = threading.get_ident()
+    stacks = Counter()  # type: Counter
+    end = monotonic() + seconds
+    while monotonic() < end:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, thread_frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            functions = []
+            frame = thread_frame  # type: Optional[FrameType]
+            while frame is not None:
+                code = frame.f_code
+                functions.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            functions.append(names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(functions))] += 1
+        sleep(interval)
+    return stacks
+
+
+def profile(seconds: float = PROFILE_SECONDS, path: Optional[str] = None) -> Optional[str]:
+    '''
+    Profile the running process for a window of traffic
+    and write the result to a file.
+
+    The file lists each sampled stack with its count, in the folded
+    format understood by e.g. flamegraph.pl and speedscope.
+    Returns the path of the file, or None if a profile is already
+    being taken.
+    '''
+    if not profiling_lock.acquire(blocking=False):
+        return None
+    try:
+        if path is None:
+            directory = os.environ.get(PROFILE_DIR_VARIABLE, tempfile.gettempdir())
+            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(directory, f"compound-splitter-{os.getpid()}-{timestamp}.folded")
+
+        stacks = sample(seconds)
+        with open(path, "w") as profile_file:
+            for stack, count in stacks.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        return path
+    finally:
+        profiling_lock.release()
+
+
+def profile_async(seconds: float = PROFILE_SECONDS):
+    '''
+    Profile the process in a background thread, logging where the result is written.
+    '''
+    def run():
+        logger.info("Profiling for %s seconds", seconds)
+        path = profile(seconds)
+        if path is None:
+            logger.warning("Already profiling")
+        else:
+            logger.info("Profile written to %s", path)
+
+    threading.Thread(target=run, name="profiler", daemon=True).start()
+
+
+def install_signal_handler(signal_number: int = signal.SIGUSR1):
+    '''
+    Profile a window of traffic when the process receives a signal,
+    e.g. `kill -USR1 <pid>`. Should be called from the main thread.
+    '''
+    signal.signal(signal_number, lambda number, frame: profile_async())
@@ -0,0 +1,138 @@
+import importlib
+import importlib.util
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:  # Python 3.7
+    try:
+        from importlib_metadata import entry_points  # type: ignore
+    except ImportError:
+        entry_points = None  # type: ignore
+
+base_path = os.path.dirname(os.path.dirname(__file__))
+METHODS_DIR = os.path.join(base_path, 'methods')
+
+ENTRY_POINT_GROUP = "compound_splitter.methods"
+'''
+Entry point group of methods installed by other packages.
+
+The name of an entry point is the name of the method, its value the
+module implementing it, with a `run.json` next to it, e.g.:
+
+    [project.entry-points."compound_splitter.methods"]
+    my-method = "my_package.my_method"
+'''
+
+
+class UnknownMethod(LookupError):
+    pass
+
+
+class MethodRegistry:
+    '''
+    The available methods, found in the `methods` directory and
+    through entry points.
+
+    Methods are found and their `run.json` read on first use only,
+    and then kept. The module of a method is only imported when the
+    method is actually used.
+    '''
+
+    def __init__(self, methods_dir: str = METHODS_DIR):
+        self.methods_dir = methods_dir
+        # name -> (module name, run.json contents)
+        self.methods = None  # type: Optional[Dict[str, Tuple[str, Any]]]
+        self.modules = {}  # type: Dict[str, Any]
+        self.lock = threading.Lock()
+
+    def scan(self) -> Dict[str, Tuple[str, Any]]:
+        with self.lock:
+            if self.methods is None:
+                methods = {}  # type: Dict[str, Tuple[str, Any]]
+                for name in sorted(os.listdir(self.methods_dir)):
+                    run_path = os.path.join(self.methods_dir, name, 'run.json')
+                    if os.path.isfile(run_path):
+                        methods[name] = (f"methods.{name}", read_run_data(run_path))
+                for name, module_name in discover_plugins():
+                    if name in methods:
+                        print(f"Method {name} is already defined, skipping plugin {module_name}")
+                        continue
+                    try:
+                        methods[name] = (module_name, read_run_data(plugin_run_path(module_name)))
+                    except (ImportError, OSError, ValueError) as error:
+                        print(f"Could not load method {name} from {module_name}: {error}")
+                self.methods = methods
+            return self.methods
+
+    def refresh(self):
+        '''
+        Forget the methods found so far, so they are looked up again.
+        '''
+        with self.lock:
+            self.methods = None
+
+    def names(self) -> List[str]:
+        return list(self.scan())
+
+    def get(self, name: str) -> Dict[str, Any]:
+        '''
+        Return the contents of the `run.json` of a method.
+
+        The returned dict is shared and should not be modified.
+        '''
+        try:
+            return self.scan()[name][1]
+        except KeyError:
+            raise UnknownMethod(f"Unknown method: {name}") from None
+
+    def load(self, name: str):
+        '''
+        Import the module of a method (once).
+        '''
+        module = self.modules.get(name)
+        if module is None:
+            try:
+                module_name = self.scan()[name][0]
+            except KeyError:
+                raise UnknownMethod(f"Unknown method: {name}") from None
+            # imports are thread-safe, so no need to lock
+            module = self.modules[name] = importlib.import_module(module_name)
+        return module
+
+
+def read_run_data(path: str):
+    with open(path) as run_json:
+        return json.load(run_json)
+
+
+def discover_plugins() -> List[Tuple[str, str]]:
+    '''
+    Return the name and module name of each method
+    registered as an entry point.
+    '''
+    if entry_points is None:
+        return []
+    # a dict of groups before Python 3.10, with a `select` method since
+    found = entry_points()  # type: Any
+    if hasattr(found, "select"):
+        group = found.select(group=ENTRY_POINT_GROUP)
+    else:
+        group = found.get(ENTRY_POINT_GROUP, [])
+    return [(entry_point.name, entry_point.value) for entry_point in group]
+
+
+def plugin_run_path(module_name: str) -> str:
+    '''
+    Find the `run.json` next to a module, without importing it.
+    '''
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or spec.origin is None:
+        raise ImportError(f"Module {module_name} not found")
+    return os.path.join(os.path.dirname(spec.origin), 'run.json')
+
+
+registry = MethodRegistry()
@@ -0,0 +1,234 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+from time import sleep
+from socketserver import ThreadingMixIn
+from typing import Dict, Optional
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+from . import metrics, profiling, supervisor
+from .api_web import app, started_methods
+from .splitter import add_prewarm_arguments, prewarm
+
+HOST, PORT = "localhost", 5000
+
+BACKLOG = 128
+'''Maximum number of connections waiting to be accepted'''
+
+WAIT_INTERVAL = 0.1
+'''Seconds between checks whether a worker process has exited'''
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    '''
+    WSGI server handling each connection in a thread.
+
+    On `server_close`, it waits until the requests in progress
+    have been handled.
+    '''
+    daemon_threads = False
+    block_on_close = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def listen(host: str, port: int) -> socket.socket:
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(BACKLOG)
+    # workers wake up together when a connection arrives: only one
+    # accepts it, the others should not block waiting for the next
+    listener.setblocking(False)
+    return listener
+
+
+def make_server(listener: socket.socket, quiet: bool = True) -> ThreadingWSGIServer:
+    '''
+    Create a server for the web API, accepting connections on an
+    (inherited) listening socket.
+    '''
+    server = ThreadingWSGIServer(listener.getsockname()[:2],
+                                 QuietHandler if quiet else WSGIRequestHandler,
+                                 bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    host, port = listener.getsockname()[:2]
+    server.server_name = socket.getfqdn(host)
+    server.server_port = port
+    server.setup_environ()
+    server.set_app(app)
+    return server
+
+
+def serve(listener: socket.socket, quiet: bool = True):
+    '''
+    Serve until SIGTERM or SIGINT, then finish the requests in progress.
+    '''
+    server = make_server(listener, quiet)
+
+    def shutdown(number, frame):
+        # shutdown() waits for serve_forever() to return, which runs in this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    server.serve_forever()
+    server.server_close()
+
+
+class WorkerProcesses:
+    '''
+    Forked worker processes which serve from the same listening socket.
+
+    If `metrics_port` is set, each worker serves `/metrics` at the port
+    after it plus its index (the main process at `metrics_port` itself).
+    '''
+
+    def __init__(self, listener: socket.socket, worker_count: int, quiet: bool = True,
+                 metrics_port: Optional[int] = None):
+        self.listener = listener
+        self.worker_count = worker_count
+        self.quiet = quiet
+        self.metrics_port = metrics_port
+        # worker index by process ID
+        self.workers = {}  # type: Dict[int, int]
+        self.stopping = False
+
+    def fork(self, worker_index: int):
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker(worker_index)
+        self.workers[pid] = worker_index
+
+    def run_worker(self, worker_index: int):
+        '''
+        Run a forked worker process. Never returns.
+        '''
+        # the handlers of the main process would stop the other workers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        self.workers = {}
+        code = 0
+        try:
+            started_methods.after_fork(worker_index, self.worker_count)
+            if self.metrics_port is not None:
+                host = self.listener.getsockname()[0]
+                metrics.serve(host, self.metrics_port + 1 + worker_index)
+            serve(self.listener, self.quiet)
+            # only stops what this process started itself: shared backends are detached
+            started_methods.stop()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            # the backends belong to the parent: skip its exit handlers
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def stop(self, number=None, frame=None):
+        '''
+        Ask the workers to stop, after finishing their requests.
+        '''
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def wait(self):
+        '''
+        Wait until every worker has stopped, and replace any worker
+        which dies before that.
+
+        Only the workers are waited for: the backends are child
+        processes too, and are waited for by their own monitors.
+        '''
+        while self.workers:
+            for pid in list(self.workers):
+                try:
+                    exited, status = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    exited, status = pid, 0
+                if exited:
+                    self.replace(pid, status)
+            sleep(WAIT_INTERVAL)
+
+    def replace(self, pid: int, status: int):
+        worker_index = self.workers.pop(pid)
+        if not self.stopping:
+            print(f"Worker {worker_index} exited with status {status}, restarting")
+            self.fork(worker_index)
+
+
+def serve_forked(listener: socket.socket, worker_count: int, quiet: bool = True,
+                 metrics_port: Optional[int] = None):
+    '''
+    Fork worker processes which serve from the same listening socket,
+    and replace any worker which dies.
+
+    The backends shared with the workers are health checked by this
+    process, which restarts them when they hang.
+
+    On SIGTERM or SIGINT, the workers are asked to stop and this
+    waits until they have finished their requests.
+    '''
+    workers = WorkerProcesses(listener, worker_count, quiet, metrics_port)
+    for worker_index in range(worker_count):
+        workers.fork(worker_index)
+    signal.signal(signal.SIGTERM, workers.stop)
+    signal.signal(signal.SIGINT, workers.stop)
+
+    for backend in supervisor.supervisors:
+        if backend.owner:
+            backend.watch()
+    metrics_server = None
+    if metrics_port is not None:
+        metrics_server = metrics.serve(listener.getsockname()[0], metrics_port)
+    try:
+        workers.wait()
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the compound splitter web API with multiple worker processes")
+    parser.add_argument("--host", default=HOST, help="host to listen at (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen at (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes, each handling requests in threads "
+                        "(default: the number of CPUs)")
+    parser.add_argument("--log-requests", action="store_true", help="log every request")
+    parser.add_argument("--metrics-port", type=int,
+                        help="with multiple workers, serve /metrics of the main process at this port "
+                        "and of each worker at the ports after it")
+    add_prewarm_arguments(parser)
+    args = parser.parse_args()
+
+    listener = listen(args.host, args.port)
+    profiling.install_signal_handler()
+    try:
+        # started before forking, so the workers share the backends
+        prewarm(started_methods, args)
+        print(f"Listening at http://{args.host}:{args.port} with {args.workers} workers")
+        if args.workers > 1:
+            serve_forked(listener, args.workers, not args.log_requests, args.metrics_port)
+        else:
+            serve(listener, not args.log_requests)
+    finally:
+        listener.close()
+        started_methods.stop()
+
+
+if __name__ == '__main__':
+    main()
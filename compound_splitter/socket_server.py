@@ -1,8 +1,73 @@
+import argparse
+import asyncio
+import logging
 import socketserver
-from typing import cast, Dict
-from compound_splitter.splitter import get_method, Module
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from compound_splitter import deadline, metrics, profiling, tracing
+from compound_splitter.deadline import DeadlineExceeded
+from compound_splitter.splitter import StartedMethods, add_prewarm_arguments, prewarm
 
-started_methods = cast(Dict[str, Module], {})
+HOST, PORT = "localhost", 7005
+
+METRICS_PORT = 7006
+'''Default port at which `/metrics` is served over HTTP'''
+
+MAX_IN_FLIGHT = 32
+'''Maximum number of requests of one connection that are split concurrently'''
+
+EXECUTOR_WORKERS = 32
+'''Number of threads which run blocking method calls in asyncio mode'''
+
+KEEPALIVE_FLAG = "keepalive"
+
+logger = logging.getLogger(__name__)
+
+started_methods = StartedMethods()
+
+
+def parse_request(datastring: str) -> Tuple[str, str, List[str]]:
+    '''
+    Parse a request of the form "lemma,method"
+
+    Requests may be followed by flags, e.g. "lemma,method,keepalive".
+    Returns the lemma, the method name and the flags.
+    '''
+    parsed = datastring.split(",")
+    if len(parsed) < 2:
+        raise ValueError('Input must be of form "lemma,method".')
+    compound, method_name, *flags = parsed
+    return compound, method_name, flags
+
+
+def flag_deadline(flags: List[str]) -> Optional[float]:
+    '''
+    Return the deadline set with a flag like `deadline=250` (milliseconds), if any.
+    '''
+    for flag in flags:
+        name, _, value = flag.partition("=")
+        if name == deadline.DEADLINE_FLAG:
+            return deadline.after(deadline.parse_milliseconds(value))
+    return None
+
+
+def split(compound: str, method_name: str, trace: bool = False, until: Optional[float] = None) -> str:
+    '''
+    Split a compound and return the parts of the top result
+    as a comma-separated string
+
+    If `trace` is set, the timed spans of the request are logged.
+    If the deadline `until` passes, `DeadlineExceeded` is raised.
+    '''
+    with deadline.until(until), tracing.trace(trace) as active:
+        with metrics.track("socket") as labels:
+            method = started_methods.get(method_name)
+            labels["method"] = method_name
+            results = method.split(compound)
+    if active is not None:
+        logger.info("Trace of %s,%s:\n%s", compound, method_name, active.format())
+    top_result = results['candidates'][0]
+    return ','.join(top_result['parts'])
 
 
 class TCPHandler(socketserver.BaseRequestHandler):
@@ -22,31 +87,153 @@ class TCPHandler(socketserver.BaseRequestHandler):
 
         # parse data
         datastring = self.data.decode('UTF-8')  # convert from binary
-        print('{} wrote: "{}"'.format(self.client_address[0], datastring))
-        parsed = datastring.split(",")
-        if len(parsed) == 2:
-            compound, method_name = parsed
-        else:
-            raise ValueError('Input must be of form "lemma,method".')
+        logger.debug('%s wrote: "%s"', self.client_address[0], datastring)
+        compound, method_name, flags = parse_request(datastring)
 
         # split
-        print("Splitting {} with method {}".format(compound, method_name))
-        if method_name in started_methods:
-            method = started_methods[method_name]
+        try:
+            output = split(compound, method_name, tracing.TRACE_FLAG in flags, flag_deadline(flags))
+        except (DeadlineExceeded, OSError) as error:
+            logger.warning("Splitting %s with %s failed: %s", compound, method_name, error)
+            output = ""
+        logger.debug("Top result: %s", output.replace(",", " + "))
+
+        # send back parts
+        self.request.sendall(output.encode('UTF-8'))
+
+
+class RequestReader:
+    '''
+    Reads the requests of a connection.
+
+    Until a request with the `keepalive` flag has been read (see
+    `AsyncServer`), a request need not end with a newline.
+    '''
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self.reader = reader
+        self.buffer = b""
+        self.keepalive = False
+        self.eof = False
+
+    async def read(self) -> List[str]:
+        '''
+        Return the requests which have been received completely (if any).
+
+        At the end of the connection, the remaining data counts as
+        a request and `eof` is set.
+        '''
+        chunk = await self.reader.read(65536)
+        if not chunk:
+            self.eof = True
+            lines, self.buffer = [self.buffer], b""
+        elif not self.keepalive and b"\n" not in self.buffer + chunk:
+            # one-shot request without a newline
+            lines, self.buffer = [self.buffer + chunk], b""
         else:
-            method = get_method(method_name)
-            method.start()
-            started_methods[method_name] = method
-        results = method.split(compound)
+            *lines, self.buffer = (self.buffer + chunk).split(b"\n")
+        datastrings = (line.decode('UTF-8').strip() for line in lines)
+        return [datastring for datastring in datastrings if datastring]
 
-        # convert result to succinct format
-        top_result = results['candidates'][0]
-        parts = top_result['parts']
-        print("Top result:", " + ".join(parts))
-        output = ','.join(parts).encode('UTF-8')
 
-        # send back parts
-        self.request.sendall(output)
+class AsyncServer:
+    '''
+    Socket server which serves many connections concurrently.
+
+    A request without the `keepalive` flag is answered as by `TCPHandler`:
+    the reply is not terminated and the connection is closed afterwards.
+
+    Once a request with the `keepalive` flag has been received,
+    the connection stays open: further newline-delimited requests can be
+    pipelined, and each gets a newline-terminated reply (in order).
+    A malformed request then gets an empty reply.
+    At most `MAX_IN_FLIGHT` requests per connection are split concurrently;
+    the splitting itself runs in a thread pool.
+    '''
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(EXECUTOR_WORKERS)
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        replies = asyncio.Queue()  # type: asyncio.Queue
+        slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        reply_task = asyncio.ensure_future(self.write_replies(writer, replies))
+        requests = RequestReader(reader)
+        peer = writer.get_extra_info("peername")
+
+        try:
+            while not requests.eof:
+                for datastring in await requests.read():
+                    logger.debug('%s wrote: "%s"', peer, datastring)
+                    if not await self.submit(datastring, requests, replies, slots):
+                        return
+        finally:
+            await replies.put(None)
+            await reply_task
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                # e.g. the client reset the connection
+                pass
+
+    async def submit(self,
+                     datastring: str,
+                     requests: RequestReader,
+                     replies: asyncio.Queue,
+                     slots: asyncio.Semaphore) -> bool:
+        '''
+        Start splitting a request and queue its reply.
+
+        Returns whether the connection stays open for further requests.
+        '''
+        try:
+            compound, method_name, flags = parse_request(datastring)
+            until = flag_deadline(flags)
+        except ValueError as error:
+            logger.warning('Malformed request "%s": %s', datastring, error)
+            if requests.keepalive:
+                await replies.put((None, True))
+            return requests.keepalive
+
+        requests.keepalive = requests.keepalive or KEEPALIVE_FLAG in flags
+        await slots.acquire()
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, split, compound, method_name, tracing.TRACE_FLAG in flags, until)
+        future.add_done_callback(lambda _: slots.release())
+        await replies.put((future, requests.keepalive))
+        return requests.keepalive
+
+    async def write_replies(self, writer: asyncio.StreamWriter, replies: asyncio.Queue):
+        '''
+        Send the replies of a connection in the order of its requests.
+        '''
+        while True:
+            item = await replies.get()
+            if item is None:
+                return
+            future, keepalive = item
+            try:
+                output = await future if future else ""
+            except (DeadlineExceeded, OSError) as error:
+                logger.warning("Splitting failed: %s", error)
+                output = ""
+            except Exception:
+                logger.exception("Splitting failed")
+                output = ""
+            try:
+                writer.write((output + "\n" if keepalive else output).encode('UTF-8'))
+                await writer.drain()
+            except ConnectionError:
+                return
+
+    def close(self):
+        self.executor.shutdown()
 
 
 def cleanup():
@@ -55,9 +242,8 @@ def cleanup():
 
     Run the `stop` function of each method
     '''
-    
-    for method in started_methods.values():
-        method.stop()
+
+    started_methods.stop()
 
 
 def main():
@@ -65,12 +251,34 @@ def main():
     Start a socket server at localhost:7005
     '''
 
-    HOST, PORT = "localhost", 7005
-    print("Listening at {}:{}".format(HOST, PORT))
+    parser = argparse.ArgumentParser(description="Compound splitter socket server")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="serve connections concurrently, allowing persistent connections")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="port at which to serve /metrics (default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="log every request")
+    add_prewarm_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    metrics_server = metrics.serve(HOST, args.metrics_port)
+    profiling.install_signal_handler()
     try:
-        with socketserver.TCPServer((HOST, PORT), TCPHandler) as server:
-            server.serve_forever()
+        prewarm(started_methods, args)
+        print("Listening at {}:{}, metrics at http://{}:{}/metrics".format(
+            HOST, PORT, HOST, args.metrics_port))
+        if args.asyncio:
+            async_server = AsyncServer()
+            try:
+                asyncio.run(async_server.serve(HOST, PORT))
+            finally:
+                async_server.close()
+        else:
+            with socketserver.TCPServer((HOST, PORT), TCPHandler) as server:
+                server.serve_forever()
     finally:
+        metrics_server.shutdown()
         cleanup()
 
 
@@ -1,20 +1,62 @@
-from typing import cast, Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-import os
-import json
-import importlib
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 
-base_path = os.path.dirname(os.path.dirname(__file__))
-METHODS_DIR = os.path.join(base_path, 'methods')
+from . import metrics, tracing
+from .cache import get_cache
+from .cascade import Cascade
+from .coalesce import get_coalescer
+from .registry import registry
+from .store import get_store
+
+BATCH_SIZE = 500
+'''Maximum number of compounds passed to a method in one `split_many` call'''
+
+running = Counter()  # type: Counter
+'''Number of started `Module`s of each method, which share the state (e.g. backends) of its python module'''
+
+running_locks = {}  # type: Dict[str, threading.Lock]
+running_lock = threading.Lock()
+
+
+def running_lock_of(name: str) -> threading.Lock:
+    with running_lock:
+        return running_locks.setdefault(name, threading.Lock())
 
 
 class Module:
     '''
     Object representing a python module with compound splitting functions.
+
+    Results are kept in a cache shared by every `Module` of the same
+    method, configured with the `"cache"` key of its `run.json`.
+    If a split store is configured, results are also looked up in and
+    written back to the store, keyed by the `"version"` of the method.
+
+    With the `"coalesce"` key, words which are not found are collected
+    from concurrent callers and split in batches (unless the `Module`
+    is not cached, e.g. to measure the method itself).
     '''
     
-    def __init__(self, name: str, run_data):
-        self.module = cast(Any, importlib.import_module(f"methods.{name}"))
+    def __init__(self, name: str, run_data, cached: bool = True):
+        self.name = name
+        self.version = str(run_data.get("version", "0"))
+        self.cache = get_cache(name, run_data.get("cache")) if cached else None
+        self.store = get_store() if cached else None
+        self.coalescer = get_coalescer(name, run_data.get("coalesce"), self.split_uncached) if cached else None
+        self.started = False
+        self.start_lock = threading.Lock()
+
+    @property
+    def module(self) -> Any:
+        '''
+        The python module of the method, imported on first use.
+        '''
+        return registry.load(self.name)
 
     def split(self, compound: str):
         '''
@@ -30,71 +72,318 @@ class Module:
 
         Methods may return multiple candidates with different scores.
         '''
-        return self.module.split(compound)
+        if self.cache is None and self.store is None and self.coalescer is None:
+            self.ensure_started()
+            with tracing.span("split", self.name):
+                return self.module.split(compound)
+
+        return self.split_many([compound])[0]
+
+    def split_many(self, compounds: List[str]) -> List[Any]:
+        '''
+        Split a list of compounds.
+
+        Methods which can batch natively should implement `split_many`,
+        which receives up to `BATCH_SIZE` compounds at a time. For other
+        methods, `split` is called for each compound.
+
+        Returns a list with a result for each compound (in the same order),
+        formatted as described in `split`.
+        '''
+        with tracing.span("split_many", self.name):
+            if self.cache is None and self.store is None:
+                return self.split_coalesced(compounds)
+            return self.split_cached(compounds)
+
+    def split_cached(self, compounds: List[str]) -> List[Any]:
+        '''
+        Look up compounds in the cache and split store,
+        and split the ones which are not found.
+        '''
+        found = {}  # type: Dict[str, Any]
+        missing = list(dict.fromkeys(compounds))
 
-    def start(self):
+        if self.cache is not None:
+            for compound in missing:
+                result = self.cache.get(compound)
+                if result is not None:
+                    found[compound] = result
+            missing = [compound for compound in missing if compound not in found]
+
+        if self.store is not None and missing:
+            with tracing.span("store", self.name):
+                stored = self.store.get_many(self.name, self.version, missing)
+            self.remember(stored)
+            found.update(stored)
+            missing = [compound for compound in missing if compound not in found]
+
+        if missing:
+            split = dict(zip(missing, self.split_coalesced(missing)))
+            found.update(split)
+            self.remember(split)
+            if self.store is not None:
+                self.store.put_many(self.name, self.version, split.items())
+
+        return [found[compound] for compound in compounds]
+
+    def remember(self, results: Dict[str, Any]):
+        if self.cache is not None:
+            for compound, result in results.items():
+                self.cache.put(compound, result)
+
+    def split_coalesced(self, compounds: List[str]) -> List[Any]:
+        if self.coalescer is None:
+            return self.split_uncached(compounds)
+        with tracing.span("coalesce", self.name):
+            return self.coalescer.split_many(compounds)
+
+    def split_uncached(self, compounds: List[str]) -> List[Any]:
+        self.ensure_started()
+        with tracing.span("method", self.name):
+            if not hasattr(self.module, "split_many"):
+                return [self.module.split(compound) for compound in compounds]
+
+            results = []  # type: List[Any]
+            for i in range(0, len(compounds), BATCH_SIZE):
+                results += self.module.split_many(compounds[i:i + BATCH_SIZE])
+            return results
+
+    def start(self, lazy: bool = False):
         '''
         Start-up for this method
         (e.g. import data, start a socket server, etc.)
+
+        If `lazy` is set and a split store is configured, this is put off
+        until a compound is not found in the cache or store, so a restarted
+        server answers from the store without starting any backends.
         '''
-        self.module.start()
+        if lazy and self.store is not None:
+            return
+        with self.start_lock:
+            if self.started:
+                return
+            # e.g. a method which is also a stage of a cascade:
+            # its module is only started by the first one
+            with running_lock_of(self.name):
+                if not running[self.name]:
+                    with tracing.span("start", self.name):
+                        started = perf_counter()
+                        self.module.start()
+                        metrics.startup_duration.set(perf_counter() - started, {"method": self.name})
+                running[self.name] += 1
+            self.started = True
+
+    def ensure_started(self):
+        if not self.started:
+            self.start()
 
     def stop(self):
         '''
         Teardown for this method
         '''
-        self.module.stop()
+        with self.start_lock:
+            if not self.started:
+                return
+            self.started = False
+            with running_lock_of(self.name):
+                running[self.name] -= 1
+                if running[self.name]:
+                    return
+                with tracing.span("stop", self.name):
+                    self.module.stop()
+
+    def after_fork(self, worker_index: int, worker_count: int):
+        '''
+        Reset per-process state in a process forked after the method
+        was started. The python module itself is reset by `after_fork`.
+        '''
+        self.start_lock = threading.Lock()
 
     def prepare(self):
         self.module.prepare()
 
 
+def after_fork(worker_index: int, worker_count: int):
+    '''
+    Run the `after_fork` hook of the python module of each started method
+    (once, however many `Module`s share it), in a forked worker process
+    which shares its backend with the parent process.
+    '''
+    global running_lock, running_locks
+    running_lock = threading.Lock()
+    running_locks = {}
+    for name, count in running.items():
+        if not count:
+            continue
+        module = registry.load(name)
+        if hasattr(module, "after_fork"):
+            module.after_fork(worker_index, worker_count)
+
+
 def get_method_data(name: str):
     '''
     Load the JSON configuration file for a method.
 
-    Opens the `run.json` file in the method directory
-    and returns its contents.
+    Returns the contents of the `run.json` file of the method,
+    which is only read once.
     '''
     
-    with open(os.path.join(METHODS_DIR, name, 'run.json')) as run_json:
-        return json.load(run_json)
+    return dict(registry.get(name))
 
 
-def get_method(name: str):
+def get_method(name: str, cached: bool = True):
     '''
     Return a method as a python module.
 
-    Input must be the name of the method.
+    Input must be the name of the method. If `cached` is false,
+    results are not looked up in or added to the cache and split store,
+    and words are not coalesced with those of concurrent callers.
 
     Output is a python object with `split`, `start`,
     `stop`, and `prepare` methods.
     '''
     
-    run_data = get_method_data(name)
+    run_data = registry.get(name)
     method = {
-        'module': Module(name, run_data)
-    }[run_data['protocol']]
+        'module': Module,
+        'cascade': Cascade,
+    }[run_data['protocol']](name, run_data, cached)
 
     return method
 
 
 def list_methods():
     '''
-    List every python module in the "methods" directory
+    List every method in the "methods" directory
+    or installed as a plugin.
 
-    Collects all directories in the "methods" directory,
-    and read the JSON configuration for each. Returns a dict
-    with metadata for each method.
+    Returns a dict with metadata for each method,
+    from its JSON configuration.
     '''
     
-    methods = []
-    for name in os.listdir(METHODS_DIR):
-        if name == "__pycache__":
-            continue
-        if os.path.isdir(os.path.join(METHODS_DIR, name)):
-            methods += [{
-                "name": name,
-                **get_method_data(name)
-            }]
-    return methods
+    return [{
+        "name": name,
+        **registry.get(name)
+    } for name in registry.names()]
+
+
+def top_candidate(result) -> Optional[Dict[str, Any]]:
+    '''
+    Return the highest-scoring candidate of a result (the first of equal
+    ones), or None if it has no candidates.
+    '''
+    candidates = result["candidates"]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda candidate: candidate["score"])
+
+
+def batches(compounds: Iterable[str], size: int = BATCH_SIZE) -> Iterator[List[str]]:
+    '''
+    Divide compounds into lists of at most `size`, to pass to `split_many`.
+    '''
+    batch = []  # type: List[str]
+    for compound in compounds:
+        batch.append(compound)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class StartedMethods:
+    '''
+    Methods which have been started during runtime, by name.
+
+    Startup is single-flight: when a method is requested concurrently
+    before it has started, it is only started once and every caller
+    waits for that.
+    '''
+
+    def __init__(self):
+        self.methods = {}  # type: Dict[str, Module]
+        self.locks = {}  # type: Dict[str, threading.Lock]
+        self.lock = threading.Lock()
+
+    def get(self, name: str, lazy: bool = True) -> Module:
+        '''
+        Return a method, running its `start` method if this is
+        the first time it is requested.
+
+        Unless `lazy` is unset, a method with a split store is only
+        started once a compound is not found in the store.
+        '''
+        method = self.methods.get(name)
+        if method is not None:
+            if not lazy:
+                method.start()
+            return method
+
+        with self.lock:
+            start_lock = self.locks.setdefault(name, threading.Lock())
+        with start_lock:
+            if name not in self.methods:
+                method = get_method(name)
+                method.start(lazy)
+                self.methods[name] = method
+        return self.methods[name]
+
+    def prewarm(self, names: List[str], words: Optional[List[str]] = None):
+        '''
+        Start methods (concurrently), and split a list of
+        warm-up words with each of them.
+        '''
+        def warm(name: str):
+            method = self.get(name, lazy=False)
+            if words:
+                method.split_many(words)
+
+        with ThreadPoolExecutor(max(1, len(names))) as executor:
+            # list() to raise any exceptions
+            list(executor.map(warm, names))
+
+    def after_fork(self, worker_index: int, worker_count: int):
+        '''
+        Run the `after_fork` hook of each started method,
+        in a forked worker process.
+        '''
+        self.lock = threading.Lock()
+        self.locks = {}
+        for method in self.methods.values():
+            method.after_fork(worker_index, worker_count)
+        after_fork(worker_index, worker_count)
+
+    def stop(self):
+        '''
+        Run the `stop` function of each started method.
+        '''
+        with self.lock:
+            methods = list(self.methods.values())
+            self.methods.clear()
+        for method in methods:
+            method.stop()
+
+
+def add_prewarm_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--prewarm", metavar="METHODS",
+                        help="comma-separated names of methods to start before accepting requests")
+    parser.add_argument("--warmup-words", metavar="FILE",
+                        help="file with words (one per line) to split with each prewarmed method")
+
+
+def prewarm(started_methods: StartedMethods, args: argparse.Namespace):
+    '''
+    Prewarm the methods given in the arguments added by `add_prewarm_arguments`
+    '''
+    if not args.prewarm:
+        return
+
+    words = []  # type: List[str]
+    if args.warmup_words:
+        with open(args.warmup_words) as words_file:
+            words = [line.strip() for line in words_file if line.strip()]
+
+    names = [name.strip() for name in args.prewarm.split(",")]
+    print("Prewarming", ", ".join(names))
+    started_methods.prewarm(names, words)
@@ -0,0 +1,11 @@
+from typing import List, Optional
+
+
+def percentile(ordered: List[float], percent: float) -> Optional[float]:
+    '''
+    Nearest-rank percentile of sorted values
+    '''
+    if not ordered:
+        return None
+    rank = -(-len(ordered) * percent // 100)
+    return ordered[max(0, int(rank) - 1)]
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+STORE_VARIABLE = "COMPOUND_SPLITTER_STORE"
+'''Environment variable with the path of the split store (if any)'''
+
+MMAP_SIZE = 1024 * 1024 * 1024
+'''Maximum number of bytes of the store which are memory-mapped'''
+
+QUERY_SIZE = 500
+'''Maximum number of words looked up in one query'''
+
+
+class SplitStore:
+    '''
+    On-disk store of split results, shared between processes
+    and kept across restarts.
+
+    Results are stored per method, method version and word.
+    This is an SQLite database in WAL mode, so many processes can
+    read it concurrently while new results are written back.
+    Reads go through memory-mapped I/O, so the pages are shared
+    between the processes.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        '''
+        Return the connection of the current thread and process.
+        '''
+        connection = getattr(self.local, "connection", None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS splits (
+                    method TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    word TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (method, version, word)
+                ) WITHOUT ROWID""")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get_many(self, method: str, version: str, words: List[str]) -> Dict[str, Any]:
+        '''
+        Return the stored results for words, as a dict.
+
+        Words which are not in the store are left out.
+        '''
+        connection = self.connection()
+        found = {}
+        for i in range(0, len(words), QUERY_SIZE):
+            batch = words[i:i + QUERY_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                "SELECT word, result FROM splits "
+                f"WHERE method = ? AND version = ? AND word IN ({placeholders})",
+                [method, version, *batch])
+            for word, result in rows:
+                found[word] = json.loads(result)
+        return found
+
+    def put_many(self, method: str, version: str, results: Iterable[Tuple[str, Any]]):
+        '''
+        Store the results for words, given as (word, result) pairs.
+        '''
+        connection = self.connection()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO splits (method, version, word, result) VALUES (?, ?, ?, ?)",
+                ((method, version, word, json.dumps(result)) for word, result in results))
+
+    def words(self, method: str, version: str) -> int:
+        '''
+        Return the number of words stored for a method.
+        '''
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM splits WHERE method = ? AND version = ?",
+            [method, version]).fetchone()[0]
+
+
+store = None  # type: Optional[SplitStore]
+store_lock = threading.Lock()
+
+
+def get_store() -> Optional[SplitStore]:
+    '''
+    Return the split store configured with the
+    `COMPOUND_SPLITTER_STORE` environment variable, if any.
+    '''
+    global store
+    path = os.environ.get(STORE_VARIABLE)
+    if not path:
+        return None
+
+    with store_lock:
+        if store is None or store.path != path:
+            store = SplitStore(path)
+        return store
+
+
+def precompute(method_name: str, words: Iterable[str]):
+    '''
+    Split a list of words with a method, and write the results
+    to the store.
+    '''
+    from .splitter import batches, get_method
+
+    method = get_method(method_name)
+    if method.store is None:
+        raise ValueError(f"Set {STORE_VARIABLE} to the path of the store")
+
+    method.start()
+    try:
+        for batch in batches(words):
+            method.split_many(batch)
+    finally:
+        method.stop()
+
+    print(f"{method.store.words(method_name, method.version)} words stored for {method_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute the splits of a word list into the split store")
+    parser.add_argument("method", help="name of the method")
+    parser.add_argument("words", help="file with one word per line")
+    parser.add_argument("--store", help=f"path of the store (default: ${STORE_VARIABLE})")
+    args = parser.parse_args()
+
+    if args.store:
+        os.environ[STORE_VARIABLE] = args.store
+
+    with open(args.words) as words_file:
+        precompute(args.method, (line.strip() for line in words_file if line.strip()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+import socket
+import threading
+from subprocess import Popen, TimeoutExpired
+from time import monotonic, sleep
+from typing import Callable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+STOP_TIMEOUT = 10.0
+'''Seconds a backend gets to exit after being terminated, before it is killed'''
+
+WATCH_INTERVAL = 5.0
+'''Seconds between the health checks of a watched backend'''
+
+
+class BackendUnavailable(OSError):
+    '''
+    Raised when a backend is (re)starting or its circuit breaker is open.
+    '''
+    pass
+
+
+supervisors = []  # type: List[Supervisor]
+'''Every supervisor which has been created, for reporting'''
+
+
+class Supervisor:
+    '''
+    Runs the subprocess behind a method and keeps it running.
+
+    Readiness is detected by polling the port of the backend and
+    sending it a health check, with exponential backoff. A backend
+    which crashes is restarted in the background.
+
+    Calls to the backend should go through `call`. After
+    `failure_threshold` consecutive failures the circuit breaker
+    opens: calls fail fast with `BackendUnavailable` until
+    `cooldown` seconds have passed, after which one trial call is let
+    through.
+
+    A process forked from the one which started the backend should
+    call `detach`: it then shares the backend, but leaves restarting
+    it to the owner. As the owner then makes no calls itself, it should
+    `watch` the backend to notice when it hangs.
+    '''
+
+    def __init__(self,
+                 name: str,
+                 launch: Callable[[], Popen],
+                 host: str,
+                 port: int,
+                 health_check: Optional[Callable[[], object]] = None,
+                 on_restart: Optional[Callable[[], None]] = None,
+                 startup_timeout: float = 60,
+                 failure_threshold: int = 3,
+                 cooldown: float = 10):
+        self.name = name
+        self.launch = launch
+        self.host = host
+        self.port = port
+        self.health_check = health_check
+        self.on_restart = on_restart
+        self.startup_timeout = startup_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.proc = None  # type: Optional[Popen]
+        self.lock = threading.Lock()
+        self.ready = False
+        self.stopping = False
+        self.restarting = False
+        self.failures = 0
+        self.open_until = 0.0
+        self.restarts = 0
+        self.errors = 0
+        self.owner = True
+        self.watching = None  # type: Optional[threading.Event]
+        supervisors.append(self)
+
+    def start(self):
+        '''
+        Launch the backend and block until it is ready.
+        '''
+        self.stopping = False
+        self.spawn()
+        self.wait_ready()
+
+    def stop(self):
+        self.stopping = True
+        self.ready = False
+        if self.watching:
+            self.watching.set()
+        self.terminate()
+
+    def watch(self, interval: float = WATCH_INTERVAL):
+        '''
+        Health check the backend every `interval` seconds in the background,
+        and restart it after `failure_threshold` consecutive failed checks.
+        '''
+        if self.watching and not self.watching.is_set():
+            return
+        self.watching = threading.Event()
+        threading.Thread(target=self.watchdog,
+                         args=(self.watching, interval),
+                         name=f"{self.name}-watchdog",
+                         daemon=True).start()
+
+    def watchdog(self, stopped: threading.Event, interval: float):
+        failed = 0
+        while not stopped.wait(interval):
+            if not self.owner or not self.ready or self.restarting or self.probe():
+                failed = 0
+                continue
+            failed += 1
+            if failed >= self.failure_threshold:
+                print(f"{self.name} failed {failed} health checks, restarting")
+                failed = 0
+                self.restart_async()
+
+    def detach(self):
+        '''
+        Stop owning the backend, e.g. in a forked worker process.
+
+        The backend is still called, but not restarted or stopped by this
+        process: when it fails, this waits for the owner to restart it.
+        '''
+        self.owner = False
+        self.proc = None
+        self.lock = threading.Lock()
+        self.restarting = False
+        self.watching = None
+
+    def spawn(self):
+        self.proc = self.launch()
+        threading.Thread(target=self.monitor,
+                         args=(self.proc,),
+                         name=f"{self.name}-monitor",
+                         daemon=True).start()
+
+    def terminate(self):
+        proc = self.proc
+        if proc and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.communicate(timeout=STOP_TIMEOUT)
+            except TimeoutExpired:
+                # e.g. hung too badly to handle the signal
+                proc.kill()
+                proc.communicate()
+
+    def monitor(self, proc: Popen):
+        '''
+        Restart the backend when its process exits unexpectedly.
+        '''
+        proc.wait()
+        if not self.stopping and proc is self.proc:
+            print(f"{self.name} exited with {proc.returncode}, restarting")
+            self.restart_async()
+
+    def wait_ready(self):
+        '''
+        Poll the backend until it accepts connections and passes
+        the health check.
+
+        Raises `BackendUnavailable` if the process exits or
+        `startup_timeout` expires first.
+        '''
+        deadline = monotonic() + self.startup_timeout
+        delay = 0.05
+        while True:
+            if self.proc is None or self.proc.poll() is not None:
+                raise BackendUnavailable(f"{self.name} exited during startup")
+            if self.probe():
+                self.ready = True
+                self.failures = 0
+                self.open_until = 0.0
+                return
+            if monotonic() + delay > deadline:
+                raise BackendUnavailable(
+                    f"{self.name} not ready after {self.startup_timeout} seconds")
+            sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def probe(self) -> bool:
+        try:
+            with socket.create_connection((self.host, self.port), timeout=1):
+                pass
+            if self.health_check:
+                self.health_check()
+            return True
+        except OSError:
+            return False
+
+    def restart_async(self, check: bool = False):
+        '''
+        Restart the backend in a background thread.
+
+        Calls fail fast while this is in progress. If `check` is set,
+        the backend is only restarted if it fails its health check.
+        '''
+        with self.lock:
+            if self.restarting or self.stopping:
+                return
+            self.restarting = True
+            if not check:
+                self.ready = False
+        threading.Thread(target=self.restart,
+                         args=(check,),
+                         name=f"{self.name}-restart",
+                         daemon=True).start()
+
+    def restart(self, check: bool = False):
+        try:
+            if check and self.probe():
+                return
+            self.ready = False
+            while not self.stopping:
+                if not self.owner:
+                    # the owning process restarts the backend
+                    if self.probe():
+                        with self.lock:
+                            self.ready = True
+                            self.failures = 0
+                            self.open_until = 0.0
+                        return
+                    sleep(min(self.cooldown, 1.0))
+                    continue
+
+                self.restarts += 1
+                self.terminate()
+                if self.on_restart:
+                    self.on_restart()
+                try:
+                    self.spawn()
+                    self.wait_ready()
+                    return
+                except OSError as error:
+                    print(f"Restarting {self.name} failed: {error}")
+                    sleep(self.cooldown)
+        finally:
+            self.restarting = False
+
+    def call(self, function: Callable[..., T], *args) -> T:
+        '''
+        Call a function which talks to the backend.
+
+        OSErrors raised by the function count as failures
+        for the circuit breaker and are re-raised.
+        '''
+        with self.lock:
+            if not self.ready:
+                raise BackendUnavailable(f"{self.name} is not running")
+            if self.open_until:
+                if monotonic() < self.open_until:
+                    raise BackendUnavailable(f"{self.name} circuit breaker is open")
+                # half-open: let this call through as a trial
+                self.open_until = monotonic() + self.cooldown
+
+        try:
+            result = function(*args)
+        except OSError:
+            self.record_failure()
+            raise
+
+        with self.lock:
+            self.failures = 0
+            self.open_until = 0.0
+        return result
+
+    def record_failure(self):
+        with self.lock:
+            self.errors += 1
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+            self.open_until = monotonic() + self.cooldown
+
+        # the health check can take long, so it is not done on the calling thread
+        self.restart_async(check=True)
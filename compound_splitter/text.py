@@ -0,0 +1,75 @@
+from typing import Any, Dict, List, Optional
+from .splitter import batches, top_candidate
+from .tokens import is_word, tokenize
+
+MIN_WORD_LENGTH = 6
+'''Tokens shorter than this are not split: they cannot consist of two words'''
+
+
+def splittable(token: str) -> bool:
+    '''
+    Whether a token could be a compound: long enough and
+    consisting of letters (and dashes).
+    '''
+    return len(token) >= MIN_WORD_LENGTH and is_word(token)
+
+
+def split_offsets(token: str, parts: List[str]) -> Optional[List[int]]:
+    '''
+    Find the offsets in a token at which it is split into parts.
+
+    Methods may change the case of the parts and add or remove dashes,
+    so these are ignored. Returns None if the parts do not spell
+    out the token.
+    '''
+    letters = [i for i, char in enumerate(token) if char != "-"]
+    normalized = [part.lower().replace("-", "") for part in parts]
+    if "".join(normalized) != token.lower().replace("-", ""):
+        return None
+
+    offsets = []  # type: List[int]
+    length = 0
+    for part in normalized[:-1]:
+        length += len(part)
+        if 0 < length < len(letters) and letters[length] not in offsets:
+            offsets.append(letters[length])
+    return offsets
+
+
+def split_text(method, text: str) -> Dict[str, Any]:
+    '''
+    Split every compound in a text.
+
+    Each distinct token which could be a compound is split once, in
+    batches. Returns a dict with:
+
+    - `"types"`: the result of the method for each distinct token
+    - `"tokens"`: each occurrence of these tokens, with its `"start"` and
+      `"end"` offset in the text and the `"splits"`: the offsets in the
+      text at which the top candidate splits it (or null if its parts
+      could not be aligned with the token)
+    '''
+    occurrences = [
+        (token, start, end) for token, start, end in tokenize(text) if splittable(token)]
+    types = list(dict.fromkeys(token for token, start, end in occurrences))
+
+    results = {}  # type: Dict[str, Any]
+    for batch in batches(types):
+        results.update(zip(batch, method.split_many(batch)))
+
+    offsets = {}  # type: Dict[str, Optional[List[int]]]
+    for token, result in results.items():
+        top = top_candidate(result)
+        offsets[token] = [] if top is None else split_offsets(token, top["parts"])
+
+    tokens = []
+    for token, start, end in occurrences:
+        token_offsets = offsets[token]
+        tokens.append({
+            "word": token,
+            "start": start,
+            "end": end,
+            "splits": None if token_offsets is None else [start + offset for offset in token_offsets],
+        })
+
+    return {"types": results, "tokens": tokens}
@@ -0,0 +1,20 @@
+import re
+from typing import Iterator, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+(?:-\w+)*")
+'''Tokens of a text: word characters, possibly joined by dashes'''
+
+
+def tokenize(text: str) -> Iterator[Tuple[str, int, int]]:
+    '''
+    Yield each token of a text with its start and end offset.
+    '''
+    for match in TOKEN_PATTERN.finditer(text):
+        yield match.group(), match.start(), match.end()
+
+
+def is_word(token: str) -> bool:
+    '''
+    Whether a token is a word: letters, possibly joined by dashes.
+    '''
+    return token.replace("-", "").isalpha()
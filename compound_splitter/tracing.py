@@ -0,0 +1,155 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+TRACE_HEADER = "X-Trace"
+'''Request header which enables tracing in the web API'''
+
+TRACE_FLAG = "trace"
+'''Request flag which enables tracing in the socket server'''
+
+Span = NamedTuple("Span", [
+    ("name", str),
+    ("detail", str),
+    # seconds since the start of the trace
+    ("start", float),
+    ("duration", float),
+    # number of enclosing spans
+    ("depth", int),
+])
+
+
+class Trace:
+    '''
+    Timed spans recorded while handling a request.
+
+    Spans are recorded by `span` for as long as the trace is active
+    (see `trace`), also from other threads if the work was handed
+    off with `propagate`.
+    '''
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.finished = None  # type: Optional[float]
+        self.spans = []  # type: List[Span]
+        self.lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def duration(self) -> float:
+        return (self.finished or perf_counter()) - self.started
+
+    def sorted_spans(self) -> List[Span]:
+        with self.lock:
+            return sorted(self.spans, key=lambda span: (span.start, span.depth))
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        '''
+        Return the spans as JSON, with times in milliseconds.
+        '''
+        return [{
+            "name": span.name,
+            "detail": span.detail,
+            "start": round(span.start * 1000, 3),
+            "duration": round(span.duration * 1000, 3),
+            "depth": span.depth,
+        } for span in self.sorted_spans()]
+
+    def server_timing(self) -> str:
+        '''
+        Format the spans as a `Server-Timing` header, which is shown
+        by the developer tools of browsers.
+        '''
+        entries = [f"total;dur={self.duration() * 1000:.3f}"]
+        for i, span in enumerate(self.sorted_spans()):
+            # metric names should be unique
+            description = f"{span.name} {span.detail}".strip().replace('"', "'")
+            entries.append(f'{i}-{span.name};desc="{description}";dur={span.duration * 1000:.3f}')
+        return ", ".join(entries)
+
+    def format(self) -> str:
+        '''
+        Format the spans as an indented tree, for logging.
+        '''
+        lines = [f"total {self.duration() * 1000:.3f} ms"]
+        for span in self.sorted_spans():
+            lines.append("{}{} {} {:.3f} ms (at {:.3f} ms)".format(
+                "  " * (span.depth + 1), span.name, span.detail,
+                span.duration * 1000, span.start * 1000))
+        return "\n".join(lines)
+
+
+current_trace = ContextVar("current_trace", default=None)  # type: ContextVar[Optional[Trace]]
+current_depth = ContextVar("current_depth", default=0)  # type: ContextVar[int]
+
+
+@contextmanager
+def trace(enabled: bool = True) -> Iterator[Optional[Trace]]:
+    '''
+    Record the spans in this context in a new trace, if enabled.
+
+    Yields the trace, or None if tracing is not enabled.
+    '''
+    if not enabled:
+        yield None
+        return
+
+    new_trace = Trace()
+    trace_token = current_trace.set(new_trace)
+    depth_token = current_depth.set(0)
+    try:
+        yield new_trace
+    finally:
+        new_trace.finished = perf_counter()
+        current_depth.reset(depth_token)
+        current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, detail: str = "") -> Iterator[None]:
+    '''
+    Time the enclosed code as a span of the current trace.
+
+    Does nothing if no trace is active.
+    '''
+    active = current_trace.get()
+    if active is None:
+        yield
+        return
+
+    depth = current_depth.get()
+    token = current_depth.set(depth + 1)
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        end = perf_counter()
+        current_depth.reset(token)
+        active.add(Span(name, detail, start - active.started, end - start, depth))
+
+
+def propagate(function: Callable[..., T]) -> Callable[..., T]:
+    '''
+    Wrap a function so it runs in the context of the caller,
+    e.g. to keep tracing it in a thread pool.
+    '''
+    context = copy_context()
+
+    def run(*args, **kwargs) -> T:
+        # every call needs its own copy, as calls may run concurrently
+        return context.copy().run(function, *args, **kwargs)
+
+    return run
+
+
+def requested(value: Optional[str]) -> bool:
+    '''
+    Whether the value of the trace header asks for a trace.
+    '''
+    return value is not None and value.strip().lower() not in ("", "0", "false", "no")
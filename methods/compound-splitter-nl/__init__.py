@@ -1,56 +1,169 @@
 import os
+import queue
 import socket
 from subprocess import Popen
-from time import sleep
+from typing import List
+from compound_splitter import deadline, metrics, tracing
+from compound_splitter.deadline import DeadlineExceeded
+from compound_splitter.supervisor import Supervisor
 
 # default communication settings of the server
 HOST = "localhost"
 PORT = 50500
 
+POOL_SIZE = 8
+'''Maximum number of idle connections kept open to the server'''
+
+PIPELINE_DEPTH = 64
+'''Maximum number of words sent before reading their replies'''
+
 OWN_DIR = os.path.dirname(__file__)
 BIN_DIR = os.path.join(OWN_DIR, "bin")
 
-# server subprocess
-server_proc = None
+
+class Connection:
+    '''
+    A persistent connection to the server.
+
+    Words and replies are newline-delimited, so several words
+    can be sent before reading back their replies.
+    '''
+
+    def __init__(self):
+        self.socket = socket.create_connection((HOST, PORT), timeout=deadline.timeout())
+        self.reader = self.socket.makefile("r", encoding="utf-8", newline="\n")
+
+    def retrieve_many(self, words: List[str]) -> List[str]:
+        '''
+        Send words to the server and return its replies.
+
+        If the server closes the connection early, only the replies
+        received until then are returned. Raises `socket.timeout`
+        if the server does not reply in time.
+        '''
+        with tracing.span("socket", f"compound-splitter-nl ({len(words)} words)"):
+            self.socket.settimeout(deadline.timeout())
+            self.socket.sendall("".join(word + "\n" for word in words).encode())
+            replies = []
+            for _ in words:
+                try:
+                    line = self.reader.readline()
+                except ConnectionResetError:
+                    break
+                if not line.endswith("\n"):
+                    break
+                # rstrip to remove the newline
+                replies.append(line.rstrip())
+            return replies
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+
+class ConnectionPool:
+    '''
+    Thread-safe pool of connections to the server.
+
+    Connections are created on demand, so concurrent callers never
+    wait for each other; at most `size` idle connections are kept.
+    '''
+
+    def __init__(self, size: int):
+        self.size = size
+        self.idle = queue.LifoQueue()  # type: queue.LifoQueue
+
+    def get(self) -> Connection:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return Connection()
+
+    def put(self, connection: Connection):
+        if self.idle.qsize() < self.size:
+            self.idle.put(connection)
+        else:
+            connection.close()
+
+    def clear(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pool = ConnectionPool(POOL_SIZE)
+
+
+def retrieve_many(words: List[str]) -> List[str]:
+    splits = []  # type: List[str]
+    connection = pool.get()
+    try:
+        while len(splits) < len(words):
+            pending = words[len(splits):len(splits) + PIPELINE_DEPTH]
+            replies = connection.retrieve_many(pending)
+            if len(replies) < len(pending):
+                # server hung up: continue on a fresh connection
+                connection.close()
+                connection = Connection()
+                if not replies:
+                    replies = connection.retrieve_many(pending[:1])
+                    if not replies:
+                        raise ConnectionError("No reply from compound-splitter-nl")
+            splits += replies
+    except (OSError, DeadlineExceeded):
+        connection.close()
+        # a timeout because of the deadline is not the fault of the server
+        deadline.check()
+        raise
+    pool.put(connection)
+
+    # an empty reply means no split was applied
+    return [splitted or word for word, splitted in zip(words, splits)]
 
 
 def retrieve(word: str):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as connection:
-        connection.connect((HOST, PORT))
-        connection.sendall((word + "\n").encode())
+    return retrieve_many([word])[0]
+
+
+def health_check():
+    connection = Connection()
+    try:
+        if not connection.retrieve_many(["fietsenstalling"]):
+            raise ConnectionError("No reply from compound-splitter-nl")
+    finally:
+        connection.close()
+
+
+def launch():
+    server_path = os.path.join(BIN_DIR, "compound-splitter-nl")
+    return Popen(
+        ["perl", os.path.join(server_path, "compound_server.pl")],
+        cwd=server_path,
+        env={"PERL5LIB": server_path})
+
 
-        # rstrip to remove the newline
-        splitted = connection.recv(1024).decode().rstrip()
-        if not splitted:
-            # no split applied
-            return word
-        return splitted
+supervisor = Supervisor("compound-splitter-nl", launch, HOST, PORT,
+                        health_check=health_check,
+                        on_restart=pool.clear,
+                        startup_timeout=120)
 
 
-def attempt_split(word: str, attempt=0):
+def attempt_split(words: List[str]) -> List[str]:
+    '''
+    Split words on the server. Raises an OSError if it fails,
+    rather than passing the words off as not splittable.
+    '''
     try:
-        if attempt == 0:
-            # try getting the answer straight away
-            return retrieve(word)
-        elif attempt == 1:
-            # if it fails, wait 10 seconds and try again
-            sleep(10)
-            return retrieve(word)
-        elif attempt == 2:
-            # restart the server and try again
-            stop()
-            sleep(10)
-            start()
-            return retrieve(word)
-        elif attempt == 3:
-            # give up, just return the word
-            return word
-    except OSError:
-        return attempt_split(word, attempt + 1)
+        return supervisor.call(retrieve_many, words)
+    except ConnectionError:
+        # a pooled connection may have gone stale: retry once
+        metrics.backend_retries.inc({"backend": supervisor.name})
+        return supervisor.call(retrieve_many, words)
 
 
-def split(word: str):
-    splitted = attempt_split(word)
+def result(splitted: str):
     return {
         "candidates": [
             {
@@ -61,23 +174,27 @@ def split(word: str):
     }
 
 
-def start():
-    global server_proc
-    server_path = os.path.join(BIN_DIR, "compound-splitter-nl")
-    server_proc = Popen(
-        ["perl", os.path.join(server_path, "compound_server.pl")],
-        cwd=server_path,
-        env={"PERL5LIB": server_path})
+def split(word: str):
+    return result(attempt_split([word])[0])
 
-    # wait for the server to start
-    sleep(10)
+
+def split_many(words: List[str]):
+    return [result(splitted) for splitted in attempt_split(words)]
+
+
+def start():
+    supervisor.start()
 
 
 def stop():
-    global server_proc
-    if server_proc:
-        server_proc.terminate()
-        server_proc.communicate()
+    pool.clear()
+    supervisor.stop()
+
+
+def after_fork(worker_index: int, worker_count: int):
+    # the connections belong to the parent process, the server is shared
+    pool.idle = queue.LifoQueue()
+    supervisor.detach()
 
 
 def prepare():
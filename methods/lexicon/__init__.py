@@ -0,0 +1,132 @@
+import os
+import pickle
+from math import exp, log
+from typing import Any, Dict, List, Optional, Tuple
+from .trie import Trie
+
+OWN_DIR = os.path.dirname(__file__)
+BIN_DIR = os.path.join(OWN_DIR, "bin")
+TRIE_PATH = os.path.join(BIN_DIR, "lexicon.pickle")
+
+MIN_PART_LENGTH = 3
+'''Minimum length of a compound part (excluding its infix)'''
+
+MAX_PARTS = 4
+'''Maximum number of parts a compound is split into'''
+
+INFIXES = ["s", "e", "en", "er"]
+'''
+Infixes which may join two parts.
+
+Like `COMPOUND_INFIX_TOLERANCE` in the evaluation, an infix is kept
+at the end of the preceding part, e.g. `kwaliteits_controle`.
+'''
+
+# lexicon of the method
+trie = None  # type: Optional[Trie]
+
+# (sum of the log frequencies, split offsets) of a split
+Split = Tuple[float, Tuple[int, ...]]
+
+
+def splits(word: str) -> Dict[int, Split]:
+    '''
+    Find the best split of a word into lexicon words,
+    for each number of parts.
+
+    The best split has the highest (geometric mean) frequency of its parts.
+    Returns a dict with the best split for each number of parts.
+    '''
+    assert trie is not None, "The lexicon has not been loaded"
+    length = len(word)
+
+    # best[i]: best splits of word[i:], by number of parts
+    best = [{} for _ in range(length + 1)]  # type: List[Dict[int, Split]]
+    for start in range(length - MIN_PART_LENGTH, -1, -1):
+        for end, count in trie.prefixes(word, start):
+            if end - start < MIN_PART_LENGTH:
+                continue
+            if end == length:
+                best[start].setdefault(1, (log(count), ()))
+                continue
+
+            part_score = log(count)
+            for infix in [""] + INFIXES:
+                next_start = end + len(infix)
+                if not word.startswith(infix, end):
+                    continue
+                for parts, (score, offsets) in best[next_start].items():
+                    if parts == MAX_PARTS:
+                        continue
+                    candidate = (part_score + score, (next_start,) + offsets)
+                    current = best[start].get(parts + 1)
+                    if current is None or candidate[0] > current[0]:
+                        best[start][parts + 1] = candidate
+
+    return best[0]
+
+
+def split(word: str):
+    best = splits(word.lower())
+    if not best:
+        # unknown word: leave it unsplit, without any confidence
+        return {
+            "candidates": [
+                {
+                    "parts": [word],
+                    "score": 0
+                }
+            ]
+        }
+
+    # geometric mean of the frequencies, normalized to sum to 1
+    means = {parts: exp(score / parts) for parts, (score, offsets) in best.items()}
+    total = sum(means.values())
+    candidates = []  # type: List[Dict[str, Any]]
+    for parts, (score, offsets) in best.items():
+        bounds = (0,) + offsets + (len(word),)
+        candidates.append({
+            "parts": [word[bounds[i]:bounds[i + 1]] for i in range(parts)],
+            "score": means[parts] / total
+        })
+    candidates.sort(key=lambda candidate: candidate["score"], reverse=True)
+    return {"candidates": candidates}
+
+
+def start():
+    global trie
+    with open(TRIE_PATH, "rb") as trie_file:
+        trie = pickle.load(trie_file)
+
+
+def stop():
+    pass
+
+
+def read_lexicon(path: str) -> Dict[str, int]:
+    '''
+    Read the frequency of each lemma from a lemma set.
+
+    The lemma should be the first column, its frequency the first
+    numeric column after it (or 1 if there is none).
+    '''
+    frequencies = {}  # type: Dict[str, int]
+    with open(path, encoding="utf-8", errors="replace") as lexicon_file:
+        for line in lexicon_file:
+            fields = line.rstrip("\n").split("\t")
+            lemma = fields[0].strip().lower()
+            if len(lemma) < MIN_PART_LENGTH or not lemma.replace("-", "").isalpha():
+                continue
+            count = next((int(field) for field in fields[1:] if field.isdigit()), 1)
+            frequencies[lemma] = frequencies.get(lemma, 0) + max(count, 1)
+    return frequencies
+
+
+def prepare():
+    if not os.path.exists(TRIE_PATH):
+        # should have been retrieved using ~/retrieve.py
+        os.makedirs(BIN_DIR, exist_ok=True)
+        frequencies = read_lexicon(
+            os.path.join(OWN_DIR, "..", "..", "dependencies", "MCS_lemmaset.tsv"))
+        with open(TRIE_PATH, "wb") as trie_file:
+            pickle.dump(Trie.build(frequencies), trie_file, protocol=pickle.HIGHEST_PROTOCOL)
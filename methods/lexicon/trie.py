@@ -0,0 +1,64 @@
+from array import array
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class Trie:
+    '''
+    Compact trie of words and their frequencies, stored in flat arrays.
+
+    The edges of node `n` are `offsets[n]` up to `offsets[n + 1]`:
+    `labels` holds the character of each edge and `targets` the
+    node it leads to. `counts[n]` is the frequency of the word ending
+    at node `n`, or 0 if no word ends there. Node 0 is the root.
+    '''
+
+    def __init__(self, labels: str, offsets: array, targets: array, counts: array):
+        self.labels = labels
+        self.offsets = offsets
+        self.targets = targets
+        self.counts = counts
+
+    @classmethod
+    def build(cls, frequencies: Dict[str, int]) -> "Trie":
+        # build a trie of nested dicts first, with the count under ""
+        root = {}  # type: Dict[str, Any]
+        for word, count in frequencies.items():
+            node = root
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = count
+
+        # then number the nodes breadth-first and flatten them
+        labels = []  # type: List[str]
+        offsets = array("L", [0])
+        targets = array("L")
+        counts = array("L")
+        queue = [root]  # type: List[Dict[str, Any]]
+        for node in queue:
+            counts.append(node.get("", 0))
+            for char in sorted(key for key in node if key):
+                labels.append(char)
+                targets.append(len(queue))
+                queue.append(node[char])
+            offsets.append(len(labels))
+
+        return cls("".join(labels), offsets, targets, counts)
+
+    def prefixes(self, word: str, start: int = 0) -> Iterator[Tuple[int, int]]:
+        '''
+        Find the words in the trie which start at `start` in `word`.
+
+        Yields the end offset of each of them and its frequency.
+        '''
+        labels, offsets, targets, counts = self.labels, self.offsets, self.targets, self.counts
+        node = 0
+        for i in range(start, len(word)):
+            index = labels.find(word[i], offsets[node], offsets[node + 1])
+            if index < 0:
+                return
+            node = targets[index]
+            if counts[node]:
+                yield i + 1, counts[node]
+
+    def __contains__(self, word: str) -> bool:
+        return any(end == len(word) for end, count in self.prefixes(word))
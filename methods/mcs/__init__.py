@@ -1,24 +1,369 @@
 import os
-
+import queue
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, wait
+from itertools import count
 from shutil import copyfile
 import subprocess
+from time import monotonic
+from typing import List, Optional, Tuple
+from compound_splitter import deadline, metrics, tracing
+from compound_splitter.deadline import DeadlineExceeded
+from compound_splitter.hedge import LatencyTracker, first_result
 
 OWN_DIR = os.path.dirname(__file__)
 BIN_DIR = os.path.join(OWN_DIR, "bin")
 
+POOL_SIZE = int(os.environ.get("MCS_POOL_SIZE", "2"))
+'''
+Number of long-lived MCS processes started by `start`
 
-def split(word: str):
+Can be configured with the `MCS_POOL_SIZE` environment variable.
+'''
+
+MCS_ARGS = ["java", "-jar", "MCS.jar", "--SPLIT",
+            "--LEMMASET", "MCS_lemmaset.tsv",
+            "--headMOPs", "MCS_mopset.tsv",
+            "--modifierMOPs", "MCS_mopset.tsv",
+            ]
+
+END_OF_TERM = "qqqendoftermqqq"
+'''
+Nonsense term written to a worker after every word.
+
+MCS cannot split it and echoes it back, which marks where
+the output for the preceding word ends.
+'''
+
+FAILED_TERM = "qqqfailedqqq"
+'''Marks a reply of the pool server with the error of a word which could not be split'''
+
+STOP_TIMEOUT = 5.0
+'''Seconds a worker gets to exit after being terminated, before it is killed'''
+
+HANG_TIMEOUT = 30.0
+'''Seconds after which a worker which has not answered a word is killed (and replaced)'''
+
+
+class Worker:
+    '''
+    A single MCS process which keeps its lexicon loaded.
+
+    Terms are read from stdin (one per line) and the candidates
+    are written to stdout in the same format as `--TERM` would.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.proc = subprocess.Popen(MCS_ARGS,
+                                     cwd=BIN_DIR,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL,
+                                     universal_newlines=True,
+                                     bufsize=1)
+
+    def run(self, word: str) -> str:
+        '''
+        Return the raw output of MCS for a word.
+
+        The caller should hold `lock`. Pipes cannot time out, so
+        the worker is killed if it hangs for `HANG_TIMEOUT` seconds.
+        '''
+        stdin, stdout = self.proc.stdin, self.proc.stdout
+        timer = threading.Timer(HANG_TIMEOUT, self.proc.kill)
+        timer.start()
+        try:
+            with tracing.span("pipe", "MCS worker"):
+                stdin.write(word + "\n" + END_OF_TERM + "\n")
+                stdin.flush()
+
+                lines = []  # type: List[str]
+                for line in iter(stdout.readline, ""):
+                    if line.split("\t", 1)[0].strip().lower() == END_OF_TERM:
+                        return "\n".join(lines)
+                    lines.append(line.rstrip("\n"))
+        finally:
+            timer.cancel()
+        raise OSError(f"MCS worker exited with {self.proc.poll()}")
+
+    def stop(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.terminate()
+        try:
+            self.proc.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+    def close(self):
+        '''
+        Close the pipes to a worker owned by another process,
+        in a forked process.
+        '''
+        for pipe in [self.proc.stdin, self.proc.stdout]:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+# worker subprocesses
+workers = []  # type: List[Worker]
+# held while replacing a worker in the pool
+workers_lock = threading.Lock()
+next_worker = count()
+
+# latencies of the workers, to hedge slow calls
+latencies = LatencyTracker()
+
+# runs the words on the workers, so a caller can stop waiting at its deadline
+executor = None  # type: Optional[ThreadPoolExecutor]
+
+
+def run_once(word: str) -> str:
     # run java script as subprocess
-    p = subprocess.Popen(["java", "-jar", "MCS.jar", "--SPLIT",
-                          "--TERM", word,
-                          "--LEMMASET", "MCS_lemmaset.tsv",
-                          "--headMOPs", "MCS_mopset.tsv",
-                          "--modifierMOPs", "MCS_mopset.tsv",
-                          ],
-                         cwd=BIN_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with tracing.span("jvm", "MCS (including startup)"):
+        p = subprocess.Popen(MCS_ARGS[:4] + ["--TERM", word] + MCS_ARGS[4:],
+                             cwd=BIN_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        try:
+            out, err = p.communicate(timeout=deadline.timeout())
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.communicate()
+            deadline.check()
+            raise OSError(f"MCS did not split {word} in time")
+    return out.decode()
+
+
+def in_pool(worker: Worker) -> bool:
+    '''
+    Check whether a worker (whose lock is held) is still in the pool,
+    and has not been replaced while waiting for its lock.
+    '''
+    with workers_lock:
+        if worker in workers:
+            return True
+    worker.lock.release()
+    return False
+
+
+def replace_worker(worker: Worker):
+    '''
+    Replace a crashed worker (whose lock is held) with a new one.
+    '''
+    with workers_lock:
+        if worker in workers:
+            workers[workers.index(worker)] = Worker()
+    worker.stop()
+
+
+def acquire_idle_worker() -> Optional[Worker]:
+    '''
+    Return an idle worker with its lock held, if there is one.
+    '''
+    for worker in list(workers):
+        if worker.lock.acquire(False) and in_pool(worker):
+            return worker
+    return None
+
+
+def acquire_worker() -> Worker:
+    '''
+    Return a worker with its lock held, preferring an idle one.
+    '''
+    while True:
+        worker = acquire_idle_worker()
+        if worker is not None:
+            return worker
+
+        # everything is busy: queue up round-robin
+        with workers_lock:
+            worker = workers[next(next_worker) % len(workers)]
+        if not worker.lock.acquire(True, deadline.timeout()):
+            deadline.check()
+            raise OSError("No MCS worker available")
+        if in_pool(worker):
+            return worker
+
+
+def exchange(worker: Worker, word: str) -> str:
+    '''
+    Run a word on a worker, and release the worker afterwards.
 
-    out, err = p.communicate()
-    total_output = out.decode().strip()
+    A worker which crashed (or was killed for hanging) is replaced.
+    '''
+    try:
+        started = monotonic()
+        output = worker.run(word)
+        latencies.record(monotonic() - started)
+        return output
+    except OSError:
+        metrics.backend_retries.inc({"backend": "MCS"})
+        replace_worker(worker)
+        raise
+    finally:
+        worker.lock.release()
+
+
+def submit(worker: Worker, word: str) -> Future:
+    '''
+    Start running a word on a worker (whose lock is held) in the background.
+    '''
+    run_executor = executor
+    if run_executor is None:
+        worker.lock.release()
+        raise OSError("MCS has not been started")
+    return run_executor.submit(tracing.propagate(exchange), worker, word)
+
+
+def answer(futures: List[Future], word: str) -> str:
+    '''
+    Return the first output of the workers a word was sent to.
+
+    This only waits until the deadline: the workers are shared, so they
+    finish the word in the background rather than being killed. If they
+    crashed, the word is answered the slow way.
+    '''
+    try:
+        return first_result(futures, timeout=deadline.remaining())
+    except (OSError, TimeoutError):
+        if not any(future.done() for future in futures):
+            raise DeadlineExceeded("Deadline exceeded") from None
+        return run_once(word)
+
+
+def run_on(worker: Worker, word: str) -> str:
+    '''
+    Run a word on a worker (whose lock is held).
+    '''
+    return answer([submit(worker, word)], word)
+
+
+def run_pooled(word: str) -> str:
+    '''
+    Run a word on a worker from the pool.
+
+    A call which takes longer than most (see `LatencyTracker`) is
+    hedged: if another worker is idle, the word is sent to it as
+    well, and the first answer is used.
+    '''
+    futures = [submit(acquire_worker(), word)]
+    delay = latencies.delay() if len(workers) > 1 else None
+    if delay is not None and not wait(futures, timeout=deadline.timeout(delay)).done:
+        backup = acquire_idle_worker()
+        if backup is not None:
+            metrics.hedged_calls.inc({"backend": "MCS"})
+            futures.append(submit(backup, word))
+    return answer(futures, word)
+
+
+class PoolHandler(socketserver.StreamRequestHandler):
+    '''
+    Runs the words of a forked process on the pool, one per line.
+
+    Each reply is the output of MCS followed by a line with `END_OF_TERM`,
+    or a line with `FAILED_TERM` and the error if the word failed.
+    '''
+
+    def handle(self):
+        for line in self.rfile:
+            word = line.decode("utf-8", errors="replace").strip()
+            try:
+                output = run_local(word)
+            except (OSError, DeadlineExceeded) as error:
+                output = f"{FAILED_TERM}\t{error}"
+            try:
+                self.wfile.write((output + "\n" + END_OF_TERM + "\n").encode("utf-8"))
+            except OSError:
+                # the caller gave up, e.g. at its deadline
+                return
+
+
+class PoolServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    '''
+    Serves the pool to the processes forked after MCS was started,
+    on a local port, so they share its workers.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class PoolConnection:
+    '''
+    A persistent connection to the pool server, from a forked process.
+    '''
+
+    def __init__(self, address: Tuple[str, int]):
+        self.socket = socket.create_connection(address, timeout=deadline.timeout())
+        self.reader = self.socket.makefile("r", encoding="utf-8", newline="\n")
+
+    def run(self, word: str) -> str:
+        '''
+        Return the raw output of MCS for a word, like `Worker.run`.
+        '''
+        with tracing.span("socket", "MCS pool"):
+            self.socket.settimeout(deadline.timeout())
+            self.socket.sendall((word.replace("\n", " ") + "\n").encode("utf-8"))
+            lines = []  # type: List[str]
+            for line in iter(self.reader.readline, ""):
+                line = line.rstrip("\n")
+                if line == END_OF_TERM:
+                    if lines and lines[0].startswith(FAILED_TERM + "\t"):
+                        raise OSError(lines[0].split("\t", 1)[1])
+                    return "\n".join(lines)
+                lines.append(line)
+        raise ConnectionError("MCS pool server closed the connection")
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+
+# serves the pool of this process to the processes forked from it
+pool_server = None  # type: Optional[PoolServer]
+# address of the pool server of the process which started MCS
+pool_address = None  # type: Optional[Tuple[str, int]]
+# whether this process was forked after MCS was started, and uses the pool of its parent
+forked = False
+# idle connections to the pool server, in a forked process
+connections = queue.LifoQueue()  # type: queue.LifoQueue
+
+
+def run_local(word: str) -> str:
+    return run_pooled(word) if workers else run_once(word)
+
+
+def run_shared(word: str) -> str:
+    '''
+    Run a word on the pool of the parent process.
+    '''
+    address = pool_address
+    if address is None:
+        raise OSError("MCS has not been started")
+    try:
+        connection = connections.get_nowait()
+    except queue.Empty:
+        connection = PoolConnection(address)
+    try:
+        output = connection.run(word)
+    except (OSError, DeadlineExceeded):
+        connection.close()
+        # a timeout because of the deadline is not the fault of the pool
+        deadline.check()
+        raise
+    connections.put(connection)
+    return output
+
+
+def split(word: str):
+    total_output = (run_shared(word) if forked else run_local(word)).strip()
 
     # parse and format output
     def result(candidate_rank, candidate_output):
@@ -34,12 +379,68 @@ def split(word: str):
     return {"candidates": candidates}
 
 
+def split_many(words: List[str]):
+    size = POOL_SIZE if forked else len(workers)
+    if size < 2:
+        return [split(word) for word in words]
+
+    # keep every worker in the pool busy
+    with ThreadPoolExecutor(size) as split_executor:
+        return list(split_executor.map(tracing.propagate(split), words))
+
+
 def start():
-    pass
+    global executor, pool_server, pool_address
+    for _ in range(POOL_SIZE):
+        workers.append(Worker())
+    # every word being run holds a worker, so there are never more than workers
+    executor = ThreadPoolExecutor(POOL_SIZE)
+
+    pool_server = PoolServer(("localhost", 0), PoolHandler)
+    pool_address = pool_server.server_address[:2]
+    threading.Thread(target=pool_server.serve_forever, name="MCS-pool", daemon=True).start()
 
 
 def stop():
-    pass
+    global executor, pool_server, pool_address
+    while True:
+        try:
+            connections.get_nowait().close()
+        except queue.Empty:
+            break
+    if forked:
+        # the pool belongs to the parent process
+        return
+
+    if pool_server is not None:
+        pool_server.shutdown()
+        pool_server.server_close()
+        pool_server = None
+        pool_address = None
+    if executor is not None:
+        executor.shutdown()
+        executor = None
+    while workers:
+        workers.pop().stop()
+
+
+def after_fork(worker_index: int, worker_count: int):
+    global workers, workers_lock, next_worker, executor, pool_server, connections, forked
+    # the workers belong to the parent process: a pipe cannot be shared
+    # safely (a process which dies mid-word leaves its output unread),
+    # so the words are run on them by the pool server of the parent
+    for worker in workers:
+        worker.close()
+    workers = []
+    workers_lock = threading.Lock()
+    next_worker = count()
+    # the threads of the executor and server were not forked along
+    executor = None
+    if pool_server is not None:
+        pool_server.socket.close()
+        pool_server = None
+    connections = queue.LifoQueue()
+    forked = True
 
 
 def prepare():
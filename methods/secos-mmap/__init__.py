@@ -0,0 +1,91 @@
+import os
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from ..secos import BIN_DIR, SERVER_PATH, prepare as prepare_secos
+from ..secos.engine import Engine
+from ..secos.index import MmapIndex, build_index
+
+COUNTS_INDEX = os.path.join(BIN_DIR, "word_counts.idx")
+CANDIDATES_INDEX = os.path.join(BIN_DIR, "candidates.idx")
+
+# decompounding engine, working on the memory-mapped indexes
+engine = None  # type: Optional[Engine]
+
+
+def split(word: str):
+    assert engine is not None, "secos-mmap has not been started"
+    return {
+        "candidates": [
+            {
+                "parts": engine.decompound(word),
+                "score": 1
+            }
+        ]
+    }
+
+
+def start():
+    global engine
+    engine = Engine(MmapIndex(COUNTS_INDEX), MmapIndex(CANDIDATES_INDEX))
+
+
+def stop():
+    global engine
+    if engine:
+        engine.counts.close()
+        engine.candidates.close()
+        engine = None
+
+
+def prepare():
+    # the indexes are compiled from the data of SECOS
+    prepare_secos()
+
+    if not os.path.exists(COUNTS_INDEX):
+        build_index(COUNTS_INDEX, read_counts(
+            os.path.join(SERVER_PATH, "data", "dutchCoW_trigram__WordCount")))
+
+    if not os.path.exists(CANDIDATES_INDEX):
+        build_index(CANDIDATES_INDEX, read_candidates(
+            os.path.join(SERVER_PATH, "data", "dutchCoW_trigram__candidates")))
+
+
+def read_counts(path: str) -> Iterator[Tuple[str, str]]:
+    '''
+    Read the (lowercased) words and their counts from a word count file
+    for `build_index`.
+
+    The word count files of SECOS are JoBimText word counts:
+    a word and its count per line, separated by a tab.
+    '''
+    counts = {}  # type: Dict[str, int]
+    for line_number, fields in read_fields(path):
+        if len(fields) != 2 or not fields[1].isdigit():
+            raise ValueError(f"{path}:{line_number}: expected a word and its count")
+        word = fields[0].lower()
+        counts[word] = counts.get(word, 0) + int(fields[1])
+    return ((word, str(count)) for word, count in counts.items())
+
+
+def read_candidates(path: str) -> Iterator[Tuple[str, str]]:
+    '''
+    Read the (lowercased) words and their split candidates from
+    a candidates file for `build_index`.
+
+    The candidates files of SECOS are JoBimText similarity lists:
+    a word, a similar word and their similarity per line, separated by
+    tabs. The candidates are stored separated by spaces.
+    '''
+    candidates = {}  # type: Dict[str, Set[str]]
+    for line_number, fields in read_fields(path):
+        if len(fields) < 2 or not fields[1]:
+            raise ValueError(f"{path}:{line_number}: expected a word and a candidate")
+        candidates.setdefault(fields[0].lower(), set()).add(fields[1].lower())
+    return ((word, " ".join(sorted(units))) for word, units in candidates.items())
+
+
+def read_fields(path: str) -> Iterator[Tuple[int, List[str]]]:
+    with open(path, encoding="utf-8", errors="replace") as data_file:
+        for line_number, line in enumerate(data_file, 1):
+            line = line.rstrip("\r\n")
+            if line:
+                yield line_number, line.split("\t")
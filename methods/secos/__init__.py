@@ -1,79 +1,167 @@
 import os
 import sys
 import requests
-from subprocess import Popen, PIPE
+from requests.adapters import HTTPAdapter
+from subprocess import Popen
+from typing import List, Optional
+from compound_splitter import deadline, tracing
+from compound_splitter.supervisor import Supervisor
 
 # default communication settings of the server
 HOST = "localhost"
 PORT = 51337
 
+POOL_SIZE = 8
+'''Maximum number of keep-alive connections kept open to the server'''
+
+SENTENCE_SIZE = 100
+'''Maximum number of words sent to the server as one sentence'''
+
 OWN_DIR = os.path.dirname(__file__)
 BIN_DIR = os.path.join(OWN_DIR, "bin")
 SERVER_PATH = os.path.join(OWN_DIR, "bin", "SECOS-master")
 
-# server subprocess
-server_proc = None
+# keep-alive HTTP client
+session = None  # type: Optional[requests.Session]
 
 
-def split(word: str):
-    response = requests.get(f'http://{HOST}:{PORT}?sentence={word}')
-    splitted = response.text.lstrip()
-    if not splitted:
-        splitted = word
+def decompound(sentence: str) -> str:
+    global session
+    if session is None:
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_maxsize=POOL_SIZE))
+
+    with tracing.span("http", f"SECOS ({len(sentence.split())} words)"):
+        try:
+            response = session.get(f'http://{HOST}:{PORT}',
+                                   params={"sentence": sentence},
+                                   timeout=deadline.timeout())
+        except OSError:
+            # a timeout because of the deadline is not the fault of the server
+            deadline.check()
+            raise
+        return response.text
+
+
+def result(parts: List[str]):
     return {
         "candidates": [
             {
-                "parts": splitted.split(" "),
+                "parts": parts,
                 "score": 1
             }
         ]
     }
 
 
+def split(word: str):
+    splitted = supervisor.call(decompound, word).lstrip()
+    if not splitted:
+        splitted = word
+    return result(splitted.split(" "))
+
+
+def align(words: List[str], tokens: List[str]) -> Optional[List[List[str]]]:
+    '''
+    Map the tokens of a decompounded sentence back to its words.
+
+    SECOS separates parts with the same space as the words, so the tokens
+    are assigned to a word until they spell out that word.
+    Returns None if the tokens cannot be aligned.
+    '''
+
+    def normalize(text: str):
+        return text.lower().replace("-", "")
+
+    parts_per_word = []
+    i = 0
+    for word in words:
+        target = normalize(word)
+        parts = []  # type: List[str]
+        joined = ""
+        while i < len(tokens) and len(joined) < len(target):
+            parts.append(tokens[i])
+            joined += normalize(tokens[i])
+            i += 1
+        if joined != target:
+            return None
+        parts_per_word.append(parts)
+
+    return parts_per_word if i == len(tokens) else None
+
+
+def split_many(words: List[str]):
+    results = []
+    for i in range(0, len(words), SENTENCE_SIZE):
+        batch = words[i:i + SENTENCE_SIZE]
+        aligned = None
+        if all(word and len(word.split()) == 1 for word in batch):
+            sentence = supervisor.call(decompound, " ".join(batch))
+            aligned = align(batch, sentence.split())
+
+        if aligned is None:
+            results += [split(word) for word in batch]
+        else:
+            results += [result(parts) for parts in aligned]
+    return results
+
+
+def server_command(candidates_path: str, counts_path: str, port: int) -> List[str]:
+    return [
+        sys.executable or "python",
+        "-u",
+        os.path.join(SERVER_PATH, "decompound_server.py"),
+        # dt_candidates:   file with words and their split candidates, generated from a distributional thesaurus (DT)
+        candidates_path,
+        # word_count_file: file with word counts used for filtering
+        counts_path,
+        # min_word_count:  minimal word count used for split candidates (recommended paramater: 50)
+        "50",
+        # prefix_length:   length of prefixes that are appended to the right-sided word (recommended parameter: 3)
+        "3",
+        # suffix_length:   length of suffixes that are appended to the left-sided word (recommended parameter: 3)
+        "3",
+        # word_length:     minimal word length that is used from the split candidates (recommended parameter: 5)
+        "5",
+        # dash_word:       heuristic to split words with dash, which has no big impact (recommended: 3)
+        "3",
+        # upper:           consider uppercase letters (=upper) or not (=lower).
+        #                  Should be set for case-sensitive languages e.g. German
+        "lower",
+        # epsilon:         smoothing factor (recommended parameter: 0.01)
+        "0.01",
+        str(port)]
+
+
+def launch():
+    return Popen(
+        server_command("data/dutchCoW_trigram__candidates", "data/dutchCoW_trigram__WordCount", PORT),
+        cwd=SERVER_PATH)
+
+
+supervisor = Supervisor("SECOS", launch, HOST, PORT,
+                        health_check=lambda: decompound("fietsenstalling"),
+                        startup_timeout=600)
+
+
 def start():
-    global server_proc
-    server_proc = Popen(
-        [sys.executable or "python",
-         "-u",
-         os.path.join(SERVER_PATH, "decompound_server.py"),
-         # dt_candidates:   file with words and their split candidates, generated from a distributional thesaurus (DT)
-         "data/dutchCoW_trigram__candidates",
-         # word_count_file: file with word counts used for filtering
-         "data/dutchCoW_trigram__WordCount",
-         # min_word_count:  minimal word count used for split candidates (recommended paramater: 50)
-         "50",
-         # prefix_length:   length of prefixes that are appended to the right-sided word (recommended parameter: 3)
-         "3",
-         # suffix_length:   length of suffixes that are appended to the left-sided word (recommended parameter: 3)
-         "3",
-         # word_length:     minimal word length that is used from the split candidates (recommended parameter: 5)
-         "5",
-         # dash_word:       heuristic to split words with dash, which has no big impact (recommended: 3)
-         "3",
-         # upper:           consider uppercase letters (=upper) or not (=lower).
-         #                  Should be set for case-sensitive languages e.g. German
-         "lower",
-         # epsilon:         smoothing factor (recommended parameter: 0.01)
-         "0.01",
-         str(PORT)],
-        cwd=SERVER_PATH,
-        stdout=PIPE,
-        universal_newlines=True)
-
-    # wait for the server to start
     print("Waiting for SECOS to start...")
-    for output in iter(server_proc.stdout.readline, ""):
-        print(output)
-        if "Starting httpd using port" in output:
-            print("SECOS start detected!")
-            return
+    supervisor.start()
 
 
 def stop():
-    global server_proc
-    if server_proc:
-        server_proc.terminate()
-        server_proc.communicate()
+    global session
+    supervisor.stop()
+    if session:
+        session.close()
+        session = None
+
+
+def after_fork(worker_index: int, worker_count: int):
+    global session
+    # the connections belong to the parent process, the server is shared
+    session = None
+    supervisor.detach()
 
 
 def prepare():
@@ -0,0 +1,169 @@
+from math import log
+from typing import Dict, List, Set, Tuple
+from .index import MmapIndex
+
+
+class Engine:
+    '''
+    In-process implementation of the SECOS decompounding algorithm.
+
+    Works on the word counts and split candidates compiled by `prepare`
+    into memory-mapped indexes, with the same parameters as the
+    SECOS server (see `start`):
+
+    - `min_word_count`: minimal word count of a part
+    - `prefix_length`: maximum length of a prefix appended to the right-sided part
+    - `suffix_length`: maximum length of a suffix appended to the left-sided part
+    - `word_length`: minimal length of the split candidates used
+    - `dash_word`: minimal length of the parts of a word split at its dashes
+    - `upper`: whether to consider uppercase letters
+    - `epsilon`: smoothing factor for the word counts
+
+    Split points are taken from the candidates of a word (similar words
+    from the distributional thesaurus which are part of the word) or, if it
+    has none, from all known words in it. The split whose parts have the
+    highest (geometric mean) smoothed count is selected.
+    '''
+
+    def __init__(self,
+                 counts: MmapIndex,
+                 candidates: MmapIndex,
+                 min_word_count: int = 50,
+                 prefix_length: int = 3,
+                 suffix_length: int = 3,
+                 word_length: int = 5,
+                 dash_word: int = 3,
+                 upper: bool = False,
+                 epsilon: float = 0.01):
+        self.counts = counts
+        self.candidates = candidates
+        self.min_word_count = min_word_count
+        self.prefix_length = prefix_length
+        self.suffix_length = suffix_length
+        self.word_length = word_length
+        self.dash_word = dash_word
+        self.upper = upper
+        self.epsilon = epsilon
+
+    def decompound(self, word: str) -> List[str]:
+        '''
+        Split a word, returning its parts.
+        '''
+        if not self.upper:
+            word = word.lower()
+
+        pieces = word.split("-")
+        if len(pieces) > 1 and all(len(piece) >= self.dash_word for piece in pieces):
+            # keep the dash at the end of the left piece
+            parts = []  # type: List[str]
+            for i, piece in enumerate(pieces):
+                piece_parts = self.split_word(piece)
+                if i < len(pieces) - 1:
+                    piece_parts[-1] += "-"
+                parts += piece_parts
+            return parts
+
+        return self.split_word(word)
+
+    def split_word(self, word: str) -> List[str]:
+        counts = {}  # type: Dict[str, int]
+
+        def count(text: str) -> int:
+            if text not in counts:
+                value = self.counts.get(text)
+                counts[text] = int(value) if value else 0
+            return counts[text]
+
+        bounds = [0] + self.split_points(word, count) + [len(word)]
+        best = self.best_splits(word, bounds, count)
+
+        # the split with the highest mean part score, preferring fewer parts
+        last = len(bounds) - 1
+        best_parts = 1
+        for parts in range(2, len(best)):
+            if last in best[parts] and \
+                    best[parts][last][0] / parts > best[best_parts][last][0] / best_parts:
+                best_parts = parts
+
+        offsets = []  # type: List[int]
+        i = last
+        for parts in range(best_parts, 0, -1):
+            offsets.append(bounds[i])
+            i = best[parts][i][1]
+        offsets.reverse()
+        return [word[start:end] for start, end in zip([0] + offsets, offsets)]
+
+    def best_splits(self, word: str, bounds: List[int], count) -> List[Dict[int, Tuple[float, int]]]:
+        '''
+        Find the best splits of a word at the given bounds. Returns, for
+        every number of parts, the highest summed part score of each prefix
+        `word[:bounds[i]]` split into that many parts (by `i`), along with
+        the bound before the last part.
+        '''
+        best = [{0: (0.0, -1)}]  # type: List[Dict[int, Tuple[float, int]]]
+        while best[-1]:
+            previous = best[-1]
+            current = {}  # type: Dict[int, Tuple[float, int]]
+            for end in range(1, len(bounds)):
+                for start, (total, _) in previous.items():
+                    if start < end and self.allowed(word, bounds[start], bounds[end]):
+                        total += self.part_score(word[bounds[start]:bounds[end]], count)
+                        if end not in current or total > current[end][0]:
+                            current[end] = (total, start)
+            best.append(current)
+        return best
+
+    def allowed(self, word: str, start: int, end: int) -> bool:
+        '''
+        Check whether `word[start:end]` can be a part of a split.
+
+        Short parts are attached to their neighbours: a prefix at the
+        start of the word to the part after it, and a suffix (e.g. an
+        infix like -s-) to the part before it. This is the same as not
+        splitting there, so parts which would be attached are not allowed.
+        '''
+        if (start, end) == (0, len(word)):
+            return True
+        length = end - start
+        if length < self.word_length - self.suffix_length:
+            return False
+        if start == 0:
+            return length > self.prefix_length
+        return length > self.suffix_length
+
+    def split_points(self, word: str, count) -> List[int]:
+        '''
+        Return the offsets at which known parts of a word start or end.
+        '''
+        units = set()  # type: Set[Tuple[int, int]]
+        candidates = self.candidates.get(word)
+        for unit in (candidates or "").split():
+            if len(unit) < self.word_length or unit == word or count(unit) < self.min_word_count:
+                continue
+            start = word.find(unit)
+            while start >= 0:
+                units.add((start, start + len(unit)))
+                start = word.find(unit, start + 1)
+
+        if not units:
+            for start in range(len(word)):
+                for end in range(start + self.word_length, len(word) + 1):
+                    if (start, end) != (0, len(word)) and count(word[start:end]) >= self.min_word_count:
+                        units.add((start, end))
+
+        points = {point for unit in units for point in unit} - {0, len(word)}
+        return sorted(points)
+
+    def part_score(self, part: str, count) -> float:
+        '''
+        Logarithm of the smoothed count of a part. The split with the
+        highest mean part score (i.e. geometric mean count) is selected.
+
+        A part ending in an appended suffix is counted as
+        the most frequent word it can be stripped to.
+        '''
+        part_count = max(count(part[:len(part) - i])
+                         for i in range(min(self.suffix_length, len(part) - 1) + 1))
+        if part_count < self.min_word_count:
+            part_count = 0
+        return log(part_count + self.epsilon)
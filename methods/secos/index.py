@@ -0,0 +1,84 @@
+import mmap
+import os
+import struct
+from typing import Iterable, Optional, Tuple
+
+MAGIC = b"CSIDX001"
+HEADER = struct.Struct("<8sQ")
+OFFSET = struct.Struct("<Q")
+
+
+def build_index(path: str, items: Iterable[Tuple[str, str]]):
+    '''
+    Write key-value pairs to a binary index file which can be
+    searched by `MmapIndex`.
+
+    The file consists of a header with the number of records, a table
+    with the file offset of each record (and of the end of the last one)
+    and the records themselves: `key<TAB>value<NEWLINE>` in UTF-8,
+    sorted by key. Keys should not contain tabs or newlines.
+    '''
+    records = sorted((key.encode(), value.encode()) for key, value in items)
+    start = HEADER.size + OFFSET.size * (len(records) + 1)
+
+    offsets = []
+    offset = start
+    for key, value in records:
+        offsets.append(offset)
+        offset += len(key) + len(value) + 2
+    offsets.append(offset)
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as index_file:
+        index_file.write(HEADER.pack(MAGIC, len(records)))
+        index_file.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+        for key, value in records:
+            index_file.write(key + b"\t" + value + b"\n")
+    os.replace(temporary_path, path)
+
+
+class MmapIndex:
+    '''
+    Read-only index built by `build_index`.
+
+    The file is memory-mapped, so opening it is instant and its pages
+    are shared between all processes using it. Lookups are a binary
+    search over the sorted records.
+    '''
+
+    def __init__(self, path: str):
+        with open(path, "rb") as index_file:
+            self.map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an index file")
+
+    def offset(self, i: int) -> int:
+        return OFFSET.unpack_from(self.map, HEADER.size + OFFSET.size * i)[0]
+
+    def get(self, key: str) -> Optional[str]:
+        '''
+        Return the value of a key, or None if it is not in the index.
+        '''
+        target = key.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.offset(middle)
+            separator = self.map.find(b"\t", start)
+            current = self.map[start:separator]
+            if current == target:
+                end = self.offset(middle + 1)
+                return self.map[separator + 1:end - 1].decode()
+            if current < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        self.map.close()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import json
+import unittest
+from unittest import mock
+from compound_splitter import api_web
+
+
+class FakeMethod:
+    def split_many(self, words):
+        return [{"candidates": [{"parts": [word[:4], word[4:]], "score": 1}]} for word in words]
+
+
+class TestPostSplit(unittest.TestCase):
+    def setUp(self):
+        self.client = api_web.app.test_client()
+        patcher = mock.patch.object(api_web.started_methods, "get", return_value=FakeMethod())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_words(self):
+        response = self.client.post("/split/fake", json=["huisjacht", "pankoek", "huisjacht"])
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [line["word"] for line in lines] == ["huisjacht", "pankoek"]
+        assert lines[1]["candidates"][0]["parts"] == ["pank", "oek"]
+
+    def test_lines(self):
+        response = self.client.post("/split/fake", data=b"huisjacht\n\xffkoek\npankoek\n")
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        # an invalid byte does not break off the response
+        assert [line["word"] for line in lines] == ["huisjacht", "\ufffdkoek", "pankoek"]
+
+    def test_not_a_list_of_words(self):
+        for body in ["huisjacht", {"huisjacht": 1}, ["huisjacht", 5], 5]:
+            response = self.client.post("/split/fake", json=body)
+            assert response.status_code == 400, body
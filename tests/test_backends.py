@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+import importlib
+import unittest
+from compound_splitter.supervisor import BackendUnavailable
+
+compound_splitter_nl = importlib.import_module("methods.compound-splitter-nl")
+
+
+class TestBackendUnavailable(unittest.TestCase):
+    def test_not_passed_off_as_unsplit(self):
+        # the server has not been started
+        assert not compound_splitter_nl.supervisor.ready
+        with self.assertRaises(BackendUnavailable):
+            compound_splitter_nl.split("fietsenstalling")
+        with self.assertRaises(BackendUnavailable):
+            compound_splitter_nl.split_many(["fietsenstalling", "huisjacht"])
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import json
+import unittest
+from unittest import mock
+from compound_splitter.benchmark import LATENCY_BUCKETS, SLOWEST_WORDS, benchmark, latency_stats
+
+
+class TestLatencyStats(unittest.TestCase):
+    def test_stats(self):
+        latencies = [0.002 * (i + 1) for i in range(100)]
+        compounds = [f"woord{i}" for i in range(100)]
+        stats = latency_stats(compounds, latencies)
+        assert stats["words"] == 100
+        assert abs(stats["total_time"] - sum(latencies)) < 1e-9
+        assert abs(stats["words_per_second"] - 100 / sum(latencies)) < 1e-9
+        assert (stats["p50"], stats["p95"], stats["p99"], stats["max"]) == \
+            (latencies[49], latencies[94], latencies[98], latencies[99])
+        # 0.002 up to 0.010 seconds, and 0.012 up to 0.2 seconds
+        assert stats["histogram"] == {"buckets": LATENCY_BUCKETS, "counts": [0, 0, 5, 45, 50, 0, 0]}
+        assert [item["word"] for item in stats["slowest"]] == [f"woord{i}" for i in range(99, 99 - SLOWEST_WORDS, -1)]
+
+    def test_empty(self):
+        stats = latency_stats([], [])
+        assert stats["words"] == 0
+        assert stats["words_per_second"] is None
+        assert stats["p50"] is None and stats["max"] is None
+        assert stats["slowest"] == []
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_never(self):
+        test_sets = [("klein", [("huisjacht", "huis_jacht"), ("pankoek", "pan_koek")])]
+        with mock.patch("compound_splitter.benchmark.list_methods", return_value=[{"name": "never"}]):
+            report = benchmark(test_sets)
+
+        stats = report["test_sets"]["klein"]["never"]
+        assert stats["startup_time"] >= 0
+        for run in ["cold", "warm"]:
+            assert stats[run]["words"] == 2
+            assert sum(stats[run]["histogram"]["counts"]) == 2
+        assert stats["peak_rss_kb"]["python"] > 0
+        # the report can be saved
+        json.dumps(report)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from compound_splitter import bulk
+
+
+class FakeMethod:
+    def __init__(self):
+        self.started = False
+        self.stopped = False
+
+    def split_many(self, words):
+        return [{"candidates": [{"parts": word.split("-"), "score": 1}]} for word in words]
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.stopped = True
+
+
+class TestBulk(unittest.TestCase):
+    def test_read_words(self):
+        lines = ["De fietsen-stalling is 2 keer zo groot.\n", "Fietsen-stalling!\n"]
+        words = list(bulk.unique(bulk.read_words(lines, tokenize=True), {"is"}))
+        assert words == ["De", "fietsen-stalling", "keer", "zo", "groot", "Fietsen-stalling"]
+        assert list(bulk.read_words([" huisjacht \n", "\n"])) == ["huisjacht"]
+
+    def test_split_words(self):
+        method = FakeMethod()
+        output = io.StringIO()
+        with mock.patch.object(bulk, "get_method", return_value=method):
+            written = bulk.split_words("fake", ["huis-jacht", "pan-koek", "zon"], output,
+                                       workers=2, batch_size=1)
+
+        assert written == 3
+        assert output.getvalue() == "huis-jacht\thuis_jacht\t1\npan-koek\tpan_koek\t1\nzon\tzon\t1\n"
+        assert method.started and method.stopped
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "output.jsonl")
+            with open(path, "w") as output_file:
+                output_file.write(json.dumps({"word": "huisjacht", "candidates": []}) + "\n")
+                output_file.write('{"word": "pan')
+
+            assert bulk.completed_words(path, "jsonl") == {"huisjacht"}
+            with open(path) as output_file:
+                assert output_file.read().count("\n") == 1
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import unittest
+from compound_splitter.cache import SplitCache
+
+
+def result(*parts):
+    return {"candidates": [{"parts": list(parts), "score": 1}]}
+
+
+class TestCache(unittest.TestCase):
+    def test_lru(self):
+        cache = SplitCache(max_entries=2)
+        cache.put("huisjacht", result("huis", "jacht"))
+        cache.put("pankoek", result("pan", "koek"))
+        # touch huisjacht, so pankoek is the least recently used
+        assert cache.get("huisjacht") == result("huis", "jacht")
+        cache.put("zonscherm", result("zon", "scherm"))
+
+        assert cache.get("pankoek") is None
+        assert cache.get("huisjacht") is not None
+        assert cache.get("zonscherm") is not None
+        stats = cache.stats()
+        assert stats["hits"] == 3
+        assert stats["misses"] == 1
+        assert stats["evictions"] == 1
+        assert stats["entries"] == 2
+
+    def test_max_bytes(self):
+        cache = SplitCache(max_bytes=100)
+        cache.put("huisjacht", result("huis", "jacht"))
+        cache.put("pankoek", result("pan", "koek"))
+        assert cache.stats()["bytes"] <= 100
+        assert cache.get("huisjacht") is None
+        assert cache.get("pankoek") is not None
+
+    def test_ttl(self):
+        cache = SplitCache(ttl=-1)
+        cache.put("huisjacht", result("huis", "jacht"))
+        assert cache.get("huisjacht") is None
+        assert cache.stats()["entries"] == 0
+
+    def test_case_fold(self):
+        cache = SplitCache(case_fold=True)
+        cache.put("Huisjacht", result("huis", "jacht"))
+        assert cache.get("huisjacht") == result("huis", "jacht")
+        assert SplitCache().get("huisjacht") is None
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from unittest import mock
+from compound_splitter import store
+from compound_splitter.splitter import StartedMethods, get_method
+
+
+class FakeStage:
+    def __init__(self, split_word):
+        self.split_word = split_word
+        self.starts = 0
+        self.stops = 0
+        self.words = []  # type: list
+
+    def start(self):
+        self.starts += 1
+
+    def stop(self):
+        self.stops += 1
+
+    def split(self, word):
+        return self.split_many([word])[0]
+
+    def split_many(self, words):
+        self.words += words
+        return [self.split_word(word) for word in words]
+
+
+def result(parts, score=1.0):
+    return {"candidates": [{"parts": parts, "score": score}]}
+
+
+class TestCascade(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.stages = {
+            # only sure of "huisjacht"
+            "eerste": FakeStage(lambda word: result([word[:4], word[4:]], 1.0 if word == "huisjacht" else 0.5)),
+            # agrees with the first stage on "pankoek"
+            "tweede": FakeStage(lambda word: result([word[:4], word[4:]] if word == "pankoek" else [word[:3], word[3:]])),
+            "derde": FakeStage(lambda word: result([word])),
+        }
+        self.run_data = {
+            "cascade": {
+                "protocol": "cascade",
+                "stages": [{"method": "eerste", "threshold": 0.9}, {"method": "tweede"}, {"method": "derde"}],
+                "agree": 2
+            },
+            **{name: {"protocol": "module", "cache": False} for name in self.stages}
+        }
+
+        patcher = mock.patch("compound_splitter.splitter.registry")
+        registry = patcher.start()
+        registry.get.side_effect = lambda name: self.run_data[name]
+        registry.load.side_effect = lambda name: self.stages[name]
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def use_store(self):
+        patcher = mock.patch.dict(os.environ,
+                                  {store.STORE_VARIABLE: os.path.join(self.directory.name, "splits.db")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stages(self):
+        cascade = get_method("cascade", cached=False)
+        cascade.start()
+        results = cascade.split_many(["huisjacht", "pankoek", "zonscherm"])
+        cascade.stop()
+
+        # resolved by the threshold, by agreement and by falling through to the last stage
+        assert [result["candidates"][0]["parts"] for result in results] == \
+            [["huis", "jacht"], ["pank", "oek"], ["zonscherm"]]
+        assert self.stages["eerste"].words == ["huisjacht", "pankoek", "zonscherm"]
+        assert self.stages["tweede"].words == ["pankoek", "zonscherm"]
+        assert self.stages["derde"].words == ["zonscherm"]
+        assert cascade.stats() == {"eerste": 1, "tweede": 1, "derde": 1}
+
+    def test_shared_start(self):
+        started_methods = StartedMethods()
+        cascade = started_methods.get("cascade", lazy=False)
+        eerste = started_methods.get("eerste", lazy=False)
+        # the module of a method is started once, however many use it
+        assert [stage.starts for stage in self.stages.values()] == [1, 1, 1]
+
+        cascade.stop()
+        assert self.stages["eerste"].stops == 0
+        assert self.stages["derde"].stops == 1
+        assert eerste.split("huisjacht")["candidates"][0]["parts"] == ["huis", "jacht"]
+        started_methods.stop()
+        assert self.stages["eerste"].stops == 1
+
+    def test_store(self):
+        self.use_store()
+        store.precompute("cascade", ["huisjacht", "zonscherm"])
+        assert self.stages["derde"].stops == 1
+
+        # answered from the store, without starting any stage
+        started_methods = StartedMethods()
+        cascade = started_methods.get("cascade")
+        assert cascade.split("zonscherm")["candidates"][0]["parts"] == ["zonscherm"]
+        assert self.stages["derde"].starts == 1
+        assert cascade.split("pankoek")["candidates"][0]["parts"] == ["pank", "oek"]
+        started_methods.stop()
+
+        # the results of a changed stage are not used
+        self.run_data["derde"]["version"] = "2"
+        cascade = get_method("cascade")
+        assert cascade.store.get_many("cascade", cascade.version, ["huisjacht", "zonscherm"]) == {}
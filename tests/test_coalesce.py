@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from compound_splitter.coalesce import Coalescer, get_coalescer
+
+
+class FakeBackend:
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def split_many(self, words):
+        with self.lock:
+            self.batches.append(list(words))
+        if "kapot" in words:
+            raise OSError("backend failed")
+        return [{"candidates": [{"parts": [word], "score": 1}]} for word in words]
+
+
+class TestCoalescer(unittest.TestCase):
+    def test_batches(self):
+        backend = FakeBackend()
+        coalescer = Coalescer("fake", backend.split_many, window=0.2, max_batch=4)
+        words = ["huisjacht", "pankoek", "huisjacht", "zonscherm"]
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda word: coalescer.split_many([word]), words))
+
+        assert [result[0]["candidates"][0]["parts"] for result in results] == [[word] for word in words]
+        # the identical word is only split once, all in one batch
+        assert len(backend.batches) == 1
+        assert sorted(backend.batches[0]) == ["huisjacht", "pankoek", "zonscherm"]
+        assert coalescer.in_flight == {}
+
+    def test_max_batch(self):
+        backend = FakeBackend()
+        coalescer = Coalescer("fake", backend.split_many, window=10, max_batch=2)
+        # a full batch is sent without waiting for the window
+        coalescer.split_many(["huisjacht", "pankoek"])
+        assert backend.batches == [["huisjacht", "pankoek"]]
+
+    def test_error(self):
+        backend = FakeBackend()
+        coalescer = Coalescer("fake", backend.split_many, window=0)
+        with self.assertRaises(OSError):
+            coalescer.split_many(["kapot"])
+        assert coalescer.in_flight == {}
+        assert coalescer.split_many(["heel"])[0]["candidates"][0]["parts"] == ["heel"]
+
+    def test_failed_batch(self):
+        backend = FakeBackend()
+        coalescer = Coalescer("fake", backend.split_many, window=0.2)
+
+        def split(word):
+            try:
+                return coalescer.split_many([word])[0]["candidates"][0]["parts"]
+            except OSError as error:
+                return str(error)
+
+        with ThreadPoolExecutor(2) as executor:
+            results = list(executor.map(split, ["kapot", "heel"]))
+        # the error is raised for every word of the failed batch, which is not split again
+        assert results == ["backend failed", "backend failed"]
+        assert sorted(map(sorted, backend.batches)) == [["heel", "kapot"]]
+        assert coalescer.in_flight == {}
+
+    def test_missing_results(self):
+        coalescer = Coalescer("fake", lambda words: FakeBackend().split_many(words)[:1], window=0)
+        # the words without a result do not wait forever
+        with self.assertRaisesRegex(RuntimeError, "1 results for 2 words"):
+            coalescer.split_many(["huisjacht", "pankoek"])
+        assert coalescer.in_flight == {}
+
+    def test_options(self):
+        assert get_coalescer("fake", None, FakeBackend().split_many) is None
+        coalescer = get_coalescer("fake", {"window": 5, "maxBatch": 10}, FakeBackend().split_many)
+        assert coalescer.window == 0.005
+        assert coalescer.max_batch == 10
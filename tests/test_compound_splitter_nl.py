@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import importlib
+import socketserver
+import threading
+import unittest
+
+nl = importlib.import_module("methods.compound-splitter-nl")
+
+
+class StubHandler(socketserver.StreamRequestHandler):
+    '''
+    A stand-in for compound-splitter-nl which splits every word in half.
+
+    It hangs up at "dood", and at "sluit" the first time it is sent.
+    '''
+
+    def handle(self):
+        self.server.connections += 1
+        for line in self.rfile:
+            word = line.decode().strip()
+            if word == "dood" or (word == "sluit" and word not in self.server.seen):
+                self.server.seen.add(word)
+                return
+            if word == "heel":
+                # no split applied
+                self.wfile.write(b"\n")
+            else:
+                middle = len(word) // 2
+                self.wfile.write(f"{word[:middle]} {word[middle:]}\n".encode())
+
+
+class StubServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("localhost", 0), StubHandler)
+        self.connections = 0
+        self.seen = set()  # type: set
+
+
+class TestConnections(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port, self.pool = nl.PORT, nl.pool
+        nl.PORT = self.server.server_address[1]
+        nl.pool = nl.ConnectionPool(2)
+
+    def tearDown(self):
+        nl.pool.clear()
+        nl.PORT, nl.pool = self.port, self.pool
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pipelining(self):
+        words = [f"woord{i:03}" for i in range(nl.PIPELINE_DEPTH * 2 + 10)] + ["heel"]
+        # the replies are read back in the order of the words, over one connection
+        assert nl.retrieve_many(words) == [f"woor d{i:03}" for i in range(nl.PIPELINE_DEPTH * 2 + 10)] + ["heel"]
+        assert self.server.connections == 1
+
+    def test_pool(self):
+        assert nl.retrieve("huisjacht") == "huis jacht"
+        assert nl.pool.idle.qsize() == 1
+        # the connection is returned to the pool and used again
+        assert nl.retrieve_many(["pankoek", "zonscherm"]) == ["pan koek", "zons cherm"]
+        assert nl.pool.idle.qsize() == 1
+        assert self.server.connections == 1
+
+        connections = [nl.pool.get() for _ in range(3)]
+        for connection in connections:
+            nl.pool.put(connection)
+        # only as many idle connections as the pool size are kept
+        assert nl.pool.idle.qsize() == 2
+
+    def test_closed_mid_batch(self):
+        # the words after the one at which the server hung up are sent on a fresh connection
+        assert nl.retrieve_many(["huisjacht", "sluit", "pankoek"]) == ["huis jacht", "sl uit", "pan koek"]
+        assert self.server.connections == 2
+        assert nl.pool.idle.qsize() == 1
+
+    def test_no_reply(self):
+        with self.assertRaisesRegex(ConnectionError, "No reply"):
+            nl.retrieve_many(["huisjacht", "dood", "pankoek"])
+        # the connection is not returned to the pool
+        assert nl.pool.idle.qsize() == 0
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from compound_splitter import deadline
+from compound_splitter.coalesce import Coalescer
+from compound_splitter.deadline import DeadlineExceeded
+from compound_splitter.hedge import LatencyTracker, first_result
+
+
+class TestDeadline(unittest.TestCase):
+    def test_until(self):
+        assert deadline.get() is None
+        assert deadline.timeout(5) == 5
+        with deadline.until(deadline.after(1000)):
+            assert 0 < deadline.timeout() <= 1
+            assert deadline.timeout(0.5) == 0.5
+            # an inner, later deadline does not extend the outer one
+            with deadline.until(deadline.after(60000)):
+                assert deadline.remaining() <= 1
+            with deadline.until(None):
+                assert deadline.remaining() <= 1
+            with deadline.until(deadline.after(60000), replace=True):
+                assert deadline.remaining() > 1
+        assert deadline.get() is None
+
+    def test_expired(self):
+        with deadline.until(time.monotonic() - 1):
+            assert deadline.expired()
+            with self.assertRaises(DeadlineExceeded):
+                deadline.check()
+            with self.assertRaises(DeadlineExceeded):
+                deadline.timeout()
+        deadline.check()
+
+    def test_parse(self):
+        assert deadline.parse_milliseconds(None) is None
+        assert deadline.parse_milliseconds("250") == 250
+        for value in ["0", "-5", "nan", "soon"]:
+            with self.assertRaises(ValueError):
+                deadline.parse_milliseconds(value)
+
+    def test_not_os_error(self):
+        # the circuit breakers only count OSErrors as backend failures
+        assert not issubclass(DeadlineExceeded, OSError)
+
+
+class TestHedge(unittest.TestCase):
+    def test_delay(self):
+        tracker = LatencyTracker(percent=50, samples=10, min_samples=3)
+        tracker.record(0.1)
+        tracker.record(0.3)
+        assert tracker.delay() is None
+        tracker.record(0.2)
+        assert tracker.delay() == 0.2
+
+    def test_first_result(self):
+        failed, slow, fast = Future(), Future(), Future()
+        failed.set_exception(OSError("replica failed"))
+        fast.set_result("fast")
+        assert first_result([failed, slow, fast]) == "fast"
+
+        other = Future()
+        other.set_exception(OSError("other replica failed"))
+        with self.assertRaisesRegex(OSError, "replica failed"):
+            first_result([failed, other])
+
+        started = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            first_result([failed, slow], timeout=0.05)
+        assert time.monotonic() - started < 1
+
+
+class TestCoalescerDeadline(unittest.TestCase):
+    def test_follower_deadline(self):
+        started, release = threading.Event(), threading.Event()
+
+        def split_many(words):
+            started.set()
+            release.wait(5)
+            return [{"candidates": [{"parts": [word], "score": 1}]} for word in words]
+
+        coalescer = Coalescer("slow", split_many, window=0)
+        with ThreadPoolExecutor(1) as executor:
+            leader = executor.submit(coalescer.split_many, ["huisjacht"])
+            started.wait(5)
+            # the follower shares the word being split, but gives up at its deadline
+            with deadline.until(deadline.after(50)):
+                with self.assertRaises(DeadlineExceeded):
+                    coalescer.split_many(["huisjacht"])
+            release.set()
+            assert leader.result(5)[0]["candidates"][0]["parts"] == ["huisjacht"]
+        assert coalescer.in_flight == {}
+
+    def test_batch_deadline(self):
+        deadlines = []
+
+        def split_many(words):
+            deadlines.append(deadline.get())
+            return [{"candidates": []} for word in words]
+
+        coalescer = Coalescer("fake", split_many, window=0)
+        when = deadline.after(1000)
+        with deadline.until(when):
+            coalescer.split_many(["huisjacht"])
+        coalescer.split_many(["pankoek"])
+        assert deadlines == [when, None]
+
+    def test_leader_deadline(self):
+        def split_many(words):
+            time.sleep(0.5)
+            return [{"candidates": []} for word in words]
+
+        coalescer = Coalescer("slow", split_many, window=0.05)
+        with ThreadPoolExecutor(1) as executor:
+            other = executor.submit(coalescer.split_many, ["pankoek"])
+            # the first caller gives up at its own deadline, not at that of the batch
+            started = time.monotonic()
+            with deadline.until(deadline.after(100)):
+                with self.assertRaises(DeadlineExceeded):
+                    coalescer.split_many(["huisjacht"])
+            assert time.monotonic() - started < 0.4
+            assert other.result(5) == [{"candidates": []}]
+
+    def test_joined_without_deadline(self):
+        started = threading.Event()
+        batches = []
+
+        def split_many(words):
+            batches.append(deadline.get())
+            started.set()
+            if deadline.get() is not None:
+                time.sleep(max(0.0, deadline.remaining() or 0))
+                raise DeadlineExceeded("Deadline exceeded")
+            return [{"candidates": [{"parts": [word], "score": 1}]} for word in words]
+
+        def split_with_deadline():
+            with deadline.until(deadline.after(100)):
+                return coalescer.split_many(["huisjacht"])
+
+        coalescer = Coalescer("slow", split_many, window=0)
+        with ThreadPoolExecutor(1) as executor:
+            leader = executor.submit(split_with_deadline)
+            started.wait(5)
+            # does not join the word being split, whose batch runs out of time,
+            # but splits it again rather than failing with the deadline of another request
+            assert coalescer.split_many(["huisjacht"])[0]["candidates"][0]["parts"] == ["huisjacht"]
+            with self.assertRaises(DeadlineExceeded):
+                leader.result(5)
+        assert len(batches) == 2 and batches[1] is None
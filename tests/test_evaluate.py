@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
+import os
+import tempfile
 import unittest
-from compound_splitter.evaluate import COMPOUND_SPLIT_CHAR, score
+from unittest import mock
+from compound_splitter.evaluate import COMPOUND_SPLIT_CHAR, call_method, call_methods_parallel, read_test_set, \
+    score, score_batch
 from typing import List
 
 
@@ -62,6 +66,91 @@ class TestEvaluate(unittest.TestCase):
                 raise err
 
 
+class TestScoreBatch(unittest.TestCase):
+    def test_interfix(self):
+        # the word is split as expected, but with another infix
+        pairs = [
+            ("huis_jacht", "huizen_jacht"),
+            ("pan_koek", "pannen_koek"),
+            ("bed_winkel", "bedden_winkel"),
+            ("zon_scherm", "zonne_scherm"),
+        ]
+        pairs += [(expected, actual) for actual, expected in pairs]
+        scores = score_batch([("", expected) for actual, expected in pairs],
+                             [actual for actual, expected in pairs])
+        assert scores.skipped == 0
+        assert scores.splitted_correctly == len(pairs)
+        for counts in scores.boundaries.values():
+            assert counts == (0, 0, len(pairs))
+
+    def test_agrees_with_score(self):
+        parts = ["abc", "def", "gh", "ijklm", "no", "p"]
+        for pairs in generate_test_boolean_pairs(5):
+            actual_splits, expected_splits = zip(*pairs)
+            actual = generate_test_word(parts, actual_splits)
+            expected = generate_test_word(parts, expected_splits)
+            scores = score_batch([("", expected)], [actual])
+            assert scores.boundaries[0] == score(actual, expected), (actual, expected)
+
+    def test_tolerance(self):
+        test_set = [("kwaliteitscontrole", "kwaliteits_controle"),
+                    ("ziekenwagen", "zieken_wagen"),
+                    ("basiswoord", "basis_woord"),
+                    ("watersnood", "waters_nood")]
+        # the dropped infix is aligned with the expected word
+        splits = ["kwaliteit_scontrole", "zieke_nwagen", "basis_woord", "water_nood"]
+        scores = score_batch(test_set, splits)
+        assert scores.skipped == 0
+        assert scores.boundaries[0] == (2, 2, 2)
+        assert scores.boundaries[1] == (0, 0, 4)
+        assert scores.boundaries[2] == (0, 0, 4)
+        assert scores.splitted_correctly == 2
+        assert scores.splitted_incorrectly == 2
+        assert scores.compounds == 4
+
+    def test_skipped(self):
+        scores = score_batch([("fietsenstalling", "fietsen_stalling"), ("huisjacht", "huis_jacht")],
+                             ["fiets_rek", "huis_jacht"])
+        assert scores.skipped == 1
+        assert scores.splitted_correctly == 1
+        assert scores.boundaries[0] == (0, 0, 1)
+
+
+class TestReadTestSet(unittest.TestCase):
+    def setUp(self):
+        # 30 compounds and 70 other words
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as csvfile:
+            csvfile.write("compound,expected\n")
+            for i in range(100):
+                if i % 10 < 3:
+                    csvfile.write(f"huis{i}jacht,huis{i}_jacht\n")
+                else:
+                    csvfile.write(f"woord{i},woord{i}\n")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_small(self):
+        rows = list(read_test_set(self.path, None))
+        assert len(rows) == 100
+        assert rows[0] == ("huis0jacht", "huis0_jacht")
+        assert list(read_test_set(self.path, 1000)) == rows
+
+    def test_seed(self):
+        sample = list(read_test_set(self.path, 10, seed=1))
+        assert len(sample) == 10
+        assert len(set(sample)) == 10
+        assert sample == list(read_test_set(self.path, 10, seed=1))
+
+    def test_stratify(self):
+        for seed in range(10):
+            sample = list(read_test_set(self.path, 10, seed=seed, stratify=True))
+            compounds = [row for row in sample if COMPOUND_SPLIT_CHAR in row[1]]
+            assert len(sample) == 10
+            assert len(compounds) == 3
+
+
 def generate_test_boolean_pairs(length: int):
     pairs = [(True, True), (True, False), (False, True), (False, False)]
 
@@ -90,3 +179,18 @@ def generate_test_words(parts: List[str]):
         for (splits, word) in generate_test_words(parts[:-1]):
             yield (splits+1, word + COMPOUND_SPLIT_CHAR + parts[-1])
             yield (splits, word + parts[-1])
+
+
+class TestCallMethodsParallel(unittest.TestCase):
+    def test_same_as_sequential(self):
+        test_sets = [(f"set{i}", [(f"woord{i}{j}", f"woord{i}{j}") for j in range(10)]) for i in range(3)]
+        methods = [{"name": "never", "concurrency": 3}]
+        with mock.patch("compound_splitter.evaluate.list_methods", return_value=methods):
+            results = call_methods_parallel(test_sets, 2)
+
+        # in the order of the test sets, and each in the order of its words
+        assert list(results) == ["set0", "set1", "set2"]
+        for name, test_set in test_sets:
+            assert list(results[name]) == ["never"]
+            assert results[name]["never"]["splits"] == call_method("never", test_set)["splits"]
+            assert results[name]["never"]["splits"] == [compound for compound, _ in test_set]
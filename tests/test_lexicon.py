@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import importlib
+import unittest
+from methods.lexicon.trie import Trie
+
+lexicon = importlib.import_module("methods.lexicon")
+
+
+def top_parts(word: str):
+    return lexicon.split(word)["candidates"][0]["parts"]
+
+
+class TestLexicon(unittest.TestCase):
+    def setUp(self):
+        lexicon.trie = Trie.build({
+            "kwaliteit": 50,
+            "controle": 80,
+            "basis": 100,
+            "woord": 200,
+            "ziek": 30,
+            "wagen": 60,
+            "water": 90,
+            "nood": 40,
+            "watersnood": 5,
+            "bas": 1,
+            "iswoord": 1,
+        })
+
+    def tearDown(self):
+        lexicon.trie = None
+
+    def test_trie(self):
+        trie = lexicon.trie
+        assert "basis" in trie
+        assert "bas" in trie
+        assert "basi" not in trie
+        assert list(trie.prefixes("basiswoord")) == [(3, 1), (5, 100)]
+        assert list(trie.prefixes("basiswoord", 5)) == [(10, 200)]
+
+    def test_split(self):
+        assert top_parts("basiswoord") == ["basis", "woord"]
+        assert top_parts("Kwaliteitscontrole") == ["Kwaliteits", "controle"]
+        assert top_parts("ziekenwagen") == ["zieken", "wagen"]
+        assert top_parts("watersnood") == ["waters", "nood"]
+        assert top_parts("woord") == ["woord"]
+        assert top_parts("fiets") == ["fiets"]
+
+    def test_scores(self):
+        candidates = lexicon.split("watersnood")["candidates"]
+        assert [candidate["parts"] for candidate in candidates] == [["waters", "nood"], ["watersnood"]]
+        assert abs(sum(candidate["score"] for candidate in candidates) - 1) < 1e-9
+        assert lexicon.split("fiets")["candidates"][0]["score"] == 0
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import importlib
+import json
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+from compound_splitter import deadline
+from compound_splitter.deadline import DeadlineExceeded
+
+mcs = importlib.import_module("methods.mcs")
+
+STUB = '''
+import sys
+import time
+
+def answer(word):
+    if word == "{end}":
+        print(word)
+    else:
+        middle = len(word) // 2
+        print("\\t".join([word] * 6 + [word[:middle] + " " + word[middle:]]))
+    sys.stdout.flush()
+
+if "--TERM" in sys.argv:
+    answer(sys.argv[sys.argv.index("--TERM") + 1])
+else:
+    for line in sys.stdin:
+        word = line.strip()
+        if word == "kapot":
+            sys.exit(1)
+        if word == "traag":
+            time.sleep(0.5)
+        if word == "hangt":
+            time.sleep(60)
+        answer(word)
+'''.format(end=mcs.END_OF_TERM)
+
+
+class TestMCSWorkers(unittest.TestCase):
+    def setUp(self):
+        self.args = mcs.MCS_ARGS
+        self.bin_dir = mcs.BIN_DIR
+        self.hang_timeout = mcs.HANG_TIMEOUT
+        # a stand-in for MCS which splits every word in half
+        mcs.MCS_ARGS = [sys.executable, "-c", STUB]
+        mcs.BIN_DIR = None
+        mcs.start()
+
+    def tearDown(self):
+        mcs.stop()
+        mcs.MCS_ARGS = self.args
+        mcs.BIN_DIR = self.bin_dir
+        mcs.HANG_TIMEOUT = self.hang_timeout
+
+    def test_run(self):
+        worker = mcs.workers[0]
+        with worker.lock:
+            assert worker.run("huisjacht").split("\t")[-1] == "huis jacht"
+            # the output of every word is read up to its own end marker
+            assert worker.run("pankoek").split("\t")[-1] == "pan koek"
+        assert mcs.split("zonscherm")["candidates"][0]["parts"] == ["zons", "cherm"]
+
+    def test_crash(self):
+        crashed = mcs.workers[0]
+        with mcs.workers_lock:
+            crashed.lock.acquire()
+        # the word is answered the slow way, and the worker replaced
+        assert mcs.run_on(crashed, "kapot") == "\t".join(["kapot"] * 6 + ["ka pot"]) + "\n"
+        assert crashed not in mcs.workers
+        assert crashed.proc.poll() is not None
+        assert len(mcs.workers) == mcs.POOL_SIZE
+        assert mcs.split("huisjacht")["candidates"][0]["parts"] == ["huis", "jacht"]
+
+    def test_deadline(self):
+        procs = [worker.proc for worker in mcs.workers]
+        started = time.monotonic()
+        with deadline.until(deadline.after(100)):
+            with self.assertRaises(DeadlineExceeded):
+                mcs.split("traag")
+        assert time.monotonic() - started < 0.4
+        # the worker is not killed, but finishes the word before it is used again
+        assert all(proc.poll() is None for proc in procs)
+        for worker in list(mcs.workers):
+            worker.lock.acquire()
+            assert mcs.run_on(worker, "pankoek").split("\t")[-1] == "pan koek"
+        assert [worker.proc for worker in mcs.workers] == procs
+
+    def test_hang(self):
+        mcs.HANG_TIMEOUT = 0.3
+        procs = [worker.proc for worker in mcs.workers]
+        # killed and replaced, and answered the slow way
+        assert mcs.split("hangt")["candidates"][0]["parts"] == ["ha", "ngt"]
+        assert len([proc for proc in procs if proc.poll() is not None]) == 1
+        assert len(mcs.workers) == mcs.POOL_SIZE
+
+    def test_replaced_while_waiting(self):
+        replaced = mcs.workers[0]
+        replaced.lock.acquire()
+        mcs.replace_worker(replaced)
+        replaced.lock.release()
+        # a caller which was waiting for the replaced worker skips it
+        assert replaced.lock.acquire(False)
+        assert not mcs.in_pool(replaced)
+        worker = mcs.acquire_worker()
+        assert worker in mcs.workers
+        worker.lock.release()
+
+    def test_stop(self):
+        procs = [worker.proc for worker in mcs.workers]
+        mcs.stop()
+        assert mcs.workers == []
+        assert all(proc.poll() is not None for proc in procs)
+
+    def test_after_fork(self):
+        procs = [worker.proc for worker in mcs.workers]
+        reader, writer = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # a forked process runs its words on the pool of its parent, without a pool of its own
+            os.close(reader)
+            code = 1
+            try:
+                mcs.after_fork(1, 2)
+                parts = [mcs.split(word)["candidates"][0]["parts"] for word in ["huisjacht", "pankoek"]]
+                parts += [[str(len(mcs.workers))]]
+                os.write(writer, json.dumps(parts).encode("utf-8"))
+                mcs.stop()
+                code = 0
+            finally:
+                os._exit(code)
+
+        os.close(writer)
+        with os.fdopen(reader, "rb") as output:
+            parts = json.loads(output.read().decode("utf-8"))
+        os.waitpid(pid, 0)
+        assert parts == [["huis", "jacht"], ["pan", "koek"], ["0"]]
+        # the pool of the parent keeps running after the forked process stopped
+        assert [worker.proc for worker in mcs.workers] == procs
+        assert all(proc.poll() is None for proc in procs)
+        assert mcs.split("zonscherm")["candidates"][0]["parts"] == ["zons", "cherm"]
+
+    def test_shared_failure(self):
+        mcs.forked = True
+        try:
+            # the error of the pool server is raised in the forked process
+            with mock.patch.object(mcs, "run_local", side_effect=OSError("stuk")):
+                with self.assertRaisesRegex(OSError, "stuk"):
+                    mcs.run_shared("huisjacht")
+            assert mcs.split("huisjacht")["candidates"][0]["parts"] == ["huis", "jacht"]
+        finally:
+            mcs.stop()
+            mcs.forked = False
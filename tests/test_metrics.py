@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import unittest
+from compound_splitter import metrics
+from compound_splitter.cache import get_cache
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        histogram = metrics.Histogram("latency_seconds", "Latency", [0.1, 1])
+        histogram.observe(0.05, {"method": "secos"})
+        histogram.observe(0.5, {"method": "secos"})
+        histogram.observe(5, {"method": "secos"})
+
+        lines = histogram.render()
+        assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+        assert lines[2:] == [
+            'latency_seconds_bucket{method="secos",le="0.1"} 1',
+            'latency_seconds_bucket{method="secos",le="1"} 2',
+            'latency_seconds_bucket{method="secos",le="+Inf"} 3',
+            'latency_seconds_sum{method="secos"} 5.55',
+            'latency_seconds_count{method="secos"} 3',
+        ]
+
+    def test_track(self):
+        with metrics.track("test", "mcs"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.track("test") as labels:
+                labels["method"] = "secos"
+                raise ValueError()
+
+        output = metrics.registry.render()
+        assert 'compound_splitter_requests_total{endpoint="test",method="mcs"} 1' in output
+        assert 'compound_splitter_requests_total{endpoint="test",method="secos"} 1' in output
+        assert 'compound_splitter_request_errors_total{endpoint="test",method="secos"} 1' in output
+        assert 'compound_splitter_requests_in_flight{endpoint="test"} 0' in output
+
+    def test_cache_hit_ratio(self):
+        cache = get_cache("metrics-test", {})
+        cache.put("huisjacht", {"candidates": []})
+        cache.get("huisjacht")
+        cache.get("pankoek")
+
+        output = metrics.registry.render()
+        assert 'compound_splitter_cache_hit_ratio{method="metrics-test"} 0.5' in output
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from compound_splitter import registry
+from compound_splitter.registry import MethodRegistry, UnknownMethod
+
+
+def write_method(directory: str, name: str, display_name: str):
+    os.makedirs(os.path.join(directory, name))
+    with open(os.path.join(directory, name, "__init__.py"), "w") as module_file:
+        module_file.write("def split(word):\n    return {'candidates': [{'parts': [word], 'score': 1}]}\n")
+    with open(os.path.join(directory, name, "run.json"), "w") as run_json:
+        json.dump({"displayName": display_name, "protocol": "module"}, run_json)
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.methods_dir = os.path.join(self.directory.name, "methods")
+        write_method(self.methods_dir, "huis", "Huis")
+        os.makedirs(os.path.join(self.methods_dir, "__pycache__"))
+
+        plugins_dir = os.path.join(self.directory.name, "plugins")
+        write_method(plugins_dir, "registry_test_plugin", "Plugin")
+        sys.path.insert(0, plugins_dir)
+
+    def tearDown(self):
+        sys.path.remove(os.path.join(self.directory.name, "plugins"))
+        sys.modules.pop("registry_test_plugin", None)
+        self.directory.cleanup()
+
+    def test_scan_once(self):
+        methods = MethodRegistry(self.methods_dir)
+        with mock.patch.object(registry, "discover_plugins", return_value=[]):
+            assert methods.names() == ["huis"]
+            assert methods.get("huis")["displayName"] == "Huis"
+
+            # not scanned again until refreshed
+            write_method(self.methods_dir, "jacht", "Jacht")
+            assert methods.names() == ["huis"]
+            methods.refresh()
+            assert methods.names() == ["huis", "jacht"]
+
+        with self.assertRaises(UnknownMethod):
+            methods.get("pankoek")
+
+    def test_plugin(self):
+        methods = MethodRegistry(self.methods_dir)
+        plugins = [("plugin", "registry_test_plugin"), ("missing", "registry_test_missing")]
+        with mock.patch.object(registry, "discover_plugins", return_value=plugins):
+            assert methods.names() == ["huis", "plugin"]
+            assert methods.get("plugin")["displayName"] == "Plugin"
+
+        # imported lazily
+        assert "registry_test_plugin" not in sys.modules
+        module = methods.load("plugin")
+        assert module.split("huisjacht")["candidates"][0]["parts"] == ["huisjacht"]
+        assert methods.load("plugin") is module
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+import importlib
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+from subprocess import DEVNULL, Popen
+from time import monotonic, sleep
+from methods.secos.engine import Engine
+from methods.secos.index import MmapIndex, build_index
+
+secos = importlib.import_module("methods.secos")
+secos_mmap = importlib.import_module("methods.secos-mmap")
+
+PARITY_WORDS = ["fietsenstalling", "ziekenhuis", "voetbalwedstrijd", "waterkoker", "kinderwagen",
+                "boekenkast", "zonnescherm", "verkeerslicht", "kwaliteitscontrole", "noord-holland"]
+DATA_PATH = os.path.join(secos.SERVER_PATH, "data")
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+
+def fake_decompound(sentence: str) -> str:
+    # splits the words of a sentence after four letters, but drops "los" from a sentence
+    words = sentence.split()
+    if "los" in words:
+        return "lo s" if words == ["los"] else " ".join(word for word in words if word != "los")
+    return " ".join(word[:4] + " " + word[4:] if len(word) > 4 else word for word in sentence.split())
+
+
+class TestSplitMany(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(secos, "decompound", side_effect=fake_decompound)
+        self.decompound = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(secos.supervisor, "ready", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def parts(self, results):
+        return [result["candidates"][0]["parts"] for result in results]
+
+    def test_align(self):
+        assert secos.align(["huisjacht", "op", "Noord-Holland"], ["huis", "jacht", "op", "noord-", "holland"]) == \
+            [["huis", "jacht"], ["op"], ["noord-", "holland"]]
+        # tokens which do not spell out the words
+        assert secos.align(["huisjacht", "op"], ["huis", "jacht"]) is None
+        assert secos.align(["huisjacht"], ["huis", "jacht", "op"]) is None
+        assert secos.align(["huisjacht"], ["huisj", "acht"]) == [["huisj", "acht"]]
+        assert secos.align(["huisjacht"], ["huisjachten"]) is None
+
+    def test_sentences(self):
+        words = [f"woord{i}" for i in range(secos.SENTENCE_SIZE + 20)]
+        results = secos.split_many(words)
+        assert self.parts(results) == [["woor", f"d{i}"] for i in range(secos.SENTENCE_SIZE + 20)]
+        # sent as a sentence of at most SENTENCE_SIZE words at a time
+        sentences = [call[0][0].split() for call in self.decompound.call_args_list]
+        assert sentences == [words[:secos.SENTENCE_SIZE], words[secos.SENTENCE_SIZE:]]
+
+    def test_fallback(self):
+        # the tokens cannot be aligned, or a word is not a single token:
+        # split one word at a time instead
+        for words in [["huisjacht", "los", "op"], ["huisjacht", "pan koek"], ["huisjacht", ""]]:
+            self.decompound.reset_mock()
+            results = secos.split_many(words)
+            assert len(results) == len(words)
+            assert [call[0][0] for call in self.decompound.call_args_list][-len(words):] == words
+        assert self.parts(secos.split_many(["huisjacht", "los"])) == [["huis", "jacht"], ["lo", "s"]]
+
+
+class IndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.indexes = []  # type: list
+
+    def tearDown(self):
+        for index in self.indexes:
+            index.close()
+        self.directory.cleanup()
+
+    def index(self, name: str, items) -> MmapIndex:
+        path = os.path.join(self.directory.name, name)
+        build_index(path, items)
+        index = MmapIndex(path)
+        self.indexes.append(index)
+        return index
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as data_file:
+            data_file.write(text)
+        return path
+
+
+class TestIndex(IndexTestCase):
+    def test_get(self):
+        items = {"huis": "1000", "huisdeur": "30", "één": "5", "zon": "", "a": "b c"}
+        index = self.index("test.idx", items.items())
+        assert len(index) == 5
+        for key, value in items.items():
+            assert index.get(key) == value
+        for key in ["", "hui", "huisd", "zonne", "ééntje", "0", "￿"]:
+            assert index.get(key) is None
+
+    def test_empty(self):
+        index = self.index("empty.idx", [])
+        assert len(index) == 0
+        assert index.get("huis") is None
+
+    def test_not_an_index(self):
+        path = self.write("counts.txt", "huis\t1000\n" * 10)
+        with self.assertRaisesRegex(ValueError, "not an index file"):
+            MmapIndex(path)
+
+    def test_read_counts(self):
+        path = self.write("WordCount", "Huis\t1000\nhuis\t20\nstalling\t200\n")
+        assert sorted(secos_mmap.read_counts(path)) == [("huis", "1020"), ("stalling", "200")]
+
+        path = self.write("Broken", "huis\t1000\nstalling 200\n")
+        with self.assertRaisesRegex(ValueError, "Broken:2"):
+            list(secos_mmap.read_counts(path))
+
+    def test_read_candidates(self):
+        path = self.write("candidates",
+                          "fietsenstalling\tstalling\t0.5\nfietsenstalling\tFietsen\t0.2\nhuis\thuizen\t1\n")
+        assert sorted(secos_mmap.read_candidates(path)) == [("fietsenstalling", "fietsen stalling"),
+                                                            ("huis", "huizen")]
+
+        path = self.write("Broken", "fietsenstalling\n")
+        with self.assertRaisesRegex(ValueError, "Broken:1"):
+            list(secos_mmap.read_candidates(path))
+
+
+class TestEngine(IndexTestCase):
+    def setUp(self):
+        super().setUp()
+        counts = {
+            "fiets": 500,
+            "fietsen": 300,
+            "stalling": 200,
+            "fietsenstalling": 20,
+            "zonne": 100,
+            "scherm": 300,
+            "water": 400,
+            "kwaliteit": 150,
+            "controle": 250,
+            "basis": 300,
+            "woorden": 120,
+            "noord": 600,
+            "holland": 900,
+            "zeldzaam": 10,
+            "zeldzaamscherm": 60,
+            "woord": 200,
+        }
+        candidates = {
+            "fietsenstalling": "fiets fietsen stalling",
+        }
+        self.engine = Engine(self.index("counts.idx", ((word, str(count)) for word, count in counts.items())),
+                             self.index("candidates.idx", candidates.items()))
+
+    def test_candidates(self):
+        assert self.engine.decompound("Fietsenstalling") == ["fietsen", "stalling"]
+
+    def test_known_words(self):
+        # without candidates, the known words in it are used
+        assert self.engine.decompound("zonnescherm") == ["zonne", "scherm"]
+
+    def test_many_parts(self):
+        assert self.engine.decompound("waterkwaliteitcontrolebasiswoorden") == \
+            ["water", "kwaliteit", "controle", "basis", "woorden"]
+
+    def test_many_split_points(self):
+        # the best split lies right of many other split points
+        word = "woorden" * 3 + "noordholland"
+        assert self.engine.decompound(word)[-2:] == ["noord", "holland"]
+
+    def test_min_word_count(self):
+        # the count of "zeldzaam" is too low, so it is not worth splitting off
+        assert self.engine.decompound("zeldzaamscherm") == ["zeldzaamscherm"]
+
+    def test_dash(self):
+        assert self.engine.decompound("noord-holland") == ["noord-", "holland"]
+
+
+@unittest.skipUnless(os.path.exists(os.path.join(secos.SERVER_PATH, "decompound_server.py")) and
+                     os.path.exists(DATA_PATH),
+                     "SECOS has not been retrieved and prepared")
+class TestEngineParity(IndexTestCase):
+    '''
+    Compare the engine with the SECOS server, on the part of
+    its data which is about the words being split.
+    '''
+
+    def fixture(self, name: str) -> str:
+        def relevant(line: str) -> bool:
+            word = line.split("\t", 1)[0].lower()
+            return bool(word) and any(word in compound for compound in PARITY_WORDS)
+
+        source = os.path.join(DATA_PATH, name)
+        path = os.path.join(self.directory.name, name)
+        with open(source, encoding="utf-8", errors="replace") as source_file, \
+                open(path, "w", encoding="utf-8") as fixture_file:
+            fixture_file.writelines(line for line in source_file if relevant(line))
+        return path
+
+    def test_parity(self):
+        candidates_path = self.fixture("dutchCoW_trigram__candidates")
+        counts_path = self.fixture("dutchCoW_trigram__WordCount")
+        engine = Engine(self.index("counts.idx", secos_mmap.read_counts(counts_path)),
+                        self.index("candidates.idx", secos_mmap.read_candidates(candidates_path)))
+
+        port = free_port()
+        server = Popen(secos.server_command(candidates_path, counts_path, port),
+                       cwd=secos.SERVER_PATH,
+                       stdout=DEVNULL)
+        try:
+            for word in PARITY_WORDS:
+                with self.subTest(word=word):
+                    expected = self.query(server, port, word).strip().split(" ")
+                    assert engine.decompound(word) == expected
+        finally:
+            server.kill()
+            server.wait()
+
+    def query(self, server: Popen, port: int, word: str) -> str:
+        until = monotonic() + 120
+        while True:
+            try:
+                return secos.requests.get(f"http://localhost:{port}",
+                                          params={"sentence": word},
+                                          timeout=10).text
+            except OSError:
+                if server.poll() is not None or monotonic() > until:
+                    raise
+                sleep(0.1)
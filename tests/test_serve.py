@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import json
+import os
+import signal
+import sys
+import threading
+import unittest
+from subprocess import Popen
+from typing import Optional
+from unittest import mock
+from urllib.request import urlopen
+from compound_splitter import serve
+from compound_splitter.api_web import started_methods
+from compound_splitter.supervisor import Supervisor
+from tests.test_supervisor import STUB, free_port, send, wait_until
+
+
+class SharedBackend:
+    '''
+    A method module with a backend started before forking,
+    which answers whether this process owns it.
+    '''
+
+    def __init__(self):
+        self.port = free_port()
+        self.supervisor = Supervisor("stub",
+                                     lambda: Popen([sys.executable, "-c", STUB, str(self.port), "0"]),
+                                     "localhost",
+                                     self.port,
+                                     health_check=lambda: send(self.port, "ping"))
+
+    def start(self):
+        self.supervisor.start()
+
+    def stop(self):
+        if self.supervisor.owner:
+            self.supervisor.stop()
+
+    def after_fork(self, worker_index, worker_count):
+        self.supervisor.detach()
+
+    def split(self, word):
+        self.supervisor.call(send, self.port, "ping")
+        return {"candidates": [{"parts": [word, str(self.supervisor.owner)], "score": 1}]}
+
+
+class TestWorkerProcesses(unittest.TestCase):
+    def setUp(self):
+        self.listener = serve.listen("localhost", 0)
+        self.port = self.listener.getsockname()[1]
+        self.workers = serve.WorkerProcesses(self.listener, 2)
+        self.waiting = None  # type: Optional[threading.Thread]
+
+    def tearDown(self):
+        self.workers.stop()
+        if self.waiting is not None:
+            self.waiting.join(10)
+        self.listener.close()
+
+    def start(self):
+        for worker_index in range(self.workers.worker_count):
+            self.workers.fork(worker_index)
+        self.waiting = threading.Thread(target=self.workers.wait)
+        self.waiting.start()
+
+    def get(self, path: str):
+        with urlopen(f"http://localhost:{self.port}{path}", timeout=5) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def get_eventually(self, path: str):
+        results = []
+
+        def answered():
+            try:
+                results.append(self.get(path))
+                return True
+            except OSError:
+                return False
+
+        wait_until(answered)
+        return results[0]
+
+    def test_respawn(self):
+        self.start()
+        assert self.get_eventually("/split/never/huisjacht")["candidates"][0]["parts"] == ["huisjacht"]
+
+        killed = min(self.workers.workers)
+        os.kill(killed, signal.SIGKILL)
+        # replaced by a new process with the same index
+        wait_until(lambda: killed not in self.workers.workers and len(self.workers.workers) == 2)
+        assert sorted(self.workers.workers.values()) == [0, 1]
+        assert self.get_eventually("/split/never/pankoek")["candidates"][0]["parts"] == ["pankoek"]
+
+    def test_stop(self):
+        self.start()
+        self.get_eventually("/split/never/huisjacht")
+        pids = list(self.workers.workers)
+        self.workers.stop()
+        self.waiting.join(10)
+        # every worker exited by itself, and none was replaced
+        assert not self.waiting.is_alive()
+        assert self.workers.workers == {}
+        for pid in pids:
+            with self.assertRaises(ChildProcessError):
+                os.waitpid(pid, os.WNOHANG)
+
+    def test_shared_backend(self):
+        backend = SharedBackend()
+        patcher = mock.patch("compound_splitter.splitter.registry")
+        registry = patcher.start()
+        self.addCleanup(patcher.stop)
+        registry.get.return_value = {"protocol": "module", "cache": False}
+        registry.load.return_value = backend
+        started_methods.get("gedeeld", lazy=False)
+        try:
+            self.start()
+            # the workers call the backend of this process, which they do not own
+            result = self.get_eventually("/split/gedeeld/huisjacht")
+            assert result["candidates"][0]["parts"] == ["huisjacht", "False"]
+            proc = backend.supervisor.proc
+            self.workers.stop()
+            self.waiting.join(10)
+            # the workers leave the backend running when they stop
+            assert proc.poll() is None
+            assert backend.supervisor.owner
+            backend.supervisor.call(send, backend.port, "ping")
+        finally:
+            started_methods.stop()
+        assert proc.poll() is not None
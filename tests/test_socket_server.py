@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import asyncio
+import time
+import unittest
+from unittest import mock
+from compound_splitter import socket_server
+from compound_splitter.socket_server import AsyncServer
+
+
+def fake_split(compound: str, method_name: str, trace: bool = False, until=None) -> str:
+    if compound == "traag":
+        # finishes after the requests sent after it
+        time.sleep(0.2)
+    middle = len(compound) // 2
+    return compound[:middle] + "," + compound[middle:]
+
+
+async def exchange(port: int, data: bytes, close_write: bool = True) -> bytes:
+    reader, writer = await asyncio.open_connection("localhost", port)
+    writer.write(data)
+    await writer.drain()
+    if close_write:
+        writer.write_eof()
+    reply = await reader.read()
+    writer.close()
+    return reply
+
+
+class TestAsyncServer(unittest.TestCase):
+    def run_client(self, data: bytes, close_write: bool = True) -> bytes:
+        async def run():
+            server = AsyncServer()
+            listener = await asyncio.start_server(server.handle, "localhost", 0)
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                return await asyncio.wait_for(exchange(port, data, close_write), 10)
+            finally:
+                listener.close()
+                await listener.wait_closed()
+                server.close()
+
+        with mock.patch.object(socket_server, "split", fake_split):
+            return asyncio.run(run())
+
+    def test_one_shot(self):
+        # no newline needed, and the connection is closed after the reply
+        assert self.run_client(b"huisjacht,secos", close_write=False) == b"huis,jacht"
+
+    def test_keepalive_order(self):
+        reply = self.run_client(b"traag,secos,keepalive\nhuisjacht,secos\npankoek,secos\n")
+        assert reply == b"tr,aag\nhuis,jacht\npan,koek\n"
+
+    def test_malformed(self):
+        reply = self.run_client(b"huisjacht,secos,keepalive\nkapot\npankoek,secos\n")
+        assert reply == b"huis,jacht\n\npan,koek\n"
+        # a malformed one-shot request closes the connection
+        assert self.run_client(b"kapot") == b""
+
+    def test_eof_without_newline(self):
+        reply = self.run_client(b"huisjacht,secos,keepalive\npankoek,secos")
+        assert reply == b"huis,jacht\npan,koek\n"
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from compound_splitter.splitter import Module, StartedMethods, batches, top_candidate
+from compound_splitter.store import SplitStore
+
+
+class FakeMethod:
+    def __init__(self):
+        self.starts = 0
+        self.words = []  # type: list
+
+    def start(self):
+        self.starts += 1
+        # slow enough for concurrent callers to arrive while starting
+        time.sleep(0.1)
+
+    def stop(self):
+        pass
+
+    def split(self, word):
+        return self.split_many([word])[0]
+
+    def split_many(self, words):
+        self.words += words
+        if "kapot" in words:
+            raise OSError("backend failed")
+        return [{"candidates": [{"parts": [word[:4], word[4:]], "score": 1}]} for word in words]
+
+
+class TestModule(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fake = FakeMethod()
+        patcher = mock.patch("compound_splitter.splitter.registry")
+        patcher.start().load.return_value = self.fake
+        self.addCleanup(patcher.stop)
+
+        self.method = Module("splitter-test", {"cache": False})
+        self.method.store = SplitStore(os.path.join(self.directory.name, "splits.db"))
+
+    def tearDown(self):
+        self.method.stop()
+        self.directory.cleanup()
+
+    def test_lazy_start(self):
+        self.method.store.put_many("splitter-test", "0", [("huisjacht", {"candidates": []})])
+        self.method.start(lazy=True)
+        assert self.fake.starts == 0
+
+        # answered from the store
+        assert self.method.split("huisjacht") == {"candidates": []}
+        assert self.fake.starts == 0
+
+        # started on the first miss, only once
+        assert self.method.split_many(["pankoek", "zonscherm"])[0]["candidates"][0]["parts"] == ["pank", "oek"]
+        self.method.split("fietsenstalling")
+        assert self.fake.starts == 1
+
+    def test_failure_not_stored(self):
+        self.method.start()
+        with self.assertRaisesRegex(OSError, "backend failed"):
+            self.method.split_many(["kapot", "pankoek"])
+        assert self.method.store.get_many("splitter-test", "0", ["kapot", "pankoek"]) == {}
+
+        # split again, rather than answered from the store
+        assert self.method.split("pankoek")["candidates"][0]["parts"] == ["pank", "oek"]
+        assert self.fake.words == ["kapot", "pankoek", "pankoek"]
+
+    def test_uncached_not_coalesced(self):
+        run_data = {"cache": False, "coalesce": {"window": 2}}
+        assert Module("splitter-test", run_data).coalescer is not None
+        # e.g. the benchmark measures the method itself
+        method = Module("splitter-test", run_data, cached=False)
+        assert method.coalescer is None
+        method.start()
+        assert method.split("pankoek")["candidates"][0]["parts"] == ["pank", "oek"]
+        method.stop()
+
+
+class TestStartedMethods(unittest.TestCase):
+    def setUp(self):
+        self.fakes = {"eerste": FakeMethod(), "tweede": FakeMethod()}
+        patcher = mock.patch("compound_splitter.splitter.registry")
+        registry = patcher.start()
+        registry.get.return_value = {"protocol": "module", "cache": False}
+        registry.load.side_effect = lambda name: self.fakes[name]
+        self.addCleanup(patcher.stop)
+        self.started_methods = StartedMethods()
+
+    def tearDown(self):
+        self.started_methods.stop()
+
+    def test_single_flight(self):
+        barrier = threading.Barrier(8)
+
+        def get(_):
+            barrier.wait()
+            return self.started_methods.get("eerste")
+
+        with ThreadPoolExecutor(8) as executor:
+            methods = list(executor.map(get, range(8)))
+        # started once, and every caller waited for that start
+        assert self.fakes["eerste"].starts == 1
+        assert all(method is methods[0] for method in methods)
+        assert methods[0].started
+
+    def test_prewarm(self):
+        self.started_methods.prewarm(["eerste", "tweede"], ["huisjacht", "pankoek"])
+        for fake in self.fakes.values():
+            assert fake.starts == 1
+            assert fake.words == ["huisjacht", "pankoek"]
+        assert self.started_methods.get("tweede").split("zonscherm")["candidates"][0]["parts"] == ["zons", "cherm"]
+        assert self.fakes["tweede"].starts == 1
+
+
+class TestHelpers(unittest.TestCase):
+    def test_top_candidate(self):
+        result = {"candidates": [{"parts": ["huisjacht"], "score": 0.5},
+                                 {"parts": ["huis", "jacht"], "score": 1},
+                                 {"parts": ["hui", "sjacht"], "score": 1}]}
+        # the first of the highest-scoring candidates
+        assert top_candidate(result)["parts"] == ["huis", "jacht"]
+        assert top_candidate({"candidates": []}) is None
+
+    def test_batches(self):
+        assert list(batches(iter(["a", "b", "c", "d", "e"]), 2)) == [["a", "b"], ["c", "d"], ["e"]]
+        assert list(batches([])) == []
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import socket
+import sys
+import unittest
+from subprocess import Popen
+from time import monotonic, sleep
+from compound_splitter.supervisor import BackendUnavailable, Supervisor
+
+STUB = '''
+import socket
+import sys
+import time
+
+port, delay = int(sys.argv[1]), float(sys.argv[2])
+time.sleep(delay)
+server = socket.socket()
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+server.bind(("localhost", port))
+server.listen(5)
+while True:
+    connection, _ = server.accept()
+    with connection:
+        command = connection.recv(100).decode().strip()
+        if command == "exit":
+            sys.exit(1)
+        if command == "hang":
+            time.sleep(3600)
+        connection.sendall(b"pong")
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("localhost", 0))
+        return probe.getsockname()[1]
+
+
+def send(port: int, command: str):
+    with socket.create_connection(("localhost", port), timeout=0.5) as connection:
+        connection.sendall(command.encode())
+        if command == "exit":
+            return
+        if connection.recv(100) != b"pong":
+            raise OSError("unexpected reply")
+
+
+def wait_until(condition, timeout: float = 10):
+    until = monotonic() + timeout
+    while not condition():
+        if monotonic() > until:
+            raise AssertionError("timed out")
+        sleep(0.02)
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.port = free_port()
+        self.launched = []
+
+    def tearDown(self):
+        self.supervisor.stop()
+        for proc in self.launched:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+    def launch(self, startup_delay: float = 0.0) -> Popen:
+        proc = Popen([sys.executable, "-c", STUB, str(self.port), str(startup_delay)])
+        self.launched.append(proc)
+        return proc
+
+    def supervise(self, launch=None, **options) -> Supervisor:
+        self.supervisor = Supervisor("stub",
+                                     launch or self.launch,
+                                     "localhost",
+                                     self.port,
+                                     health_check=lambda: send(self.port, "ping"),
+                                     **options)
+        return self.supervisor
+
+    def test_start(self):
+        # the backend only listens after a while: polled with backoff
+        supervisor = self.supervise(lambda: self.launch(0.3))
+        supervisor.start()
+        assert supervisor.ready
+        assert supervisor.call(send, self.port, "ping") is None
+
+    def test_startup_timeout(self):
+        supervisor = self.supervise(lambda: self.launch(60), startup_timeout=0.3)
+        with self.assertRaisesRegex(BackendUnavailable, "not ready"):
+            supervisor.start()
+
+    def test_exit_during_startup(self):
+        supervisor = self.supervise(lambda: Popen([sys.executable, "-c", "pass"]))
+        with self.assertRaisesRegex(BackendUnavailable, "exited during startup"):
+            supervisor.start()
+
+    def test_restart_after_exit(self):
+        supervisor = self.supervise()
+        supervisor.start()
+        send(self.port, "exit")
+        wait_until(lambda: supervisor.restarts == 1 and supervisor.ready)
+        assert len(self.launched) == 2
+        assert self.launched[0].returncode == 1
+        supervisor.call(send, self.port, "ping")
+
+    def test_circuit_breaker(self):
+        supervisor = self.supervise(failure_threshold=2, cooldown=0.2)
+        supervisor.start()
+
+        def fail():
+            raise OSError("failed")
+
+        for _ in range(2):
+            with self.assertRaisesRegex(OSError, "failed"):
+                supervisor.call(fail)
+        # the backend is still healthy, so it is not restarted,
+        # but calls fail fast until the cooldown has passed
+        with self.assertRaisesRegex(BackendUnavailable, "circuit breaker"):
+            supervisor.call(send, self.port, "ping")
+        assert supervisor.errors == 2
+        sleep(0.25)
+        supervisor.call(send, self.port, "ping")
+        assert supervisor.failures == 0
+        assert supervisor.open_until == 0.0
+        assert supervisor.restarts == 0
+
+    def test_failure_not_blocking(self):
+        checked = []
+
+        def slow_check():
+            if checked:
+                sleep(1)
+            checked.append(True)
+
+        supervisor = self.supervise(failure_threshold=1)
+        supervisor.health_check = slow_check
+        supervisor.start()
+
+        def fail():
+            raise OSError("failed")
+
+        started = monotonic()
+        with self.assertRaisesRegex(OSError, "failed"):
+            supervisor.call(fail)
+        # the backend is health checked in the background
+        assert monotonic() - started < 0.5
+        assert supervisor.restarting
+        wait_until(lambda: not supervisor.restarting)
+        assert supervisor.restarts == 0
+
+    def test_restart_when_hung(self):
+        supervisor = self.supervise(failure_threshold=1, cooldown=0.2)
+        supervisor.start()
+        with self.assertRaises(OSError):
+            supervisor.call(send, self.port, "hang")
+        # the backend fails its health check, so it is replaced
+        wait_until(lambda: supervisor.restarts == 1 and supervisor.ready)
+        assert self.launched[0].poll() is not None
+        supervisor.call(send, self.port, "ping")
+
+    def test_watch(self):
+        supervisor = self.supervise(failure_threshold=2)
+        supervisor.start()
+        supervisor.watch(0.1)
+        # the backend hangs without any call failing, so only the watchdog notices
+        with socket.create_connection(("localhost", self.port)) as connection:
+            connection.sendall(b"hang")
+            wait_until(lambda: supervisor.restarts == 1 and supervisor.ready)
+        assert self.launched[0].poll() is not None
+        supervisor.call(send, self.port, "ping")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import unittest
+from compound_splitter import text
+
+
+class FakeMethod:
+    def __init__(self):
+        self.words = []
+
+    def split_many(self, words):
+        self.words += words
+        splits = {
+            "fietsenstalling": ["Fietsen", "stalling"],
+            "fietsen-stalling": ["fietsen-", "stalling"],
+            "overkapping": ["over", "kap", "ping"],
+        }
+        return [{"candidates": [{"parts": splits.get(word.lower(), [word]), "score": 1}]}
+                for word in words]
+
+
+class TestText(unittest.TestCase):
+    def test_split_text(self):
+        method = FakeMethod()
+        document = "De fietsenstalling (2020) en de fietsen-stalling: fietsenstalling!"
+        result = text.split_text(method, document)
+
+        assert method.words == ["fietsenstalling", "fietsen-stalling"]
+        assert [(token["start"], token["end"], token["splits"]) for token in result["tokens"]] == [
+            (3, 18, [10]),
+            (32, 48, [40]),
+            (50, 65, [57]),
+        ]
+        assert document[10:18] == "stalling"
+        assert result["types"]["fietsenstalling"]["candidates"][0]["parts"] == ["Fietsen", "stalling"]
+
+    def test_split_offsets(self):
+        assert text.split_offsets("Overkapping", ["over", "kap", "ping"]) == [4, 7]
+        assert text.split_offsets("overkapping", ["overkapping"]) == []
+        assert text.split_offsets("overkapping", ["over", "kapel"]) is None
+
+    def test_splittable(self):
+        assert text.splittable("fietsen-stalling")
+        assert not text.splittable("fiets")
+        assert not text.splittable("2020abcdef")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from compound_splitter import profiling, tracing
+
+
+class TestTracing(unittest.TestCase):
+    def test_spans(self):
+        with tracing.span("ignored"):
+            pass
+
+        with tracing.trace() as trace:
+            with tracing.span("split", "secos"):
+                with tracing.span("http", "SECOS"):
+                    pass
+            with ThreadPoolExecutor(2) as executor:
+                list(executor.map(tracing.propagate(self.traced), ["huis", "jacht"]))
+
+        spans = trace.to_json()
+        assert [(span["name"], span["depth"]) for span in spans[:2]] == [("split", 0), ("http", 1)]
+        assert sorted(span["detail"] for span in spans[2:]) == ["huis", "jacht"]
+        assert trace.server_timing().startswith("total;dur=")
+        assert '1-http;desc="http SECOS"' in trace.server_timing()
+
+        # the trace is no longer active
+        with tracing.span("ignored"):
+            pass
+        assert len(trace.spans) == 4
+
+    def traced(self, word: str):
+        with tracing.span("pipe", word):
+            pass
+
+    def test_disabled(self):
+        with tracing.trace(False) as trace:
+            assert trace is None
+            with tracing.span("split"):
+                pass
+
+    def test_requested(self):
+        assert tracing.requested("1")
+        assert not tracing.requested(None)
+        assert not tracing.requested("false")
+
+
+class TestProfiling(unittest.TestCase):
+    def test_sample(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait, name="waiter")
+        thread.start()
+        try:
+            stacks = profiling.sample(0.05, interval=0.01)
+        finally:
+            stop.set()
+            thread.join()
+
+        assert any(stack.startswith("waiter;") and "wait (threading.py" in stack for stack in stacks)